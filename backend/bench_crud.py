@@ -0,0 +1,234 @@
+"""CRUD latency and persistence benchmark for large synthetic projects.
+
+Builds a project with N shots (prompts, dialogue, image candidates, video items, assets
+like the real data/projects.json) in a throwaway data directory, then measures the
+endpoints the storyboard editor calls on every interaction plus load_db/save_db time and
+memory, for each N. Writes a machine-readable JSON report to track across releases.
+
+    python bench_crud.py --sizes 100,1000,5000 --ops 30 --output bench_crud.json
+    STATE_BACKEND=sqlite python bench_crud.py --output bench_crud_sqlite.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+DEFAULT_SIZES = (100, 1000, 5000)
+CANDIDATES_PER_SHOT = 4
+VIDEOS_PER_SHOT = 2
+CHARACTER_COUNT = 12
+SCENE_COUNT = 6
+REPORT_VERSION = 1
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))]
+
+def _upload(ext: str) -> str:
+    return f"/static/uploads/{uuid.uuid4()}.{ext}"
+
+def synthesize_project(main, shots: int, seed: int = 7):
+    rng = random.Random(seed)
+    characters = [
+        main.Character(id=f"char_{i}", name=f"角色{i}", avatar_url=_upload("png"), tags=["主角"] if i < 2 else [],
+                       prompt=f"角色{i}，二十岁上下，黑色长发，素白宫装，气质清冷" * 3, description=f"角色{i}的背景设定" * 5)
+        for i in range(CHARACTER_COUNT)
+    ]
+    scenes = [
+        main.Scene(id=f"scene_{i}", name=f"场景{i}", image_url=_upload("png"),
+                   prompt=f"场景{i}，金漆蟠龙柱，烛火摇曳，光影在鎏金地砖上跳动" * 3)
+        for i in range(SCENE_COUNT)
+    ]
+    project = main.Project(id=str(uuid.uuid4()), name=f"bench-{shots}", characters=characters, scenes=scenes)
+    for i in range(shots):
+        candidates = [_upload("png") for _ in range(CANDIDATES_PER_SHOT)]
+        videos = [main.VideoItem(id=str(uuid.uuid4()), url=_upload("mp4"), progress=100, status="completed") for _ in range(VIDEOS_PER_SHOT)]
+        project.shots.append(main.Shot(
+            id=str(uuid.uuid4()),
+            order=i,
+            prompt=f"第{i}镜，中景，{rng.choice(characters).name}站在{rng.choice(scenes).name}，风吹动衣角，镜头缓慢推进" * 4,
+            dialogue=f"……第{i}句台词。",
+            characters=[c.id for c in rng.sample(characters, 2)],
+            scene_id=rng.choice(scenes).id,
+            panel_layout=rng.choice(("1-panel", "3-panel")),
+            image_url=candidates[0],
+            image_candidates=candidates,
+            video_url=videos[0].url,
+            video_items=videos,
+            status=main.GenerationStatus.COMPLETED
+        ))
+    return project
+
+def _summarize(latencies: list[float], save_before: tuple[int, float]) -> dict:
+    import metrics
+    saves = metrics.save_seconds.count(store="projects") - save_before[0]
+    save_total = metrics.save_seconds.total(store="projects") - save_before[1]
+    total = sum(latencies)
+    return {
+        "ops": len(latencies),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+        "ops_per_s": round(len(latencies) / total, 2) if total else None,
+        # Share of each request spent in save_db, the usual suspect for mutations
+        "save_ms_per_op": round(save_total / len(latencies) * 1000, 3) if saves else 0.0
+    }
+
+def bench_endpoints(client, main, project, ops: int) -> dict:
+    import metrics
+    rng = random.Random(11)
+    pid = project.id
+    shots = list(project.shots)
+    picks = rng.sample(shots, min(ops, len(shots)))
+    picks = (picks * (ops // len(picks) + 1))[:ops]
+    ordered_ids = [s.id for s in shots]
+
+    def call(method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        response = client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200, f"{method} {url}: {response.status_code} {response.text[:200]}"
+        return elapsed
+
+    cases = {
+        "GET /projects": lambda i: call("GET", "/projects"),
+        "GET /projects/{project_id}": lambda i: call("GET", f"/projects/{pid}"),
+        "PUT /shots/{project_id}/{shot_id}": lambda i: call("PUT", f"/shots/{pid}/{picks[i].id}",
+                                                             json={"prompt": f"改写后的提示词 {i}", "dialogue": f"新台词 {i}"}),
+        "PUT /projects/{project_id}/shots/reorder": lambda i: call("PUT", f"/projects/{pid}/shots/reorder",
+                                                                    json={"shot_ids": ordered_ids[::-1] if i % 2 == 0 else ordered_ids}),
+        "POST /shots/{project_id}/{shot_id}/select-image": lambda i: call("POST", f"/shots/{pid}/{picks[i].id}/select-image",
+                                                                          json={"image_url": picks[i].image_candidates[i % CANDIDATES_PER_SHOT]}),
+    }
+    results = {}
+    for name, run in cases.items():
+        before = (metrics.save_seconds.count(store="projects"), metrics.save_seconds.total(store="projects"))
+        results[name] = _summarize([run(i) for i in range(ops)], before)
+
+    # remove-video consumes items, so each op targets its own (shot, item) pair
+    targets = [(s.id, item.id) for s in shots for item in s.video_items][:ops]
+    before = (metrics.save_seconds.count(store="projects"), metrics.save_seconds.total(store="projects"))
+    latencies = [call("POST", f"/shots/{pid}/{shot_id}/remove-video", json={"video_id": video_id}) for shot_id, video_id in targets]
+    results["POST /shots/{project_id}/{shot_id}/remove-video"] = _summarize(latencies, before)
+    return results
+
+def _best_ms(fn, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+def _memory(fn) -> dict:
+    """Peak traced allocation during ``fn`` and what it still holds afterwards."""
+    tracemalloc.start()
+    try:
+        base = tracemalloc.get_traced_memory()[0]
+        fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"peak_bytes": peak - base, "retained_bytes": current - base}
+
+def bench_persistence(main, rounds: int) -> dict:
+    project = next(iter(main.DB.values()))
+    edits = iter(range(10 ** 9))
+
+    def edit_and_save():
+        # One edited shot per save, as after a real request; the SQLite backend skips unchanged projects
+        project.shots[0].dialogue = f"edit {next(edits)}"
+        main.save_db()
+
+    # Timings first: tracemalloc slows allocation-heavy code several times over
+    save_ms = _best_ms(edit_and_save, rounds)
+    load_ms = _best_ms(main.load_db, rounds)
+    path = main.state_backend.path
+    file_bytes = sum(os.path.getsize(p) for p in (path, f"{path}-wal") if os.path.exists(p))
+    save_mem = _memory(edit_and_save)
+    main.DB.clear()
+    load_mem = _memory(main.load_db)
+    return {
+        "file_bytes": file_bytes,
+        "save_db": {"best_ms": save_ms, **save_mem},
+        "load_db": {"best_ms": load_ms, **load_mem}
+    }
+
+def _git_commit(path: str) -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=path, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated shot counts")
+    parser.add_argument("--ops", type=int, default=30, help="requests per endpoint and size")
+    parser.add_argument("--rounds", type=int, default=3, help="load_db/save_db repetitions (best is reported)")
+    parser.add_argument("--output", default="bench_crud.json", help="JSON report path")
+    parser.add_argument("--verbose", action="store_true", help="show the app's logs")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    output = os.path.abspath(args.output)
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    # Run the app against a throwaway data directory
+    workdir = tempfile.mkdtemp(prefix="bench_crud_")
+    os.chdir(workdir)
+    sys.path.insert(0, here)
+    log = io.StringIO()
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(log))
+        from fastapi.testclient import TestClient
+        import main
+    client = TestClient(main.app)
+
+    report = {
+        "version": REPORT_VERSION,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": _git_commit(here),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {"state_backend": main.state_backend.name, "ops": args.ops, "rounds": args.rounds, "candidates_per_shot": CANDIDATES_PER_SHOT,
+                   "videos_per_shot": VIDEOS_PER_SHOT, "characters": CHARACTER_COUNT, "scenes": SCENE_COUNT},
+        "results": []
+    }
+    print(f"--- CRUD benchmark ({main.state_backend.name} state): {args.ops} ops per endpoint, {CANDIDATES_PER_SHOT} candidates and {VIDEOS_PER_SHOT} videos per shot ---")
+    print(f"{'shots':>6} {'endpoint':50} {'p50 ms':>9} {'p99 ms':>9} {'ops/s':>9} {'save ms':>9}")
+    for size in sizes:
+        with contextlib.ExitStack() as stack:
+            if not args.verbose:
+                stack.enter_context(contextlib.redirect_stdout(log))
+            main.DB.clear()
+            project = synthesize_project(main, size)
+            main.DB[project.id] = project
+            main.save_db()
+            persistence = bench_persistence(main, args.rounds)
+            endpoints = bench_endpoints(client, main, main.DB[project.id], args.ops)
+        report["results"].append({"shots": size, **persistence, "endpoints": endpoints})
+        for name, r in endpoints.items():
+            print(f"{size:6d} {name:50} {r['p50_ms']:9.2f} {r['p99_ms']:9.2f} {r['ops_per_s'] or 0:9.1f} {r['save_ms_per_op']:9.2f}")
+        print(f"{size:6d} {'save_db / load_db':50} {persistence['save_db']['best_ms']:9.2f} {persistence['load_db']['best_ms']:9.2f} "
+              f"file {persistence['file_bytes'] / 1024 ** 2:.1f} MiB, load peak {persistence['load_db']['peak_bytes'] / 1024 ** 2:.1f} MiB, "
+              f"retained {persistence['load_db']['retained_bytes'] / 1024 ** 2:.1f} MiB")
+
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"report written to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""End-to-end generation benchmark against local stand-in providers.
+
+Runs the real app under uvicorn in a throwaway data directory, points every provider at a
+fake from fake_providers, then drives the same flows the frontend does: "generate all
+storyboards" (concurrent POST /generate for every shot) for images and videos, both at once,
+and "generate all characters" (sequential POST /api/generate-asset). Reports throughput,
+p50/p99 job latency, upstream requests per job and event-loop blocking.
+
+    python bench_generation.py --shots 20 --latency 0.2 --jitter 0.1 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import socket
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+
+from fake_providers import FakeFalQueue, FakeOpenAI, FakeRongyiyun, FakeVolcengine
+
+SCENARIOS = (
+    ("openai", "image"),
+    ("vectorengine", "image"),
+    ("volcengine", "image"),
+    ("openai", "video"),
+    ("volcengine", "video"),
+    ("rongyiyun", "video"),
+    ("openai", "asset-batch"),
+    # Image jobs that hold long workers while video tasks wait on status polls
+    ("vectorengine+volcengine", "mixed"),
+)
+LAG_PROBE_INTERVAL_S = 0.05
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered) + 0.5)) - 1))]
+
+def configure(main, provider: str, kind: str, fakes: dict):
+    config = main.current_api_config
+    openai_base = f"{fakes['openai'].base_url}/v1"
+    config.openai_api_key = "bench-key"
+    config.openai_api_base = openai_base
+    config.openai_model = "fake-chat"
+    config.openai_image_api_base = openai_base
+    config.openai_image_api_key = "bench-key"
+    config.openai_image_model = "gpt-image-1"
+    config.openai_video_api_base = fakes["openai"].base_url
+    config.openai_video_api_key = "bench-key"
+    config.openai_video_model = "veo3"
+    config.openai_video_endpoint = "/v1/videos"
+    config.vectorengine_api_key = "bench-key"
+    config.vectorengine_api_base = fakes["vectorengine"].base_url
+    config.volc_access_key = "bench-ak"
+    config.volc_secret_key = "bench-sk"
+    config.rongyiyun_token = "bench-token"
+    config.rongyiyun_api_base = fakes["rongyiyun"].base_url
+    config.public_base_url = ""
+    if kind == "mixed":
+        config.image_provider, config.video_provider = provider.split("+")
+    elif kind == "video":
+        config.video_provider = provider
+    else:
+        config.image_provider = provider
+    main.init_ai_clients()
+    if main.visual_service:
+        main.visual_service.set_host(fakes["volcengine"].host)
+
+async def run_storyboards(client: httpx.AsyncClient, main, kind: str, shots: int, count: int, image_path: str) -> dict:
+    project_id = (await client.post("/projects", json={"name": f"bench-{kind}"})).json()["id"]
+    shot_ids = []
+    for i in range(shots):
+        shot = (await client.post(f"/projects/{project_id}/shots", json={"prompt": f"bench shot {i}, hero crosses the bridge at dusk"})).json()
+        shot_ids.append(shot["id"])
+    if kind == "video":
+        # Video providers start from the shot's storyboard image
+        for shot in main.DB[project_id].shots:
+            shot.image_url = "/" + image_path.replace(os.sep, "/")
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(
+        client.post("/generate", json={"project_id": project_id, "shot_id": shot_id, "type": kind, "count": count, "force": True})
+        for shot_id in shot_ids
+    ))
+    job_ids = [r.json()["job_id"] for r in responses]
+    jobs = {}
+    while len(jobs) < len(job_ids):
+        await asyncio.sleep(0.1)
+        for job_id in job_ids:
+            if job_id in jobs:
+                continue
+            job = main.job_registry.get(job_id)
+            if job and job.status in ("completed", "failed"):
+                jobs[job_id] = job
+    wall = time.perf_counter() - start
+
+    project = main.DB[project_id]
+    # Only media that reached local storage counts, not remote URLs left behind by a failed download
+    if kind == "video":
+        outputs = sum(1 for s in project.shots if (s.video_url or "").startswith("/static/"))
+    else:
+        outputs = sum(1 for s in project.shots for url in s.image_candidates or [] if url.startswith("/static/"))
+    latencies = [j.finished_at - j.created_at for j in jobs.values()]
+    return {
+        "jobs": len(jobs),
+        "failed": sum(1 for j in jobs.values() if j.status == "failed"),
+        "outputs": outputs,
+        "wall": wall,
+        "latencies": latencies
+    }
+
+async def run_asset_batch(client: httpx.AsyncClient, shots: int) -> dict:
+    project_id = (await client.post("/projects", json={"name": "bench-assets"})).json()["id"]
+    latencies, failed = [], 0
+    start = time.perf_counter()
+    # The frontend generates characters one after another
+    for i in range(shots):
+        t0 = time.perf_counter()
+        r = await client.post("/api/generate-asset", json={"prompt": f"character {i}, portrait", "type": "character", "project_id": project_id})
+        latencies.append(time.perf_counter() - t0)
+        if r.status_code != 200 or not (r.json().get("url") or "").startswith("/static/"):
+            failed += 1
+    return {"jobs": shots, "failed": failed, "outputs": shots - failed, "wall": time.perf_counter() - start, "latencies": latencies}
+
+async def run_mixed(client: httpx.AsyncClient, main, shots: int, count: int, image_path: str) -> dict:
+    images, videos = await asyncio.gather(
+        run_storyboards(client, main, "image", shots, count, image_path),
+        run_storyboards(client, main, "video", shots, count, image_path)
+    )
+    return {
+        "jobs": images["jobs"] + videos["jobs"],
+        "failed": images["failed"] + videos["failed"],
+        "outputs": images["outputs"] + videos["outputs"],
+        "wall": max(images["wall"], videos["wall"]),
+        # Video latency is what a starved poller shows up in
+        "latencies": videos["latencies"]
+    }
+
+async def bench(args):
+    workdir = tempfile.mkdtemp(prefix="bench_generation_")
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    # The fakes serve results from 127.0.0.1; have the app download them like any upstream video
+    os.environ["LOCAL_VIDEO_HOSTS"] = ""
+    import main
+    import metrics
+
+    fake_kwargs = {"latency": args.latency, "jitter": args.jitter, "error_rate": args.error_rate}
+    fakes = {
+        "openai": FakeOpenAI(job_seconds=args.job_seconds, **fake_kwargs).start(),
+        "vectorengine": FakeFalQueue(job_seconds=args.job_seconds, **fake_kwargs).start(),
+        "volcengine": FakeVolcengine(job_seconds=args.job_seconds, **fake_kwargs).start(),
+        "rongyiyun": FakeRongyiyun(job_seconds=args.job_seconds, **fake_kwargs).start(),
+    }
+    image_path = os.path.join("static", "uploads", "bench_source.png")
+    os.makedirs(os.path.dirname(image_path), exist_ok=True)
+    with open(image_path, "wb") as f:
+        from fake_providers import FAKE_PNG
+        f.write(FAKE_PNG)
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning", timeout_keep_alive=600))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    metrics.loop_monitor.interval = LAG_PROBE_INTERVAL_S
+    metrics.loop_monitor.ensure_started()
+
+    selected = [s for s in SCENARIOS if args.scenario in ("all", f"{s[0]}-{s[1]}")]
+    print(f"--- Generation benchmark: {args.shots} shots x {args.count} image(s), upstream latency {args.latency}s +{args.jitter}s jitter, "
+          f"{args.error_rate:.0%} errors, {args.job_seconds}s per upstream job ---")
+    print(f"{'scenario':24} {'jobs':>5} {'fail':>5} {'outputs':>8} {'wall s':>8} {'out/s':>7} {'p50 s':>7} {'p99 s':>7} {'req/job':>8} {'blocked ms':>11} {'max lag ms':>11}")
+    try:
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=600.0) as client:
+            for provider, kind in selected:
+                configure(main, provider, kind, fakes)
+                upstream_before = sum(f.total_requests() for f in fakes.values())
+                lag_before = metrics.loop_lag_seconds.total()
+                metrics.loop_monitor.max_lag = 0.0
+                # Provider modules log every request; keep the table readable unless asked
+                log = io.StringIO()
+                with contextlib.ExitStack() as stack:
+                    if not args.verbose:
+                        stack.enter_context(contextlib.redirect_stdout(log))
+                        stack.enter_context(contextlib.redirect_stderr(log))
+                    if kind == "asset-batch":
+                        result = await run_asset_batch(client, args.shots)
+                    elif kind == "mixed":
+                        result = await run_mixed(client, main, args.shots, args.count, image_path)
+                    else:
+                        result = await run_storyboards(client, main, kind, args.shots, args.count, image_path)
+                upstream = sum(f.total_requests() for f in fakes.values()) - upstream_before
+                blocked_ms = (metrics.loop_lag_seconds.total() - lag_before) * 1000
+                lat = result["latencies"]
+                print(f"{provider + '-' + kind:24} {result['jobs']:5d} {result['failed']:5d} {result['outputs']:8d} {result['wall']:8.2f} "
+                      f"{result['outputs'] / result['wall']:7.2f} {percentile(lat, 50):7.2f} {percentile(lat, 99):7.2f} "
+                      f"{upstream / max(1, result['jobs']):8.1f} {blocked_ms:11.1f} {metrics.loop_monitor.max_lag * 1000:11.1f}")
+    finally:
+        server.should_exit = True
+        await serve_task
+        for fake in fakes.values():
+            fake.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--shots", type=int, default=10)
+    parser.add_argument("--count", type=int, default=2, help="images per storyboard job")
+    parser.add_argument("--latency", type=float, default=0.1, help="fixed upstream latency per request (s)")
+    parser.add_argument("--jitter", type=float, default=0.05, help="extra random upstream latency (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of upstream requests answered with HTTP 500")
+    parser.add_argument("--job-seconds", type=float, default=1.0, help="time until an upstream async task completes")
+    parser.add_argument("--verbose", action="store_true", help="show the app's request logs")
+    parser.add_argument("--scenario", default="all", help="all, or one of: " + ", ".join(f"{p}-{k}" for p, k in SCENARIOS))
+    asyncio.run(bench(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import asyncio
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+from starlette.datastructures import UploadFile
+
+import md_import
+from name_resolver import NameResolver
+
+ROW_COUNT = 10_000
+CHARACTER_COUNT = 200
+SCENE_COUNT = 100
+
+def synthesize_assets():
+    characters = [f"角色{i}" for i in range(CHARACTER_COUNT)]
+    scenes = [f"场景地点{i}" for i in range(SCENE_COUNT)]
+    return characters, scenes
+
+def synthesize_shots_md(characters: list[str], scenes: list[str], rows: int = ROW_COUNT) -> bytes:
+    rng = random.Random(7)
+    lines = [
+        "# 第一集 分镜表",
+        "",
+        "| 编号 | 出场人物 | 场景 | 分镜提示词 | 视频提示词 |",
+        "| --- | --- | --- | --- | --- |"
+    ]
+    for i in range(1, rows + 1):
+        names = rng.sample(characters, 2)
+        # Some names carry annotations so they only resolve through the fuzzy fallback
+        if i % 5 == 0:
+            names[0] = f"{names[0]}（少年）"
+        scene = rng.choice(scenes)
+        if i % 7 == 0:
+            scene = f"{scene}·夜"
+        lines.append(f"| {i} | {'、'.join(names)} | {scene} | 中景，{names[0]}站在{scene}，风吹动衣角，第{i}镜 | 镜头缓慢推进，{names[1]}回头 |")
+    return "\n".join(lines).encode("utf-8")
+
+def legacy_parse_shots(content: bytes) -> list[dict]:
+    # Parsing stage of import_shots_from_md before md_import existed (DEBUG prints removed)
+    try:
+        text = content.decode("utf-8")
+    except:
+        text = content.decode("gbk", errors="ignore")
+    rows = []
+    header_found = False
+    idx_no = idx_chars = idx_scene = idx_prompt = idx_video = -1
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) > 0 and parts[0] == "":
+            parts.pop(0)
+        if len(parts) > 0 and parts[-1] == "":
+            parts.pop()
+        if not parts:
+            continue
+        if not header_found:
+            clean_parts = [p.replace(" ", "").replace("\t", "") for p in parts]
+            t_no = t_chars = t_scene = t_prompt = t_video = -1
+            for i, p in enumerate(clean_parts):
+                if "编号" in p or "序号" in p: t_no = i
+                elif "出场人物" in p or "角色" in p: t_chars = i
+                elif "场景" in p: t_scene = i
+                elif "视频提示词" in p: t_video = i
+                elif "分镜提示词" in p: t_prompt = i
+                elif "提示词" in p and t_prompt == -1 and t_video == -1: t_prompt = i
+            if t_chars != -1 or t_prompt != -1 or t_video != -1:
+                idx_no, idx_chars, idx_scene, idx_prompt, idx_video = t_no, t_chars, t_scene, t_prompt, t_video
+                header_found = True
+            continue
+        if all(c in "- :|" for c in "".join(parts)):
+            continue
+        number = None
+        if idx_no != -1 and len(parts) > idx_no:
+            try:
+                number = int(parts[idx_no])
+            except:
+                pass
+        char_names = []
+        if idx_chars != -1 and len(parts) > idx_chars:
+            raw = parts[idx_chars]
+            for sep in ["、", ",", "，", "/", "|"]:
+                raw = raw.replace(sep, " ")
+            char_names = [x.strip() for x in raw.split() if x.strip()]
+        scene_name = parts[idx_scene].strip() if idx_scene != -1 and len(parts) > idx_scene else ""
+        prompt = parts[idx_prompt].strip() if idx_prompt != -1 and len(parts) > idx_prompt else ""
+        video_prompt = parts[idx_video].strip() if idx_video != -1 and len(parts) > idx_video else ""
+        if char_names or scene_name or prompt or video_prompt:
+            rows.append({"number": number, "char_names": char_names, "scene_name": scene_name, "prompt": prompt, "video_prompt": video_prompt})
+    rows.sort(key=lambda r: (r["number"] if isinstance(r["number"], int) else 1_000_000))
+    return rows
+
+def legacy_resolve(names: list[str], assets: dict[str, str]) -> list[str | None]:
+    # Name resolution of import_shots_from_md before NameResolver: exact, normalized, then a scan
+    def normalize(s):
+        if not s: return ""
+        s = s.strip().lower()
+        for char in [" ", "\t", "，", ",", "。", ".", "：", ":", "“", "”", "'", '"', "（", "）", "(", ")", "-", "_"]:
+            s = s.replace(char, "")
+        return s
+    norm_to_id = {normalize(name): asset_id for name, asset_id in assets.items()}
+    resolved = []
+    for n in names:
+        n_clean = n.strip()
+        if n_clean in assets:
+            resolved.append(assets[n_clean])
+        elif normalize(n_clean) in norm_to_id:
+            resolved.append(norm_to_id[normalize(n_clean)])
+        else:
+            n_norm = normalize(n_clean)
+            match = None
+            for a_name, a_id in assets.items():
+                a_norm = normalize(a_name)
+                if n_norm and (n_norm in a_norm or a_norm in n_norm):
+                    match = a_id
+                    break
+            resolved.append(match)
+    return resolved
+
+async def _parse(content: bytes):
+    return await md_import.read_shots(UploadFile(io.BytesIO(content), filename="shots.md"))
+
+def _best(fn, rounds: int = 3) -> tuple[float, object]:
+    best, result = float("inf"), None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def bench_endpoint(content: bytes, characters: list[str], scenes: list[str]) -> float:
+    # Run the app against a throwaway data directory
+    workdir = tempfile.mkdtemp(prefix="bench_md_import_")
+    os.chdir(workdir)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from fastapi.testclient import TestClient
+    import main
+
+    client = TestClient(main.app)
+    project_id = client.post("/projects", json={"name": "bench"}).json()["id"]
+    for name in characters:
+        main.DB[project_id].characters.append(main.Character(id=f"c-{name}", name=name, avatar_url="", prompt=f"{name}的外貌"))
+    for name in scenes:
+        main.DB[project_id].scenes.append(main.Scene(id=f"s-{name}", name=name, image_url="", prompt=f"{name}的环境"))
+    main.prompt_builder.invalidate_assets(project_id)
+
+    start = time.perf_counter()
+    response = client.post(f"/projects/{project_id}/shots/import_from_md", files={"file": ("shots.md", content, "text/markdown")})
+    elapsed = time.perf_counter() - start
+    assert response.status_code == 200, response.text
+    assert response.json()["added"] == ROW_COUNT
+    return elapsed
+
+def main():
+    characters, scenes = synthesize_assets()
+    content = synthesize_shots_md(characters, scenes)
+
+    legacy_s, legacy_rows = _best(lambda: legacy_parse_shots(content))
+    stream_s, rows = _best(lambda: asyncio.run(_parse(content)))
+    mismatches = sum(1 for a, b in zip(legacy_rows, rows) if a != b._asdict()) + abs(len(legacy_rows) - len(rows))
+
+    print(f"--- Markdown shot import, {ROW_COUNT} rows ({len(content) / 1024:.0f} KiB), {CHARACTER_COUNT} characters, {SCENE_COUNT} scenes ---")
+    print(f"legacy parse (decode whole file) : {legacy_s * 1000:8.1f} ms")
+    print(f"md_import.read_shots (streamed)  : {stream_s * 1000:8.1f} ms")
+    print(f"row mismatches                   : {mismatches}")
+    names = [n for r in rows for n in r.char_names] + [r.scene_name for r in rows]
+    assets = {name: f"id-{name}" for name in characters + scenes}
+    legacy_res_s, legacy_ids = _best(lambda: legacy_resolve(names, assets), rounds=1)
+
+    def resolve_all():
+        resolver = NameResolver(assets.items())
+        return [resolver.resolve(n) for n in names]
+    resolver_s, ids = _best(resolve_all)
+    # Annotated names ("角色12（少年）", "场景地点3·夜") should resolve to the bare asset name
+    expected = [f"id-{n.split('（')[0].split('·')[0]}" for n in names]
+    legacy_ok = sum(a == e for a, e in zip(legacy_ids, expected))
+    resolver_ok = sum(a == e for a, e in zip(ids, expected))
+    print(f"legacy name resolution           : {legacy_res_s * 1000:8.1f} ms, {legacy_ok}/{len(names)} correct")
+    print(f"NameResolver (build + resolve)   : {resolver_s * 1000:8.1f} ms, {resolver_ok}/{len(names)} correct")
+    print(f"POST /shots/import_from_md       : {bench_endpoint(content, characters, scenes) * 1000:8.1f} ms (parse + name resolution + one save)")
+
+if __name__ == "__main__":
+    main()
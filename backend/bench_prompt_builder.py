@@ -0,0 +1,94 @@
+import random
+import re
+import time
+
+import prompt_builder
+from models import Project, Shot, Character, Scene
+
+SHOT_COUNT = 1000
+ROUNDS = 5
+
+def legacy_build(project: Project, shot: Shot) -> str:
+    # Inline prompt assembly as ai_generation_task did it before prompt_builder existed
+    prompt = shot.prompt or ""
+    remove_patterns = [
+        r"3-panel storyboard", r"3-panel", r"3 panel", r"triptych", r"three frames", r"three panel",
+        r"comic panel layout", r"clean gutters", r"no text", r"no watermark",
+        r"1-panel", r"single panel", r"1 panel", r"full shot", r"one frame",
+        r"2-panel", r"diptych", r"2 panel", r"two frames", r"two panel",
+        r"4-panel", r"2x2 grid", r"4 panel", r"four frames", r"four panel", r"yonkoma style",
+        r"vertical split", r"horizontal split"
+    ]
+    for pattern in remove_patterns:
+        prompt = re.sub(pattern, "", prompt, flags=re.IGNORECASE)
+    prompt = re.sub(r",\s*,", ",", prompt)
+    prompt = re.sub(r"\s+", " ", prompt).strip().strip(",")
+    style_desc = dict(prompt_builder.STYLE_PROMPTS).get(project.style, f"{project.style} style")
+    is_real = project.style == "real" or project.style == "realistic"
+    layout_prompts = dict(prompt_builder.REAL_LAYOUT_PROMPTS if is_real else prompt_builder.LAYOUT_PROMPTS)
+    layout_prompt = layout_prompts.get(shot.panel_layout, layout_prompts["3-panel"])
+    additional_prompts = []
+    if shot.scene_id:
+        scene_by_id = {s.id: s for s in (project.scenes or [])}
+        scene = scene_by_id.get(shot.scene_id)
+        if scene and scene.prompt:
+            additional_prompts.append(f"Scene location: {scene.prompt}")
+    if shot.characters:
+        char_by_id = {c.id: c for c in (project.characters or [])}
+        for char_id in shot.characters:
+            char = char_by_id.get(char_id)
+            if char and char.prompt:
+                additional_prompts.append(f"Character {char.name}: {char.prompt}")
+    base_parts = [style_desc, prompt] + additional_prompts + [layout_prompt, "high quality, detailed"]
+    return ", ".join(base_parts)
+
+def synthesize_project(shot_count: int) -> Project:
+    rng = random.Random(42)
+    characters = [Character(id=f"c{i}", name=f"角色{i}", avatar_url="", prompt=f"long black hair, robe {i}, calm eyes") for i in range(40)]
+    scenes = [Scene(id=f"s{i}", name=f"场景{i}", image_url="", prompt=f"ancient temple {i}, mist, dusk light") for i in range(20)]
+    keywords = prompt_builder.LAYOUT_KEYWORDS
+    shots = []
+    for i in range(shot_count):
+        text = f"镜头{i}: low angle, hero walks through the gate, {rng.choice(keywords)}, wind, {rng.choice(keywords).upper()}, dramatic light"
+        shots.append(Shot(
+            id=f"shot{i}",
+            order=i,
+            prompt=text,
+            characters=rng.sample([c.id for c in characters], 3),
+            scene_id=rng.choice(scenes).id,
+            panel_layout=rng.choice(["1-panel", "2-panel", "3-panel", "4-panel"])
+        ))
+    return Project(id="bench", name="bench", style="anime", shots=shots, characters=characters, scenes=scenes)
+
+def _time(fn) -> float:
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    project = synthesize_project(SHOT_COUNT)
+    legacy = [legacy_build(project, s) for s in project.shots]
+    built = [prompt_builder.build_shot_prompts(project, s).base_prompt for s in project.shots]
+    mismatches = sum(1 for a, b in zip(legacy, built) if a != b)
+
+    legacy_s = _time(lambda: [legacy_build(project, s) for s in project.shots])
+
+    def cold():
+        prompt_builder.clear()
+        prompt_builder.clean_prompt.cache_clear()
+        for s in project.shots:
+            prompt_builder.build_shot_prompts(project, s)
+    cold_s = _time(cold)
+    warm_s = _time(lambda: [prompt_builder.build_shot_prompts(project, s) for s in project.shots])
+
+    print(f"--- Prompt building for {SHOT_COUNT} shots (best of {ROUNDS}) ---")
+    print(f"legacy inline re.sub : {legacy_s * 1000:8.2f} ms")
+    print(f"prompt_builder cold  : {cold_s * 1000:8.2f} ms  ({legacy_s / cold_s:5.1f}x)")
+    print(f"prompt_builder warm  : {warm_s * 1000:8.2f} ms  ({legacy_s / warm_s:5.1f}x)")
+    print(f"output mismatches    : {mismatches}")
+
+if __name__ == "__main__":
+    main()
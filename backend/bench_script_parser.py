@@ -0,0 +1,87 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import script_parser
+
+SCENE_COUNT = 24
+LINES_PER_SCENE = 12
+# Simulated LLM cost: fixed round-trip plus output tokens proportional to the input
+ROUND_TRIP_S = 0.2
+SECONDS_PER_1K_CHARS = 0.25
+
+def synthesize_script() -> str:
+    lines = []
+    for s in range(SCENE_COUNT):
+        lines.append(f"场景：外门练武场{s % 6}")
+        for i in range(LINES_PER_SCENE):
+            speaker = ["陈远", "神秘师兄", " 陈远", "林月"][i % 4]
+            lines.append(f"{speaker}：第{s}场第{i}句台词，剑光闪过，衣袂翻飞，晨雾弥漫在青石台阶上。")
+    return "\n".join(lines)
+
+class FakeCompletions:
+    """Answers like an LLM would: one shot per dialogue line, slower for longer inputs."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def create(self, model, messages, temperature=0.7, stream=False):
+        self.calls += 1
+        chunk = messages[-1]["content"]
+        data = script_parser.mock_parse(chunk)
+        # Shots first, like the prompt asks for, so streaming can show them early
+        content = "```json\n" + json.dumps({"shots": data["shots"], "characters": data["characters"], "scenes": data["scenes"]}, ensure_ascii=False) + "\n```"
+        duration = ROUND_TRIP_S + SECONDS_PER_1K_CHARS * len(chunk) / 1000
+        if stream:
+            return self._stream(content, duration)
+        await asyncio.sleep(duration)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def _stream(self, content: str, duration: float):
+        await asyncio.sleep(ROUND_TRIP_S)
+        step = 40
+        pause = (duration - ROUND_TRIP_S) * step / len(content)
+        for i in range(0, len(content), step):
+            await asyncio.sleep(pause)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=content[i:i + step]))])
+
+def _client():
+    completions = FakeCompletions()
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions)), completions
+
+async def _run(script: str, max_chars: int, concurrency: int):
+    client, completions = _client()
+    start = time.perf_counter()
+    data = await script_parser.parse_script(client, "fake", script, max_chars=max_chars, concurrency=concurrency)
+    return time.perf_counter() - start, completions.calls, data
+
+async def main():
+    # Every run below must reach the (fake) LLM
+    script_parser.llm_cache.enabled = False
+    script = synthesize_script()
+    print(f"--- Parsing a {len(script)} char script ({SCENE_COUNT} scenes) ---")
+    single_s, _, single = await _run(script, max_chars=len(script) + 1, concurrency=1)
+    print(f"single call            : {single_s:6.2f} s  shots={len(single['shots'])}")
+    for concurrency in (1, 4, 8):
+        elapsed, calls, data = await _run(script, max_chars=script_parser.PARSE_CHUNK_CHARS, concurrency=concurrency)
+        same = [s["prompt"] for s in data["shots"]] == [s["prompt"] for s in single["shots"]]
+        print(f"chunks={calls:<3} concurrency={concurrency:<2}: {elapsed:6.2f} s  ({single_s / elapsed:4.1f}x)  "
+              f"shots={len(data['shots'])} characters={len(data['characters'])} scenes={len(data['scenes'])} order_preserved={same}")
+
+    client, _ = _client()
+    start = time.perf_counter()
+    first_shot_s = None
+    shots = []
+    async for event, data in script_parser.stream_script(client, "fake", script):
+        if event == "shot":
+            first_shot_s = first_shot_s or time.perf_counter() - start
+            shots.append(data["prompt"])
+        elif event == "done":
+            done = data
+    elapsed = time.perf_counter() - start
+    same = shots == [s["prompt"] for s in single["shots"]] == [s["prompt"] for s in done["shots"]]
+    print(f"streamed, concurrency={script_parser.PARSE_CONCURRENCY}: first shot {first_shot_s:5.2f} s, done {elapsed:5.2f} s  order_preserved={same}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
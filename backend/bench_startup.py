@@ -0,0 +1,127 @@
+"""Cold start benchmark: import time, lifespan startup and first request.
+
+Every run is a fresh interpreter in a throwaway data directory holding a synthetic
+projects.json of the given size, with all providers configured so client setup is part of
+the measurement. Reports the median of each phase and whether the provider SDKs were
+already imported when the app was ready to serve.
+
+    python bench_startup.py --shots 0,723,5000 --runs 5 --output bench_startup.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import bench_crud
+import models
+
+PROVIDER_ENV = {
+    "TEXT_PROVIDER": "openai",
+    "IMAGE_PROVIDER": "openai",
+    "VIDEO_PROVIDER": "volcengine",
+    "OPENAI_API_KEY": "bench-key",
+    "OPENAI_API_BASE": "http://127.0.0.1:9/v1",
+    "OPENAI_IMAGE_MODEL": "gpt-image-1",
+    "VOLC_ACCESSKEY": "bench-ak",
+    "VOLC_SECRETKEY": "bench-sk",
+}
+SDK_MODULES = ("openai", "volcengine")
+
+CHILD = r"""
+import asyncio, json, sys, time
+t0 = time.perf_counter()
+import main
+import httpx
+t_import = time.perf_counter()
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        t_ready = time.perf_counter()
+        sdks = [m for m in %(sdks)r if m in sys.modules]
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.get("/projects")
+            assert response.status_code == 200, response.status_code
+        t_first = time.perf_counter()
+    t_done = time.perf_counter()
+    return {
+        "import_ms": (t_import - t0) * 1000,
+        "startup_ms": (t_ready - t_import) * 1000,
+        "ready_ms": (t_ready - t0) * 1000,
+        "first_request_ms": (t_first - t_ready) * 1000,
+        "shutdown_ms": (t_done - t_first) * 1000,
+        "projects": len(main.DB),
+        "sdks_at_ready": sdks,
+    }
+
+print("RESULT " + json.dumps(asyncio.run(run())))
+"""
+
+def prepare(workdir: str, shots: int):
+    os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+    os.makedirs(os.path.join(workdir, "static", "uploads"), exist_ok=True)
+    path = os.path.join(workdir, "data", "projects.json")
+    if not shots:
+        # Empty store: startup seeds the default project
+        if os.path.exists(path):
+            os.remove(path)
+        return
+    project = bench_crud.synthesize_project(models, shots)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{" + json.dumps(project.id) + ": " + project.model_dump_json() + "}")
+
+def run_once(workdir: str, here: str) -> dict:
+    env = {**os.environ, **PROVIDER_ENV, "PYTHONPATH": here + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    proc = subprocess.run([sys.executable, "-c", CHILD % {"sdks": SDK_MODULES}], cwd=workdir, env=env, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"startup run failed (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+def _git_commit(path: str) -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=path, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--shots", default="0,723,5000", help="comma-separated shot counts of the stored project")
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per size (median is reported)")
+    parser.add_argument("--output", default=None, help="optional JSON report path")
+    args = parser.parse_args()
+    here = os.path.dirname(os.path.abspath(__file__))
+    phases = ("import_ms", "startup_ms", "ready_ms", "first_request_ms", "shutdown_ms")
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": _git_commit(here),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "results": []
+    }
+    print(f"--- Cold start: median of {args.runs} fresh interpreters, all providers configured ---")
+    print(f"{'shots':>6} {'import ms':>10} {'startup ms':>11} {'ready ms':>9} {'1st req ms':>11} {'shutdown ms':>12}  sdks imported at ready")
+    for size in (int(s) for s in args.shots.split(",") if s.strip()):
+        workdir = tempfile.mkdtemp(prefix="bench_startup_")
+        prepare(workdir, size)
+        runs = [run_once(workdir, here) for _ in range(args.runs)]
+        result = {"shots": size, **{p: round(statistics.median(r[p] for r in runs), 1) for p in phases},
+                  "sdks_at_ready": runs[-1]["sdks_at_ready"]}
+        report["results"].append(result)
+        print(f"{size:6d} {result['import_ms']:10.1f} {result['startup_ms']:11.1f} {result['ready_ms']:9.1f} "
+              f"{result['first_request_ms']:11.1f} {result['shutdown_ms']:12.1f}  {', '.join(result['sdks_at_ready']) or '-'}")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
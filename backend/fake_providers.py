@@ -0,0 +1,304 @@
+"""Local stand-in servers for upstream AI providers.
+
+Used by the test and benchmark scripts so they can run offline without paying vendors.
+Each fake runs a ThreadingHTTPServer on 127.0.0.1 and counts requests per route.
+"""
+import base64
+import json
+import random
+import struct
+import threading
+import time
+import urllib.request
+import uuid
+import zlib
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Smallest valid-looking MP4 header; clients only check the content type
+FAKE_MP4 = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom"
+
+def _png(width: int, height: int) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    raw = b"".join(b"\x00" + b"".join(bytes((x % 256, y % 256, 128)) for x in range(width)) for y in range(height))
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)) + chunk(b"IDAT", zlib.compress(raw)) + chunk(b"IEND", b"")
+
+# A real (if small) RGB image, so thumbnails and type sniffing work on downloaded results
+FAKE_PNG = _png(64, 36)
+
+class FakeServer:
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = Counter()
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _dispatch(self, method: str):
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else {}
+                except Exception:
+                    body = {}
+                query = parse_qs(parsed.query)
+                route = fake.route_name(method, parsed.path, query)
+                with fake._lock:
+                    fake.requests[route] += 1
+                delay = fake.latency + random.uniform(0, fake.jitter) if (fake.latency or fake.jitter) else 0
+                if delay:
+                    time.sleep(delay)
+                if fake.error_rate and random.random() < fake.error_rate:
+                    return self._send(500, {"error": "injected failure"})
+                if method == "GET" and parsed.path.startswith("/files/"):
+                    return self._send(200, fake.file_payload(parsed.path))
+                status, payload = fake.handle(method, parsed.path, query, body, dict(self.headers))
+                self._send(status, payload)
+
+            def _send(self, status: int, payload):
+                if isinstance(payload, tuple):
+                    content_type, data = payload
+                else:
+                    content_type, data = "application/json", json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def route_name(self, method: str, path: str, query: dict) -> str:
+        if path.startswith("/files/"):
+            return f"{method} /files/{{id}}"
+        return f"{method} {path}"
+
+    def file_url(self, name: str) -> str:
+        return f"{self.base_url}/files/{name}"
+
+    def file_payload(self, path: str) -> tuple[str, bytes]:
+        """Result media every fake serves under /files/, typed by extension."""
+        if path.endswith(".mp4"):
+            return "video/mp4", FAKE_MP4
+        return "image/png", FAKE_PNG
+
+    def handle(self, method: str, path: str, query: dict, body: dict, headers: dict):
+        return 404, {"error": "not found"}
+
+    def total_requests(self, prefix: str = "") -> int:
+        with self._lock:
+            return sum(n for route, n in self.requests.items() if route.startswith(prefix))
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class FakeOpenAIVideo(FakeServer):
+    """OpenAI-compatible async video API (create + query), optionally calling back a webhook."""
+
+    def __init__(self, job_seconds: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.job_seconds = job_seconds
+        self.jobs: dict[str, dict] = {}
+
+    def route_name(self, method: str, path: str, query: dict) -> str:
+        if path.startswith("/v1/videos/"):
+            return f"{method} /v1/videos/{{id}}"
+        return super().route_name(method, path, query)
+
+    def _job_payload(self, job: dict) -> dict:
+        if time.monotonic() >= job["ready_at"]:
+            return {"id": job["id"], "status": "completed", "video_url": self.file_url(f"{job['id']}.mp4")}
+        return {"id": job["id"], "status": "processing"}
+
+    def _call_back(self, job: dict):
+        time.sleep(max(0.0, job["ready_at"] - time.monotonic()))
+        req = urllib.request.Request(
+            job["webhook"],
+            data=json.dumps(self._job_payload(job)).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST"
+        )
+        # Counted before sending: the receiver may finish the job before urlopen returns
+        with self._lock:
+            self.requests["CALLBACK"] += 1
+        try:
+            with urllib.request.urlopen(req, timeout=30) as resp:
+                resp.read()
+        except Exception as e:
+            print(f"[FakeOpenAIVideo] callback failed: {e}")
+
+    def handle(self, method, path, query, body, headers):
+        if method == "POST" and path == "/v1/videos":
+            job = {"id": str(uuid.uuid4()), "ready_at": time.monotonic() + self.job_seconds, "webhook": body.get("webHook")}
+            self.jobs[job["id"]] = job
+            if job["webhook"] and job["webhook"].startswith("http"):
+                threading.Thread(target=self._call_back, args=(job,), daemon=True).start()
+            return 200, {"id": job["id"], "status": "queued"}
+        if method == "GET" and path.startswith("/v1/videos/"):
+            job = self.jobs.get(path.rsplit("/", 1)[-1])
+            if not job:
+                return 404, {"error": "unknown task"}
+            return 200, self._job_payload(job)
+        return 404, {"error": "not found"}
+
+class FakeOpenAI(FakeOpenAIVideo):
+    """OpenAI-compatible images, chat completions and video on one server (base URL + /v1).
+
+    Images answer with a URL under /files/ (or ``b64_json`` when asked for it). Chat answers
+    with ``chat_content``, as server-sent events when the request sets ``stream``.
+    """
+
+    def __init__(self, chat_content: str | None = None, **kwargs):
+        super().__init__(**kwargs)
+        self.chat_content = chat_content if chat_content is not None else json.dumps({"shots": [], "characters": [], "scenes": []})
+
+    def _chat_stream(self, model: str, content: str) -> bytes:
+        events = []
+        for i in range(0, len(content), 16):
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": model, "choices": [{"index": 0, "delta": {"content": content[i:i + 16]}, "finish_reason": None}]}
+            events.append(f"data: {json.dumps(chunk)}\n\n")
+        events.append("data: [DONE]\n\n")
+        return "".join(events).encode("utf-8")
+
+    def handle(self, method, path, query, body, headers):
+        if method == "POST" and path.endswith("/images/generations"):
+            count = int(body.get("n") or 1)
+            if body.get("response_format") == "b64_json":
+                data = [{"b64_json": base64.b64encode(FAKE_PNG).decode("ascii")} for _ in range(count)]
+            else:
+                data = [{"url": self.file_url(f"{uuid.uuid4()}.png")} for _ in range(count)]
+            return 200, {"created": int(time.time()), "data": data}
+        if method == "POST" and path.endswith("/chat/completions"):
+            model = body.get("model", "fake-model")
+            if body.get("stream"):
+                return 200, ("text/event-stream", self._chat_stream(model, self.chat_content))
+            return 200, {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.chat_content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            }
+        return super().handle(method, path, query, body, headers)
+
+class FakeFalQueue(FakeServer):
+    """fal.ai-style queue API as proxied by VectorEngine: submit to /fal-ai/<model>, poll the status URL."""
+
+    def __init__(self, job_seconds: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.job_seconds = job_seconds
+        self.jobs: dict[str, float] = {}
+
+    def route_name(self, method: str, path: str, query: dict) -> str:
+        if "/requests/" in path:
+            return f"{method} /fal-ai/{{model}}/requests/{{id}}/status"
+        if path.startswith("/fal-ai/"):
+            return f"{method} /fal-ai/{{model}}"
+        return super().route_name(method, path, query)
+
+    def handle(self, method, path, query, body, headers):
+        if method == "POST" and path.startswith("/fal-ai/") and "/requests/" not in path:
+            request_id = str(uuid.uuid4())
+            self.jobs[request_id] = time.monotonic()
+            status_url = f"{self.base_url}{path}/requests/{request_id}/status"
+            return 200, {"request_id": request_id, "status": "IN_QUEUE", "status_url": status_url, "response_url": status_url.rsplit("/", 1)[0]}
+        if method == "GET" and "/requests/" in path:
+            request_id = path.split("/requests/", 1)[1].split("/", 1)[0]
+            submitted = self.jobs.get(request_id)
+            if submitted is None:
+                return 404, {"detail": "Request not found"}
+            elapsed = time.monotonic() - submitted
+            if elapsed >= self.job_seconds:
+                return 200, {"status": "COMPLETED", "request_id": request_id, "images": [{"url": self.file_url(f"{request_id}.png"), "width": 64, "height": 36}]}
+            return 200, {"status": "IN_QUEUE" if elapsed < self.job_seconds / 2 else "IN_PROGRESS", "request_id": request_id}
+        return 404, {"error": "not found"}
+
+class FakeVolcengine(FakeServer):
+    """Volcengine visual sync2async API (CVSync2AsyncSubmitTask / CVSync2AsyncGetResult).
+
+    Point a VisualService at it with ``set_host(fake.host)``; the SDK talks plain HTTP by
+    default and the fake ignores request signing. ``req_key`` values containing "i2v" or
+    "video" produce a video URL, anything else an image URL.
+    """
+
+    def __init__(self, job_seconds: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.job_seconds = job_seconds
+        self.tasks: dict[str, dict] = {}
+
+    @property
+    def host(self) -> str:
+        return f"127.0.0.1:{self.server.server_address[1]}"
+
+    def route_name(self, method: str, path: str, query: dict) -> str:
+        action = (query.get("Action") or [None])[0]
+        return f"{method} {action}" if action else super().route_name(method, path, query)
+
+    def handle(self, method, path, query, body, headers):
+        action = (query.get("Action") or [None])[0]
+        if action == "CVSync2AsyncSubmitTask":
+            req_key = body.get("req_key", "")
+            task_id = uuid.uuid4().hex
+            self.tasks[task_id] = {"submitted": time.monotonic(), "video": "i2v" in req_key or "video" in req_key}
+            return 200, {"code": 10000, "message": "Success", "data": {"task_id": task_id}}
+        if action == "CVSync2AsyncGetResult":
+            task = self.tasks.get(body.get("task_id", ""))
+            if not task:
+                return 200, {"code": 50411, "message": "task not found", "data": None}
+            elapsed = time.monotonic() - task["submitted"]
+            if elapsed < self.job_seconds:
+                return 200, {"code": 10000, "message": "Success", "data": {"status": "generating", "progress": int(100 * elapsed / self.job_seconds)}}
+            name = body.get("task_id")
+            if task["video"]:
+                return 200, {"code": 10000, "message": "Success", "data": {"status": "done", "video_url": self.file_url(f"{name}.mp4")}}
+            return 200, {"code": 10000, "message": "Success", "data": {"status": "done", "image_urls": [self.file_url(f"{name}.png")]}}
+        return 404, {"error": "not found"}
+
+class FakeRongyiyun(FakeServer):
+    """RongYiYun Sora2 task API: createSora2, then getAiTaskResult until status 1."""
+
+    def __init__(self, job_seconds: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.job_seconds = job_seconds
+        self.projects: dict[str, float] = {}
+
+    def handle(self, method, path, query, body, headers):
+        if method == "POST" and path.endswith("/apiAiProject/createSora2"):
+            project_id = uuid.uuid4().hex
+            self.projects[project_id] = time.monotonic()
+            return 200, {"code": 0, "msg": "ok", "data": {"projectId": project_id}}
+        if method == "GET" and path.endswith("/apiAiProject/getAiTaskResult"):
+            project_id = (query.get("projectId") or [""])[0]
+            submitted = self.projects.get(project_id)
+            if submitted is None:
+                return 200, {"code": 1, "msg": "project not found"}
+            if time.monotonic() - submitted < self.job_seconds:
+                return 200, {"code": 0, "data": {"projectId": project_id, "status": 0}}
+            return 200, {"code": 0, "data": {"projectId": project_id, "status": 1, "mediaUrl": self.file_url(f"{project_id}.mp4")}}
+        return 404, {"error": "not found"}
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from urllib.parse import unquote
+
+CACHE_FILE = os.path.join("data", "generation_cache.json")
+MAX_ENTRIES = 5000
+
+def hash_bytes(data: bytes | str) -> str:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+_file_hashes: dict[tuple[str, float, int], str] = {}
+
+def hash_reference(url: str | None) -> str | None:
+    """Content hash of a reference image; remote URLs can only be identified by the URL itself."""
+    if not url:
+        return None
+    local_path = _local_path(url)
+    if local_path:
+        st = os.stat(local_path)
+        key = (local_path, st.st_mtime, st.st_size)
+        if key not in _file_hashes:
+            with open(local_path, "rb") as f:
+                _file_hashes[key] = hashlib.sha256(f.read()).hexdigest()
+        return _file_hashes[key]
+    return hash_bytes(url)
+
+def _local_path(url: str) -> str | None:
+    if "/static/uploads/" not in url:
+        return None
+    rel = unquote(url.split("/static/uploads/")[-1].lstrip("/"))
+    path = os.path.join("static", "uploads", rel)
+    return path if os.path.exists(path) else None
+
+class GenerationCache:
+    """Persistent map from a generation's inputs to the media it produced.
+
+    The key covers everything that determines the upstream output: provider, model,
+    final prompt, negative prompt, reference image hashes, layout and the seed when it
+    is fixed. Entries only hold local /static URLs whose files still exist.
+
+    ``put`` rewrites the index file, so callers on the event loop run it on an executor;
+    lookups never wait for a write.
+    """
+
+    def __init__(self, path: str = CACHE_FILE, max_entries: int = MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._entries: dict[str, dict] | None = None
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(provider: str, model: str | None, prompt: str, negative_prompt: str = "", reference_hashes: list[str] | None = None, layout: str | None = None, seed: int | None = None) -> str:
+        parts = {
+            "provider": provider,
+            "model": model or "",
+            "prompt": prompt,
+            "negative_prompt": negative_prompt or "",
+            "references": sorted(h for h in (reference_hashes or []) if h),
+            "layout": layout or "",
+            # -1 / None means a random seed, so identical inputs must not share outputs
+            "seed": seed if seed is not None and seed >= 0 else None
+        }
+        return hash_bytes(json.dumps(parts, ensure_ascii=False, sort_keys=True))
+
+    def _load(self) -> dict[str, dict]:
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    entries = {}
+                    if os.path.exists(self.path):
+                        try:
+                            with open(self.path, "r", encoding="utf-8") as f:
+                                entries = json.load(f)
+                        except Exception as e:
+                            print(f"Failed to load generation cache: {e}")
+                    self._entries = entries
+        return self._entries
+
+    def get(self, key: str) -> list[str]:
+        entry = self._load().get(key)
+        outputs = [u for u in (entry or {}).get("outputs", []) if _local_path(u)]
+        if outputs:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return outputs
+
+    def put(self, key: str, outputs: list[str], **meta):
+        outputs = [u for u in outputs if isinstance(u, str) and _local_path(u)]
+        if not outputs:
+            return
+        entries = self._load()
+        with self._lock:
+            # A new entry dict rather than an edit, so a snapshot being written stays intact
+            previous = entries.pop(key, None) or {"outputs": []}
+            entries[key] = {**previous, "outputs": list(dict.fromkeys(previous["outputs"] + outputs)), "updated_at": time.time(), **meta}
+            while len(entries) > self.max_entries:
+                del entries[next(iter(entries))]
+        self._save()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._load()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
+
+    def _save(self):
+        # Writes go one at a time, each with a snapshot taken once it is its turn, so the
+        # file always ends up with the newest entries
+        with self._save_lock:
+            with self._lock:
+                snapshot = dict(self._entries)
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                temp_file = f"{self.path}.tmp"
+                with open(temp_file, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f, ensure_ascii=False)
+                os.replace(temp_file, self.path)
+            except Exception as e:
+                print(f"Error saving generation cache: {e}")
+
+generation_cache = GenerationCache()
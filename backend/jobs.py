@@ -0,0 +1,130 @@
+import time
+import uuid
+from collections import OrderedDict
+
+from models import GenerationJob
+import metrics
+
+MAX_FINISHED_JOBS = 1000
+IDEMPOTENCY_WINDOW_S = 24 * 60 * 60
+
+def _lease_key(inflight_key: tuple) -> str:
+    return "|".join(str(part) for part in inflight_key)
+
+class JobRegistry:
+    """In-memory record of generation jobs started by /generate.
+
+    With a shared state store attached (several workers), job records are written through
+    so any worker can answer /jobs/{id}, and each running job holds a lease on its
+    in-flight key: duplicates submitted to another worker attach to it, and the lease
+    lapses if the owning worker dies.
+    """
+
+    def __init__(self, max_finished: int = MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs: "OrderedDict[str, GenerationJob]" = OrderedDict()
+        # (project_id, shot_id, type, prompt fingerprint) -> id of the job producing it
+        self._inflight: dict[tuple, str] = {}
+        self._inflight_keys: dict[str, tuple] = {}
+        self.store = None
+        self.owner = None
+
+    def attach(self, store, owner: str):
+        self.store = store
+        self.owner = owner
+
+    def create(self, project_id: str, shot_id: str, type: str, video_id: str | None = None, inflight_key: tuple | None = None) -> GenerationJob:
+        job = GenerationJob(id=str(uuid.uuid4()), project_id=project_id, shot_id=shot_id, type=type, video_id=video_id, created_at=time.time())
+        self._jobs[job.id] = job
+        if inflight_key:
+            self._inflight[inflight_key] = job.id
+            self._inflight_keys[job.id] = inflight_key
+        if self.store:
+            self.store.put_job(job)
+            if inflight_key:
+                self.store.acquire_lease(_lease_key(inflight_key), self.owner, job.id)
+        self._prune()
+        return job
+
+    def find_inflight(self, inflight_key: tuple) -> GenerationJob | None:
+        job = self.get(self._inflight.get(inflight_key))
+        if not job and self.store:
+            holder = self.store.lease_holder(_lease_key(inflight_key))
+            job = self.get(holder[1]) if holder else None
+        if job and job.status in ("queued", "running"):
+            return job
+        return None
+
+    def get(self, job_id: str | None) -> GenerationJob | None:
+        if not job_id:
+            return None
+        job = self._jobs.get(job_id)
+        if job is None and self.store:
+            # Started by another worker
+            job = self.store.get_job(job_id)
+        return job
+
+    def start(self, job_id: str | None):
+        job = self.get(job_id)
+        if job:
+            job.status = "running"
+            job.started_at = time.time()
+            if self.store:
+                self.store.put_job(job)
+
+    def finish(self, job_id: str | None, error: str | None = None):
+        job = self.get(job_id)
+        if job:
+            job.status = "failed" if error else "completed"
+            job.error = error
+            job.finished_at = time.time()
+            metrics.observe_job(job.type, job.created_at, job.started_at, job.finished_at, job.status)
+            if self.store:
+                self.store.put_job(job)
+        key = self._inflight_keys.pop(job_id, None) if job_id else None
+        if key and self._inflight.get(key) == job_id:
+            del self._inflight[key]
+        if key and self.store:
+            self.store.release_lease(_lease_key(key), job_id)
+
+    def counts(self) -> dict[str, int]:
+        counts = {"queued": 0, "running": 0, "completed": 0, "failed": 0}
+        for job in self._jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def active(self) -> list[GenerationJob]:
+        return [j for j in self._jobs.values() if j.status in ("queued", "running")]
+
+    def _prune(self):
+        finished = [jid for jid, j in self._jobs.items() if j.status in ("completed", "failed")]
+        for jid in finished[:max(0, len(finished) - self.max_finished)]:
+            del self._jobs[jid]
+
+class IdempotencyStore:
+    """Remembers the response of a request made with an Idempotency-Key header."""
+
+    def __init__(self, window_s: float = IDEMPOTENCY_WINDOW_S):
+        self.window_s = window_s
+        self._entries: dict[str, tuple[float, tuple, dict]] = {}
+
+    def get(self, key: str, fingerprint: tuple) -> dict | None:
+        self._expire()
+        entry = self._entries.get(key)
+        if not entry:
+            return None
+        if entry[1] != fingerprint:
+            raise ValueError("Idempotency-Key was already used for a different request")
+        return entry[2]
+
+    def put(self, key: str, fingerprint: tuple, response: dict):
+        self._entries[key] = (time.monotonic(), fingerprint, response)
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [k for k, (ts, _, _) in self._entries.items() if now - ts > self.window_s]
+        for k in expired:
+            del self._entries[k]
+
+job_registry = JobRegistry()
+idempotency_store = IdempotencyStore()
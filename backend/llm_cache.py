@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+import time
+
+from generation_cache import hash_bytes
+
+CACHE_FILE = os.path.join("data", "llm_cache.json")
+TTL_S = float(os.getenv("LLM_CACHE_TTL_S", str(7 * 24 * 60 * 60)))
+MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "2000"))
+MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+class LLMCache:
+    """Persistent cache of LLM text results (script parses, image descriptions).
+
+    Keys are ``(model, prompt template version, input hash)``: changing the model or
+    bumping a template version never serves stale answers. Entries expire after
+    ``ttl_s`` and the least recently used ones are evicted once the cache holds more
+    than ``max_entries`` entries or ``max_bytes`` of serialized values.
+
+    ``put`` rewrites the cache file, so callers on the event loop run it on an executor.
+    Workers sharing the file merge in each other's entries before writing it.
+    """
+
+    def __init__(self, path: str = CACHE_FILE, ttl_s: float = TTL_S, max_entries: int = MAX_ENTRIES, max_bytes: int = MAX_BYTES):
+        self.path = path
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = os.getenv("LLM_CACHE_ENABLED", "1") != "0"
+        self._entries: dict[str, dict] | None = None
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # (mtime, size) of the file as we last read or wrote it
+        self._file_stamp = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model: str, template_version: str, input_hash: str) -> str:
+        return hash_bytes(json.dumps([model or "", template_version, input_hash]))
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _read_file(self) -> dict[str, dict]:
+        stamp = self._stamp()
+        entries = {}
+        if stamp:
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    entries = json.load(f)
+            except Exception as e:
+                print(f"Failed to load LLM cache: {e}")
+        self._file_stamp = stamp
+        return entries
+
+    def _load(self) -> dict[str, dict]:
+        if self._entries is None:
+            with self._lock:
+                if self._entries is None:
+                    entries = self._read_file()
+                    self._bytes = sum(e.get("size", 0) for e in entries.values())
+                    self._entries = entries
+        return self._entries
+
+    def get(self, key: str):
+        if not self.enabled:
+            return None
+        entries = self._load()
+        with self._lock:
+            entry = entries.pop(key, None)
+            if entry is not None and time.time() - entry["created_at"] > self.ttl_s:
+                self._bytes -= entry.get("size", 0)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            # Re-insert so dict order tracks recency; persisted lazily on the next put
+            entries[key] = entry
+            self.hits += 1
+        return entry["value"]
+
+    def put(self, key: str, value, **meta):
+        if not self.enabled:
+            return
+        entries = self._load()
+        size = len(json.dumps(value, ensure_ascii=False).encode("utf-8"))
+        with self._lock:
+            old = entries.pop(key, None)
+            if old:
+                self._bytes -= old.get("size", 0)
+            entries[key] = {"value": value, "size": size, "created_at": time.time(), **meta}
+            self._bytes += size
+            self._evict()
+        self._save()
+
+    def _merge_file(self):
+        """Take in entries another worker wrote to the file since we last read or wrote it."""
+        if self._stamp() == self._file_stamp:
+            return
+        disk = self._read_file()
+        with self._lock:
+            entries = self._entries
+            now = time.time()
+            new = {k: e for k, e in disk.items() if k not in entries and now - e.get("created_at", 0) <= self.ttl_s}
+            if not new:
+                return
+            # Ahead of ours in recency order: nothing here has used them yet
+            merged = {**new, **entries}
+            entries.clear()
+            entries.update(merged)
+            self._bytes += sum(e.get("size", 0) for e in new.values())
+            self._evict()
+
+    def _evict(self):
+        entries = self._entries
+        now = time.time()
+        for key in [k for k, e in entries.items() if now - e["created_at"] > self.ttl_s]:
+            self._bytes -= entries.pop(key).get("size", 0)
+            self.expired += 1
+        while entries and (len(entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._bytes -= entries.pop(next(iter(entries))).get("size", 0)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        entries = self._load()
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "expired": self.expired,
+            "evictions": self.evictions
+        }
+
+    def _save(self):
+        # Writes go one at a time, each with a snapshot taken once it is its turn, so the
+        # file always ends up with the newest entries
+        with self._save_lock:
+            try:
+                self._merge_file()
+                with self._lock:
+                    snapshot = dict(self._entries)
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                # Per process, since workers share the cache file
+                temp_file = f"{self.path}.{os.getpid()}.tmp"
+                with open(temp_file, "w", encoding="utf-8") as f:
+                    json.dump(snapshot, f, ensure_ascii=False)
+                os.replace(temp_file, self.path)
+                self._file_stamp = self._stamp()
+            except Exception as e:
+                print(f"Error saving LLM cache: {e}")
+
+llm_cache = LLMCache()
@@ -0,0 +1,46 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+import metrics
+
+lock_wait_seconds = metrics.REGISTRY.histogram("mochiani_project_lock_wait_seconds", "Time a mutation waited for another mutation of the same project to finish.")
+
+class KeyedLocks:
+    """One ``asyncio.Lock`` per key, created on first use and dropped once nobody holds or awaits it.
+
+    Mutations of the same project run one at a time, including any awaits between reading
+    and saving, while mutations of other projects never wait on them. Synchronous code that
+    never yields (progress callbacks) is already atomic on the event loop and skips the lock.
+    """
+
+    def __init__(self):
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._users: dict[str, int] = {}
+
+    @asynccontextmanager
+    async def hold(self, key: str):
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            if lock.locked():
+                start = time.perf_counter()
+                await lock.acquire()
+                lock_wait_seconds.observe(time.perf_counter() - start)
+            else:
+                await lock.acquire()
+            try:
+                yield
+            finally:
+                lock.release()
+        finally:
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                del self._locks[key]
+
+    def stats(self) -> dict:
+        held = sum(1 for lock in self._locks.values() if lock.locked())
+        return {"held": held, "waiting": sum(self._users.values()) - held}
+
+project_locks = KeyedLocks()
@@ -1,9 +1,9 @@
 import asyncio
+import contextvars
 import time
 import uuid
 import os
 import json
-import shutil
 import base64
 import imghdr
 import io
@@ -12,14 +12,30 @@ import re
 from urllib.parse import urlparse, unquote
 from typing import List, Dict, Any
 from pydantic import BaseModel
-from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, BackgroundTasks, UploadFile, File, Request, Response, Header, Depends
+from fastapi.responses import StreamingResponse, PlainTextResponse, FileResponse
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from dotenv import load_dotenv
-from openai import AsyncOpenAI
-from volcengine.visual.VisualService import VisualService
-from models import Project, Shot, Character, Scene, ShotCreate, ShotUpdate, GenerateRequest, GenerationStatus, AssetGenerateRequest, CharacterUpdate, SceneUpdate, VideoItem
-from providers import generate_image, generate_video, rongyiyun_provider
+import anyio
+from models import Project, Shot, Character, Scene, ShotCreate, ShotUpdate, GenerateRequest, GenerationStatus, AssetGenerateRequest, CharacterUpdate, SceneUpdate, VideoItem, GenerationJob
+from providers import generate_image, generate_video, parse_webhook, task_poller, TaskFailed, TaskTimeout, DONE, FAILED, short_executor, executor_stats, breakers
+from providers.clients import openai_client, volcengine_visual, warm_up
+from providers.pool import provider_pool, ProviderAccount, RateState
+from providers.hedging import image_hedger
+import webhooks
+import state
+import prompt_builder
+import script_parser
+import md_import
+import media
+from name_resolver import NameResolver
+from generation_cache import generation_cache, hash_bytes, hash_reference
+from jobs import job_registry, idempotency_store
+from locks import project_locks
+from llm_cache import llm_cache
+import metrics
+from tracing import tracer
+import profiling
 class ProjectCreate(BaseModel):
     name: str
     style: str = "anime"
@@ -30,13 +46,32 @@ class ProjectUpdate(BaseModel):
     default_panel_layout: str | None = None
     default_image_count: int | None = None
 
-load_dotenv()
-
-app = FastAPI(title="MochiAni Backend", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup work lives here rather than at import time, so importing main (uvicorn
+    # --reload, worker spawn, scripts) stays cheap
+    load_api_config()
+    init_ai_clients()
+    await anyio.to_thread.run_sync(load_db)
+    seed_data()
+    # Import the configured provider SDKs off the loop instead of on the first request
+    warm = asyncio.create_task(anyio.to_thread.run_sync(warm_up, client, *provider_pool.clients()))
+    sync = None
+    if state_backend.shared:
+        job_registry.attach(state_backend, state.WORKER_ID)
+        # A callback can reach any worker, so they all need to sign with the same secret
+        webhooks.use_fallback_secret(await anyio.to_thread.run_sync(state_backend.shared_secret, "webhook"))
+        sync = asyncio.create_task(_state_sync_loop())
+    yield
+    if sync:
+        sync.cancel()
+    await warm
+
+app = FastAPI(title="MochiAni Backend", version="1.0.0", lifespan=lifespan)
 
 # --- Static Files ---
 os.makedirs("static/uploads", exist_ok=True)
-app.mount("/static", StaticFiles(directory="static"), name="static")
+app.mount("/static", media.MediaFiles(directory="static"), name="static")
 
 # --- API Config Management ---
 API_CONFIG_FILE = os.path.join("data", "api_config.json")
@@ -70,11 +105,26 @@ class ApiConfig(BaseModel):
     rongyiyun_api_base: str = "https://zcbservice.aizfw.cn/kyyApi"
     rongyiyun_ratio: str = "16:9"
     rongyiyun_duration: int = 10
+    # Provider callbacks (webhooks). Only used when public_base_url is reachable from the internet.
+    public_base_url: str = ""
+    webhook_secret: str = ""
+    # Provider pool: presets (of the same provider) whose accounts share the load with this config
+    image_pool: List[str] = []
+    video_pool: List[str] = []
+    pool_strategy: str = "least_loaded" # least_loaded or weighted_round_robin
+    # Image hedging: a second configured image provider that takes over a call when the
+    # primary fails or is slower than image_hedge_delay seconds (0 = the primary's p95)
+    image_hedge_provider: str = ""
+    image_hedge_delay: float = 0
 
 class ApiPreset(BaseModel):
     name: str
     type: str  # text, image, video
     config: Dict[str, Any]
+    # Only used when the preset is part of a provider pool
+    weight: int = 1
+    max_concurrency: int | None = None
+    rpm: int | None = None
 
 PRESETS_FILE = os.path.join("data", "api_presets.json")
 
@@ -99,6 +149,8 @@ current_llm_model = "qwen-plus" # Default to Qwen if using DashScope
 
 def load_api_config():
     global current_api_config
+    from dotenv import load_dotenv
+    load_dotenv()
     # 1. Load from Env vars as defaults
     current_api_config.dashscope_api_key = os.getenv("DASHSCOPE_API_KEY", "")
     current_api_config.volc_access_key = os.getenv("VOLC_ACCESSKEY", "")
@@ -125,6 +177,13 @@ def load_api_config():
     current_api_config.rongyiyun_api_base = os.getenv("RONGYIYUN_API_BASE", "https://zcbservice.aizfw.cn/kyyApi")
     current_api_config.rongyiyun_ratio = os.getenv("RONGYIYUN_RATIO", "16:9")
     current_api_config.rongyiyun_duration = int(os.getenv("RONGYIYUN_DURATION", "10") or 10)
+    current_api_config.public_base_url = os.getenv("PUBLIC_BASE_URL", "")
+    current_api_config.webhook_secret = os.getenv("WEBHOOK_SECRET", "")
+    current_api_config.image_pool = [n.strip() for n in os.getenv("IMAGE_POOL", "").split(",") if n.strip()]
+    current_api_config.video_pool = [n.strip() for n in os.getenv("VIDEO_POOL", "").split(",") if n.strip()]
+    current_api_config.pool_strategy = os.getenv("PROVIDER_POOL_STRATEGY", "least_loaded")
+    current_api_config.image_hedge_provider = os.getenv("IMAGE_HEDGE_PROVIDER", "")
+    current_api_config.image_hedge_delay = float(os.getenv("IMAGE_HEDGE_DELAY", "0") or 0)
 
     # 2. Override with config file if exists
     if os.path.exists(API_CONFIG_FILE):
@@ -181,6 +240,20 @@ def load_api_config():
                     current_api_config.rongyiyun_ratio = data["rongyiyun_ratio"]
                 if data.get("rongyiyun_duration") is not None:
                     current_api_config.rongyiyun_duration = int(data["rongyiyun_duration"])
+                if data.get("public_base_url"):
+                    current_api_config.public_base_url = data["public_base_url"]
+                if data.get("webhook_secret"):
+                    current_api_config.webhook_secret = data["webhook_secret"]
+                if data.get("image_pool"):
+                    current_api_config.image_pool = data["image_pool"]
+                if data.get("video_pool"):
+                    current_api_config.video_pool = data["video_pool"]
+                if data.get("pool_strategy"):
+                    current_api_config.pool_strategy = data["pool_strategy"]
+                if data.get("image_hedge_provider"):
+                    current_api_config.image_hedge_provider = data["image_hedge_provider"]
+                if data.get("image_hedge_delay"):
+                    current_api_config.image_hedge_delay = float(data["image_hedge_delay"])
         except Exception as e:
             print(f"Failed to load API Config: {e}")
 
@@ -206,7 +279,8 @@ def init_ai_clients():
     if current_api_config.text_provider == "openai" and current_api_config.openai_api_key:
         try:
             base_url = current_api_config.openai_api_base if current_api_config.openai_api_base else "https://api.openai.com/v1"
-            client = AsyncOpenAI(
+            client = openai_client(
+                "OpenAI",
                 api_key=current_api_config.openai_api_key,
                 base_url=base_url,
                 timeout=120.0
@@ -219,7 +293,8 @@ def init_ai_clients():
 
     elif current_api_config.text_provider == "dashscope" and current_api_config.dashscope_api_key:
         try:
-            client = AsyncOpenAI(
+            client = openai_client(
+                "DashScope",
                 api_key=current_api_config.dashscope_api_key,
                 base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
                 timeout=120.0
@@ -233,54 +308,96 @@ def init_ai_clients():
         print("LLM API Key missing (selected provider not configured).")
         client = None
 
-    if current_api_config.image_provider == "openai" and (current_api_config.openai_image_api_key or (current_api_config.openai_api_key and current_api_config.openai_image_model)):
-        try:
-            image_base = current_api_config.openai_image_api_base or current_api_config.openai_api_base or "https://api.openai.com/v1"
-            image_key = current_api_config.openai_image_api_key or current_api_config.openai_api_key
-            image_client = AsyncOpenAI(
-                api_key=image_key,
-                base_url=image_base,
-                timeout=180.0
-            )
+    try:
+        image_client = _build_image_client(current_api_config)
+        if image_client:
             print("OpenAI Compatible image client initialized.")
-        except Exception as e:
-            print(f"Failed to init OpenAI image client: {e}")
-            image_client = None
-    else:
+    except Exception as e:
+        print(f"Failed to init OpenAI image client: {e}")
         image_client = None
 
-    if current_api_config.video_provider == "openai" and (current_api_config.openai_video_api_key or (current_api_config.openai_api_key and current_api_config.openai_video_model)):
-        try:
-            video_base = current_api_config.openai_video_api_base or current_api_config.openai_api_base or "https://api.openai.com/v1"
-            video_key = current_api_config.openai_video_api_key or current_api_config.openai_api_key
-            video_client = AsyncOpenAI(
-                api_key=video_key,
-                base_url=video_base,
-                timeout=600.0
-            )
+    try:
+        video_client = _build_video_client(current_api_config)
+        if video_client:
             print("OpenAI Compatible video client initialized.")
-        except Exception as e:
-            print(f"Failed to init OpenAI video client: {e}")
-            video_client = None
-    else:
+    except Exception as e:
+        print(f"Failed to init OpenAI video client: {e}")
         video_client = None
 
     # 2. Volcengine
-    if (current_api_config.image_provider == "volcengine" or current_api_config.video_provider == "volcengine") and current_api_config.volc_access_key and current_api_config.volc_secret_key:
-        try:
-            visual_service = VisualService()
-            visual_service.set_ak(current_api_config.volc_access_key)
-            visual_service.set_sk(current_api_config.volc_secret_key)
+    try:
+        visual_service = _build_visual_service(current_api_config)
+        if visual_service:
             print("Volcengine service initialized.")
-        except Exception as e:
-            print(f"Failed to initialize Volcengine: {e}")
-            visual_service = None
-    else:
-        print("Volcengine keys missing (selected provider not configured).")
+        else:
+            print("Volcengine keys missing (selected provider not configured).")
+    except Exception as e:
+        print(f"Failed to initialize Volcengine: {e}")
         visual_service = None
 
-load_api_config()
-init_ai_clients()
+    configure_provider_pool()
+
+def _build_image_client(config: ApiConfig):
+    if config.image_provider == "openai" and (config.openai_image_api_key or (config.openai_api_key and config.openai_image_model)):
+        return openai_client(
+            "OpenAI image",
+            api_key=config.openai_image_api_key or config.openai_api_key,
+            base_url=config.openai_image_api_base or config.openai_api_base or "https://api.openai.com/v1",
+            timeout=180.0
+        )
+    return None
+
+def _build_video_client(config: ApiConfig):
+    if config.video_provider == "openai" and (config.openai_video_api_key or (config.openai_api_key and config.openai_video_model)):
+        return openai_client(
+            "OpenAI video",
+            api_key=config.openai_video_api_key or config.openai_api_key,
+            base_url=config.openai_video_api_base or config.openai_api_base or "https://api.openai.com/v1",
+            timeout=600.0
+        )
+    return None
+
+def _build_visual_service(config: ApiConfig):
+    if (config.image_provider == "volcengine" or config.video_provider == "volcengine") and config.volc_access_key and config.volc_secret_key:
+        return volcengine_visual(config.volc_access_key, config.volc_secret_key)
+    return None
+
+def configure_provider_pool():
+    """One pool account for the active config plus one per preset listed in image_pool / video_pool."""
+    presets = {(p.type, p.name): p for p in load_presets()}
+    for modality, names in (("image", current_api_config.image_pool), ("video", current_api_config.video_pool)):
+        accounts = [ProviderAccount("active", modality, current_api_config, image_client=image_client, video_client=video_client, visual_service=visual_service)]
+        for name in names:
+            preset = presets.get((modality, name))
+            if not preset:
+                print(f"Provider pool: {modality} preset not found: {name}")
+                continue
+            try:
+                config = ApiConfig(**{**current_api_config.model_dump(), **preset.config})
+                accounts.append(ProviderAccount(
+                    name, modality, config,
+                    image_client=_build_image_client(config),
+                    video_client=_build_video_client(config),
+                    visual_service=_build_visual_service(config),
+                    weight=preset.weight,
+                    max_concurrency=preset.max_concurrency,
+                    rate=RateState(preset.rpm)
+                ))
+            except Exception as e:
+                print(f"Provider pool: failed to add {modality} preset {name}: {e}")
+        provider_pool.configure(modality, accounts, current_api_config.pool_strategy)
+
+    # Hedging uses the active config's credentials for the secondary image provider
+    hedge = current_api_config.image_hedge_provider
+    accounts = []
+    if hedge and hedge != (current_api_config.image_provider or "openai"):
+        config = ApiConfig(**{**current_api_config.model_dump(), "image_provider": hedge})
+        account = ProviderAccount(f"hedge-{hedge}", "image", config, image_client=_build_image_client(config), visual_service=_build_visual_service(config))
+        if (hedge == "openai" and not account.image_client) or (hedge == "volcengine" and not account.visual_service) or (hedge == "vectorengine" and not config.vectorengine_api_key):
+            print(f"Image hedging disabled: {hedge} is not configured")
+        else:
+            accounts.append(account)
+    provider_pool.configure("image_hedge", accounts)
 
 # CORS Setup (Allow Frontend to access)
 app.add_middleware(
@@ -290,31 +407,64 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+app.add_middleware(profiling.ProfilingMiddleware)
 
 # --- In-Memory Database with Persistence ---
 DB: Dict[str, Project] = {}
 DATA_DIR = "data"
 DATA_FILE = os.path.join(DATA_DIR, "projects.json")
+state_backend = state.open_backend(DATA_FILE)
 
 def save_db():
-    try:
-        os.makedirs(DATA_DIR, exist_ok=True)
-        # Convert Project objects to dicts
-        data = {pid: project.model_dump() for pid, project in DB.items()}
-        
-        # Atomic write: write to temp file then rename
-        temp_file = f"{DATA_FILE}.tmp"
-        with open(temp_file, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        
-        # Replace original file atomically (or near-atomically on Windows)
-        if os.path.exists(DATA_FILE):
-            os.replace(temp_file, DATA_FILE)
+    checked = _checked_versions.get()
+    _checked_versions.set(None)
+    guarded: dict[str, list[str | None]] = {}
+    for obj, _ in checked or ():
+        if isinstance(obj, Project):
+            guarded.setdefault(obj.id, []).append(None)
         else:
-            os.rename(temp_file, DATA_FILE)
-            
+            pid = next((pid for pid, p in DB.items() if any(s is obj for s in p.shots)), None)
+            if pid:
+                guarded.setdefault(pid, []).append(obj.id)
+    start = time.perf_counter()
+    try:
+        written = state_backend.save_projects(DB, guarded)
+        if written:
+            metrics.save_bytes.observe(written, store="projects")
+    except state.Conflict as e:
+        # Another worker changed what this request checked: drop our edit for their copy and 409
+        state.merge_model(DB[e.project_id], e.current)
+        prompt_builder.invalidate_project(e.project_id)
+        stale = next(((obj, expected) for obj, expected in checked if obj.version != expected), None)
+        if stale:
+            raise _version_conflict(*stale)
+        raise HTTPException(status_code=409, detail=f"{e}; reload it and retry")
     except Exception as e:
         print(f"Error saving DB: {e}")
+    finally:
+        metrics.save_seconds.observe(time.perf_counter() - start, store="projects")
+
+def sync_state():
+    """Pull projects other workers changed (shared backends only; a no-op check otherwise)."""
+    try:
+        updated, deleted = state_backend.changes()
+    except Exception as e:
+        print(f"Failed to sync state: {e}")
+        return
+    for pid, fresh in updated.items():
+        if pid in DB:
+            # In place, so running generation tasks keep their references
+            state.merge_model(DB[pid], fresh)
+            state.remote_changes.inc(change="updated")
+        else:
+            DB[pid] = fresh
+            state.remote_changes.inc(change="created")
+        prompt_builder.invalidate_project(pid)
+    for pid in deleted:
+        if DB.pop(pid, None) is not None:
+            state.remote_changes.inc(change="deleted")
+        prompt_builder.invalidate_project(pid)
 
 def _sanitize_url(url: str | None) -> str | None:
     if not url:
@@ -351,20 +501,25 @@ def _save_video_bytes(video_data: bytes, sub_dir: str = None) -> str:
         f.write(video_data)
     return url_path
 
+# Video URLs on these hosts are already ours and are kept as they are instead of downloaded
+LOCAL_VIDEO_HOSTS = {h.strip() for h in os.getenv("LOCAL_VIDEO_HOSTS", "localhost,127.0.0.1").split(",") if h.strip()}
+
 def _normalize_video_url(video_url: str | None, sub_dir: str = None) -> str | None:
     if not video_url:
         return video_url
-    if video_url.startswith("http://localhost") or video_url.startswith("https://localhost") or video_url.startswith("http://127.0.0.1") or video_url.startswith("https://127.0.0.1"):
-        return video_url
     if not (video_url.startswith("http://") or video_url.startswith("https://")):
         return video_url
+    if urlparse(video_url).hostname in LOCAL_VIDEO_HOSTS:
+        return video_url
     try:
-        req = urllib.request.Request(video_url, headers={"User-Agent": "Mozilla/5.0"})
-        with urllib.request.urlopen(req, timeout=240) as resp:
-            content_type = resp.headers.get("Content-Type", "")
-            if not content_type.startswith("video/") and content_type != "application/octet-stream":
-                return video_url
-            video_bytes = resp.read()
+        with metrics.download("video") as record_size:
+            req = urllib.request.Request(video_url, headers={"User-Agent": "Mozilla/5.0"})
+            with urllib.request.urlopen(req, timeout=240) as resp:
+                content_type = resp.headers.get("Content-Type", "")
+                if not content_type.startswith("video/") and content_type != "application/octet-stream":
+                    return video_url
+                video_bytes = resp.read()
+            record_size(len(video_bytes))
         if video_bytes:
             return _save_video_bytes(video_bytes, sub_dir=sub_dir)
     except Exception as e:
@@ -375,6 +530,7 @@ def _normalize_project_videos(project: Project) -> dict:
     updated = 0
     total = 0
     for shot in project.shots or []:
+        before = updated
         if shot.video_url:
             total += 1
             normalized = _normalize_video_url(_sanitize_url(shot.video_url), sub_dir=project.id)
@@ -389,6 +545,8 @@ def _normalize_project_videos(project: Project) -> dict:
                     if normalized_item and normalized_item != item.url:
                         item.url = normalized_item
                         updated += 1
+        if updated > before:
+            bump_version(shot)
     return {"updated": updated, "total": total}
 
 def _video_url_to_local_path(url: str | None) -> str | None:
@@ -441,36 +599,25 @@ def _export_project_video(project: Project) -> tuple[str, str]:
     return url, "zip"
 
 def load_db():
-    global DB
-    if not os.path.exists(DATA_FILE):
-        return
     try:
-        with open(DATA_FILE, "r", encoding="utf-8") as f:
-            content = f.read()
-            if not content:
-                print("Warning: DB file is empty")
-                return
-            try:
-                data = json.loads(content)
-            except json.JSONDecodeError:
-                print("Warning: DB file contains invalid JSON")
-                return
-                
-            DB.clear()
-            for pid, project_data in data.items():
-                DB[pid] = Project(**project_data)
-                project = DB[pid]
-                for shot in project.shots or []:
-                    shot.image_url = _sanitize_url(shot.image_url)
-                    if isinstance(shot.image_candidates, list):
-                        shot.image_candidates = [u for u in (_sanitize_url(x) for x in shot.image_candidates) if u]
-                    shot.video_url = _sanitize_url(shot.video_url)
-                    if isinstance(shot.video_items, list):
-                        for item in shot.video_items:
-                            item.url = _sanitize_url(item.url)
-                    if (not shot.video_items) and shot.video_url:
-                        shot.video_items = [VideoItem(id="legacy", url=shot.video_url, progress=shot.video_progress, status=str(shot.status))]
-        print(f"Loaded {len(DB)} projects from {DATA_FILE}")
+        projects = state_backend.load_projects()
+        if projects is None:
+            return
+        DB.clear()
+        prompt_builder.clear()
+        for pid, project in projects.items():
+            DB[pid] = project
+            for shot in project.shots or []:
+                shot.image_url = _sanitize_url(shot.image_url)
+                if isinstance(shot.image_candidates, list):
+                    shot.image_candidates = [u for u in (_sanitize_url(x) for x in shot.image_candidates) if u]
+                shot.video_url = _sanitize_url(shot.video_url)
+                if isinstance(shot.video_items, list):
+                    for item in shot.video_items:
+                        item.url = _sanitize_url(item.url)
+                if (not shot.video_items) and shot.video_url:
+                    shot.video_items = [VideoItem(id="legacy", url=shot.video_url, progress=shot.video_progress, status=str(shot.status))]
+        print(f"Loaded {len(DB)} projects from {state_backend.path}")
     except Exception as e:
         print(f"Failed to load DB: {e}")
 
@@ -480,7 +627,7 @@ def seed_data():
     if DB: 
         return
     
-    if os.path.exists(DATA_FILE) and os.path.getsize(DATA_FILE) > 0:
+    if state_backend.has_data():
          # File exists and is not empty, but DB is empty. 
          # This implies load failed or file is invalid JSON.
          # Do NOT overwrite to prevent data loss.
@@ -517,15 +664,116 @@ def seed_data():
     DB[project_id] = Project(id=project_id, name="守墓五年", shots=shots, characters=chars)
     save_db()
 
-load_db()
-seed_data()
+def _config_mtimes() -> tuple:
+    return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in (API_CONFIG_FILE, PRESETS_FILE))
+
+async def _state_sync_loop():
+    """Keep this worker in step with the others sharing the state backend: their project
+    edits, saved settings, provider callbacks they received for our tasks, and the leases
+    of jobs whose worker went away."""
+    config_mtimes = _config_mtimes()
+    next_lease_check = 0.0
+    while True:
+        await asyncio.sleep(state.SYNC_INTERVAL_S)
+        try:
+            sync_state()
+            mtimes = _config_mtimes()
+            if mtimes != config_mtimes:
+                config_mtimes = mtimes
+                load_api_config()
+                init_ai_clients()
+            waiting = task_poller.waiting()
+            if waiting:
+                # Callbacks for our tasks that another worker received
+                for provider, task_id, result in state_backend.take_callbacks(waiting):
+                    task_poller.complete(provider, task_id, result)
+            now = time.monotonic()
+            if now >= next_lease_check:
+                next_lease_check = now + state.LEASE_TTL_S / 3
+                state_backend.renew_leases(state.WORKER_ID)
+                for _, owner, job_id in state_backend.reap_leases():
+                    _fail_orphaned_job(job_id, owner)
+        except Exception as e:
+            print(f"State sync failed: {e}")
+
+def _fail_orphaned_job(job_id: str, owner: str):
+    """Mark a job whose worker stopped renewing its lease as failed and release its shot."""
+    job = state_backend.get_job(job_id)
+    if not job or job.status not in ("queued", "running"):
+        return
+    print(f"Job {job_id} lost its worker {owner}, marking it failed")
+    state.reaped_leases.inc()
+    job.status = "failed"
+    job.error = f"Worker {owner} stopped before the job finished"
+    job.finished_at = time.time()
+    state_backend.put_job(job)
+    project = DB.get(job.project_id)
+    shot = next((s for s in project.shots if s.id == job.shot_id), None) if project else None
+    if not shot:
+        return
+    if job.type == "image" and shot.status == GenerationStatus.GENERATING:
+        shot.status = GenerationStatus.FAILED
+    if job.type == "video":
+        shot.video_progress = None
+        item = next((v for v in shot.video_items or [] if v.id == job.video_id), None)
+        if item and item.status != "completed":
+            item.status = "failed"
+    bump_version(shot)
+    save_db()
 
 # --- Helpers ---
 def get_project_or_404(project_id: str) -> Project:
+    sync_state()
     if project_id not in DB:
         raise HTTPException(status_code=404, detail="Project not found")
     return DB[project_id]
 
+def get_shot_or_404(project: Project, shot_id: str) -> Shot:
+    shot = next((s for s in project.shots if s.id == shot_id), None)
+    if not shot:
+        raise HTTPException(status_code=404, detail="Shot not found")
+    return shot
+
+def expected_version(if_match: str | None = Header(None, alias="If-Match"), expected_version: int | None = None) -> int | None:
+    """The version a client based its edit on: ``If-Match`` (the ETag, or a bare version
+    number; ``*`` matches any) or the ``expected_version`` query parameter."""
+    if if_match is not None:
+        tag = if_match.strip().removeprefix("W/").strip('"')
+        if tag == "*":
+            return None
+        try:
+            return int(tag)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="If-Match must be a version number")
+    return expected_version
+
+# What the current request passed check_version on, so its save_db can refuse to merge
+# over another worker's concurrent change to the same project or shot
+_checked_versions: contextvars.ContextVar[list | None] = contextvars.ContextVar("checked_versions", default=None)
+
+def _version_conflict(obj: Project | Shot, expected: int) -> HTTPException:
+    kind = "Project" if isinstance(obj, Project) else "Shot"
+    return HTTPException(
+        status_code=409,
+        detail=f"{kind} was modified by another request (version {obj.version}, expected {expected}); reload it and retry",
+        headers={"ETag": f'"{obj.version}"'}
+    )
+
+def check_version(obj: Project | Shot, expected: int | None):
+    if expected is None:
+        return
+    if expected != obj.version:
+        raise _version_conflict(obj, expected)
+    checked = _checked_versions.get()
+    if checked is None:
+        checked = []
+        _checked_versions.set(checked)
+    checked.append((obj, expected))
+
+def bump_version(*objs: Project | Shot):
+    for obj in objs:
+        obj.version += 1
+
 # --- API Endpoints ---
 
 @app.get("/")
@@ -555,6 +803,7 @@ async def save_api_preset(preset: ApiPreset):
     else:
         presets.append(preset)
     save_presets(presets)
+    configure_provider_pool()
     return preset
 
 @app.delete("/api/presets/{type}/{name}")
@@ -564,22 +813,84 @@ async def delete_api_preset(type: str, name: str):
     if len(new_presets) == len(presets):
         raise HTTPException(status_code=404, detail="Preset not found")
     save_presets(new_presets)
+    configure_provider_pool()
     return {"status": "success"}
 
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    return {"generation": generation_cache.stats(), "llm": llm_cache.stats()}
+
+@app.get("/api/executors")
+async def get_executor_stats():
+    return {"executors": executor_stats(), "poller": task_poller.stats(), "pool": provider_pool.stats(), "hedging": image_hedger.stats(), "circuits": breakers.stats(), "state": state_backend.stats(), "project_locks": project_locks.stats()}
+
+metrics.REGISTRY.gauge(
+    "mochiani_generation_jobs", "Generation jobs currently tracked, by status; queued is the queue depth.", ("status",),
+    collect=lambda: [({"status": k}, v) for k, v in job_registry.counts().items()]
+)
+metrics.REGISTRY.gauge(
+    "mochiani_executor_threads", "Provider thread pool workers by pool and state.", ("pool", "state"),
+    collect=lambda: [({"pool": e["name"], "state": state}, e[state]) for e in executor_stats() for state in ("active", "queued", "max_workers")]
+)
+metrics.REGISTRY.gauge(
+    "mochiani_poller_pending_tasks", "Upstream tasks waiting on the shared poller, by provider.", ("provider",),
+    collect=lambda: [({"provider": p}, n) for p, n in task_poller.pending().items()]
+)
+metrics.REGISTRY.gauge(
+    "mochiani_cache_lookups_total", "Cache lookups since start by cache and result; hit rate is hit / (hit + miss).", ("cache", "result"),
+    collect=lambda: [({"cache": name, "result": result}, stats[key]) for name, stats in (("generation", generation_cache.stats()), ("llm", llm_cache.stats())) for result, key in (("hit", "hits"), ("miss", "misses"))],
+    metric_type="counter"
+)
+metrics.REGISTRY.gauge(
+    "mochiani_cache_entries", "Entries held by each on-disk cache.", ("cache",),
+    collect=lambda: [({"cache": "generation"}, generation_cache.stats()["entries"]), ({"cache": "llm"}, llm_cache.stats()["entries"])]
+)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _require_profiling():
+    if not profiling.PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+
+@app.get("/admin/profiles")
+async def list_profiles():
+    _require_profiling()
+    return await short_executor.run(profiling.list_profiles)
+
+@app.get("/admin/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "text"):
+    """``format=text`` is the cumulative-time summary; ``format=prof`` the raw pstats file."""
+    _require_profiling()
+    paths = profiling.profile_paths(profile_id)
+    if not paths or format not in ("text", "prof"):
+        raise HTTPException(status_code=400, detail="Invalid profile id or format")
+    path = paths[0] if format == "prof" else paths[1]
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "prof":
+        return FileResponse(path, media_type="application/octet-stream", filename=os.path.basename(path))
+    return FileResponse(path, media_type="text/plain; charset=utf-8")
+
 @app.get("/projects", response_model=List[Project])
 async def list_projects():
+    sync_state()
     return list(DB.values())
 
 @app.get("/projects/{project_id}", response_model=Project)
-async def get_project(project_id: str):
-    return get_project_or_404(project_id)
+async def get_project(project_id: str, response: Response):
+    project = get_project_or_404(project_id)
+    response.headers["ETag"] = f'"{project.version}"'
+    return project
 
 @app.post("/projects/{project_id}/normalize-videos")
 async def normalize_project_videos(project_id: str):
-    project = get_project_or_404(project_id)
-    result = _normalize_project_videos(project)
-    if result["updated"] > 0:
-        save_db()
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        result = _normalize_project_videos(project)
+        if result["updated"] > 0:
+            save_db()
     return result
 
 @app.post("/projects/{project_id}/export-video")
@@ -587,9 +898,10 @@ async def export_project_video(project_id: str):
     project = get_project_or_404(project_id)
     try:
         # Ensure videos normalized locally
-        norm = _normalize_project_videos(project)
-        if norm.get("updated"):
-            save_db()
+        async with project_locks.hold(project_id):
+            norm = _normalize_project_videos(project)
+            if norm.get("updated"):
+                save_db()
         url, kind = _export_project_video(project)
         return {"url": url, "type": kind}
     except Exception as e:
@@ -609,545 +921,432 @@ async def create_project(data: ProjectCreate):
     save_db()
     return DB[project_id]
 
+# Mutations take the project's lock and accept the version they were based on (If-Match
+# or ?expected_version=); a stale version is rejected with 409 instead of overwriting
 @app.put("/projects/{project_id}", response_model=Project)
-async def update_project(project_id: str, data: ProjectUpdate):
-    project = get_project_or_404(project_id)
-    if data.name is not None:
-        project.name = data.name
-    if data.style is not None:
-        project.style = data.style
-    if data.default_scene_id is not None:
-        project.default_scene_id = data.default_scene_id
-    if data.default_panel_layout is not None:
-        project.default_panel_layout = data.default_panel_layout
-    if data.default_image_count is not None:
-        project.default_image_count = data.default_image_count
-    save_db()
+async def update_project(project_id: str, data: ProjectUpdate, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        check_version(project, expected)
+        if data.name is not None:
+            project.name = data.name
+        if data.style is not None:
+            project.style = data.style
+        if data.default_scene_id is not None:
+            project.default_scene_id = data.default_scene_id
+        if data.default_panel_layout is not None:
+            project.default_panel_layout = data.default_panel_layout
+        if data.default_image_count is not None:
+            project.default_image_count = data.default_image_count
+        bump_version(project)
+        prompt_builder.invalidate_project(project_id)
+        save_db()
     return project
 
 @app.delete("/projects/{project_id}")
-async def delete_project(project_id: str):
-    if project_id not in DB:
-        raise HTTPException(status_code=404, detail="Project not found")
-    del DB[project_id]
-    save_db()
+async def delete_project(project_id: str, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        check_version(project, expected)
+        del DB[project_id]
+        prompt_builder.invalidate_project(project_id)
+        save_db()
     return {"ok": True}
 
 @app.post("/projects/{project_id}/shots", response_model=Shot)
-async def create_shot(project_id: str, shot_data: ShotCreate):
-    project = get_project_or_404(project_id)
-    # Filter out fields that are not in Shot model (like 'scene' name string)
-    shot_dict = shot_data.dict()
-    if 'scene' in shot_dict:
-        del shot_dict['scene']
-        
-    new_shot = Shot(
-        id=str(uuid.uuid4()),
-        order=len(project.shots),
-        **shot_dict
-    )
-    # Default placeholder
-    if not new_shot.image_url:
-        new_shot.image_url = f"https://placehold.co/300x169/25262b/FFF?text=New+Shot"
-    project.shots.append(new_shot)
-    save_db()
+async def create_shot(project_id: str, shot_data: ShotCreate, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        check_version(project, expected)
+        # Filter out fields that are not in Shot model (like 'scene' name string)
+        shot_dict = shot_data.dict()
+        if 'scene' in shot_dict:
+            del shot_dict['scene']
+
+        new_shot = Shot(
+            id=str(uuid.uuid4()),
+            order=len(project.shots),
+            **shot_dict
+        )
+        # Default placeholder
+        if not new_shot.image_url:
+            new_shot.image_url = f"https://placehold.co/300x169/25262b/FFF?text=New+Shot"
+        project.shots.append(new_shot)
+        bump_version(project)
+        save_db()
     return new_shot
 
 class ReorderShotsRequest(BaseModel):
     shot_ids: List[str]
 
 @app.put("/projects/{project_id}/shots/reorder", response_model=List[Shot])
-async def reorder_shots(project_id: str, request: ReorderShotsRequest):
-    project = get_project_or_404(project_id)
-    
-    # Validate all shot IDs exist
-    current_ids = {s.id for s in project.shots}
-    if len(request.shot_ids) != len(current_ids) or set(request.shot_ids) != current_ids:
-        raise HTTPException(status_code=400, detail="Shot IDs mismatch or incomplete")
-    
-    # Reorder
-    shot_map = {s.id: s for s in project.shots}
-    project.shots = [shot_map[sid] for sid in request.shot_ids]
-    
-    # Update order field
-    for i, shot in enumerate(project.shots):
-        shot.order = i
-        
-    save_db()
+async def reorder_shots(project_id: str, request: ReorderShotsRequest, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        check_version(project, expected)
+
+        # Validate all shot IDs exist
+        current_ids = {s.id for s in project.shots}
+        if len(request.shot_ids) != len(current_ids) or set(request.shot_ids) != current_ids:
+            raise HTTPException(status_code=400, detail="Shot IDs mismatch or incomplete")
+
+        # Reorder
+        shot_map = {s.id: s for s in project.shots}
+        project.shots = [shot_map[sid] for sid in request.shot_ids]
+
+        # Update order field; the order belongs to the project, so shot versions stay as they are
+        for i, shot in enumerate(project.shots):
+            shot.order = i
+
+        bump_version(project)
+        save_db()
     return project.shots
 
 @app.put("/shots/{project_id}/{shot_id}", response_model=Shot)
-async def update_shot(project_id: str, shot_id: str, update_data: ShotUpdate):
-    project = get_project_or_404(project_id)
-    for shot in project.shots:
-        if shot.id == shot_id:
-            # Update fields
-            updated_data = update_data.dict(exclude_unset=True)
-            for k, v in updated_data.items():
-                setattr(shot, k, v)
-            if "image_url" in updated_data:
-                shot.image_url = _sanitize_url(shot.image_url)
-            if "image_candidates" in updated_data and isinstance(shot.image_candidates, list):
-                shot.image_candidates = [u for u in (_sanitize_url(x) for x in shot.image_candidates) if u]
-            if "video_url" in updated_data:
-                shot.video_url = _sanitize_url(shot.video_url)
-            if "custom_image_url" in updated_data:
-                shot.custom_image_url = _sanitize_url(shot.custom_image_url)
-            save_db()
-            return shot
-    raise HTTPException(status_code=404, detail="Shot not found")
+async def update_shot(project_id: str, shot_id: str, update_data: ShotUpdate, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        shot = get_shot_or_404(get_project_or_404(project_id), shot_id)
+        check_version(shot, expected)
+        # Update fields
+        updated_data = update_data.dict(exclude_unset=True)
+        for k, v in updated_data.items():
+            setattr(shot, k, v)
+        if "image_url" in updated_data:
+            shot.image_url = _sanitize_url(shot.image_url)
+        if "image_candidates" in updated_data and isinstance(shot.image_candidates, list):
+            shot.image_candidates = [u for u in (_sanitize_url(x) for x in shot.image_candidates) if u]
+        if "video_url" in updated_data:
+            shot.video_url = _sanitize_url(shot.video_url)
+        if "custom_image_url" in updated_data:
+            shot.custom_image_url = _sanitize_url(shot.custom_image_url)
+        bump_version(shot)
+        save_db()
+    return shot
 
 @app.delete("/shots/{project_id}/{shot_id}")
-async def delete_shot(project_id: str, shot_id: str):
-    project = get_project_or_404(project_id)
-    project.shots = [s for s in project.shots if s.id != shot_id]
-    save_db()
+async def delete_shot(project_id: str, shot_id: str, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        shot = next((s for s in project.shots if s.id == shot_id), None)
+        if shot:
+            check_version(shot, expected)
+            project.shots = [s for s in project.shots if s.id != shot_id]
+            bump_version(project)
+            save_db()
     return {"status": "success"}
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...), project_id: str | None = None):
-    # Check if file is already uploaded by checking hash or filename
-    # But for simplicity, we just save it.
-    # However, user mentioned "use previous image hosting url if uploaded locally without url"
-    # The current logic ALREADY returns a local URL: /static/uploads/...
-    # If the user means "upload to external hosting" that's different.
-    # Assuming the user means: Ensure local uploads have valid URLs that can be used by the model.
-    # Our local URLs /static/uploads/... are handled by _image_url_to_base64 correctly now.
-    
-    filename = f"{uuid.uuid4()}_{file.filename}"
-    if project_id:
-        dir_path = os.path.join("static", "uploads", project_id)
-        os.makedirs(dir_path, exist_ok=True)
-        file_path = os.path.join(dir_path, filename)
-        url = f"/static/uploads/{project_id}/{filename}"
-    else:
-        os.makedirs("static/uploads", exist_ok=True)
-        file_path = f"static/uploads/{filename}"
-        url = f"/static/uploads/{filename}"
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
-    return {"url": url}
+async def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...), project_id: str | None = None):
+    # Uploads are stored under their SHA-256, so re-uploading the same reference image
+    # returns the existing /static/uploads URL instead of writing another copy.
+    if file.size is not None and file.size > media.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds the {media.MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit")
+    head = await file.read(64)
+    sniffed = media.sniff_type(head)
+    if not sniffed:
+        raise HTTPException(status_code=415, detail="Unsupported file type; upload an image or video")
+    content_type, ext = sniffed
+
+    try:
+        stored = await short_executor.run(media.store_stream, file.file, head, ext, sub_dir=project_id)
+    except media.UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    if content_type.startswith("image/") and not stored["deduplicated"]:
+        background_tasks.add_task(media.make_thumbnails, stored["path"])
+
+    return {
+        "url": stored["url"],
+        "sha256": stored["sha256"],
+        "size": stored["size"],
+        "content_type": content_type,
+        "deduplicated": stored["deduplicated"]
+    }
+
+# Remote URL -> running download, so assets created in bulk with the same image share one fetch
+_localizations: Dict[str, asyncio.Task] = {}
+
+def _is_remote_image(url: str | None) -> bool:
+    return isinstance(url, str) and url.startswith("http") and urlparse(url).hostname not in ("localhost", "127.0.0.1")
+
+async def _download_remote_image(url: str, sub_dir: str) -> str:
+    key = f"{sub_dir}:{url}"
+    task = _localizations.get(key)
+    if task is None:
+        task = asyncio.ensure_future(short_executor.run(_save_image_from_url, url, sub_dir=sub_dir))
+        _localizations[key] = task
+        task.add_done_callback(lambda _: _localizations.pop(key, None))
+    return await task
+
+# Strong references to running localization tasks (the loop only keeps weak ones)
+_localization_jobs: set = set()
+
+def _queue_localization(project_id: str, kind: str, asset_id: str, remote_url: str):
+    # A task per asset rather than a BackgroundTasks entry: background tasks of one
+    # request run one after another, and bulk creation should download in parallel
+    job = asyncio.create_task(_localize_asset_image(project_id, kind, asset_id, remote_url))
+    _localization_jobs.add(job)
+    job.add_done_callback(_localization_jobs.discard)
+
+async def _localize_asset_image(project_id: str, kind: str, asset_id: str, remote_url: str):
+    """Download an asset's remote image and swap in the local /static URL once it is saved.
+
+    The swap only happens if the asset still exists and still points at the same remote
+    URL, so an edit made while the download was running is never overwritten.
+    """
+    local_url = await _download_remote_image(remote_url, project_id)
+    if local_url == remote_url:
+        return
+    async with project_locks.hold(project_id):
+        sync_state()
+        project = DB.get(project_id)
+        if not project:
+            return
+        assets, field = (project.characters, "avatar_url") if kind == "character" else (project.scenes, "image_url")
+        for asset in assets:
+            if asset.id == asset_id and getattr(asset, field) == remote_url:
+                setattr(asset, field, local_url)
+                bump_version(project)
+                prompt_builder.invalidate_assets(project_id)
+                save_db()
+                return
 
 @app.post("/projects/{project_id}/characters", response_model=Character)
-async def create_character(project_id: str, character: Character):
-    project = get_project_or_404(project_id)
-    # Check if exists (by ID)
-    if any(c.id == character.id for c in project.characters):
-        raise HTTPException(status_code=400, detail="Character ID already exists")
-    if getattr(character, "avatar_url", None):
-        character.avatar_url = _sanitize_url(character.avatar_url)
-        if isinstance(character.avatar_url, str) and character.avatar_url and character.avatar_url.startswith("http"):
-            character.avatar_url = _save_image_from_url(character.avatar_url, sub_dir=project_id)
-    project.characters.append(character)
-    save_db()
+async def create_character(project_id: str, character: Character, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        check_version(project, expected)
+        # Check if exists (by ID)
+        if any(c.id == character.id for c in project.characters):
+            raise HTTPException(status_code=400, detail="Character ID already exists")
+        if getattr(character, "avatar_url", None):
+            character.avatar_url = _sanitize_url(character.avatar_url)
+            if _is_remote_image(character.avatar_url):
+                _queue_localization(project_id, "character", character.id, character.avatar_url)
+        project.characters.append(character)
+        bump_version(project)
+        prompt_builder.invalidate_assets(project_id)
+        save_db()
     return character
 
-@app.post("/projects/{project_id}/characters/import_from_md")
-async def import_characters_from_md(project_id: str, file: UploadFile = File(...)):
-    project = get_project_or_404(project_id)
-    content = await file.read()
-    try:
-        text = content.decode("utf-8")
-    except:
-        text = content.decode("gbk", errors="ignore")
-    
-    lines = text.split("\n")
-    new_characters = []
-    
-    header_found = False
-    name_idx = -1
-    desc_idx = -1
-    prompt_idx = -1
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        parts = [p.strip() for p in line.split("|")]
-        # Remove empty first/last elements if they are just from the boundary pipes
-        if len(parts) > 0 and parts[0] == "":
-            parts.pop(0)
-        if len(parts) > 0 and parts[-1] == "":
-            parts.pop()
-            
-        if not parts:
-            continue
+class CharacterImportResponse(BaseModel):
+    added: int
+    characters: List[Character]
+
+class SceneImportResponse(BaseModel):
+    added: int
+    scenes: List[Scene]
+
+class ShotImportResponse(BaseModel):
+    added: int
+    shots: List[Shot]
+    # Names from the table that matched no character / scene in the project
+    unresolved: Dict[str, List[str]] = {}
+
+# Declared response models let FastAPI serialize large imports natively instead of
+# walking every shot through jsonable_encoder
+@app.post("/projects/{project_id}/characters/import_from_md", response_model=CharacterImportResponse)
+async def import_characters_from_md(project_id: str, file: UploadFile = File(...), expected: int | None = Depends(expected_version)):
+    get_project_or_404(project_id)
+    new_characters = [
+        Character(
+            id=str(uuid.uuid4()),
+            name=row.name,
+            avatar_url=f"https://api.dicebear.com/7.x/adventurer/svg?seed={row.name}",
+            prompt=row.prompt,
+            description=row.description
+        )
+        for row in await md_import.read_characters(file)
+    ]
 
-        # Check for header
-        if not header_found:
-            for i, p in enumerate(parts):
-                if "角色名" in p:
-                    name_idx = i
-                    header_found = True
-                elif "描述" in p:
-                    desc_idx = i
-                elif "提示词" in p:
-                    prompt_idx = i
-            continue
-            
-        # Check for separator
-        if all(c in "- :" for c in "".join(parts)):
-            continue
-            
-        # Data row
-        if name_idx != -1 and len(parts) > name_idx:
-            name = parts[name_idx]
-            if "角色名" in name: continue
-            
-            desc = parts[desc_idx] if desc_idx != -1 and len(parts) > desc_idx else ""
-            prompt = parts[prompt_idx] if prompt_idx != -1 and len(parts) > prompt_idx else ""
-            
-            if name:
-                char_id = str(uuid.uuid4())
-                avatar_url = f"https://api.dicebear.com/7.x/adventurer/svg?seed={name}"
-                
-                new_char = Character(
-                    id=char_id,
-                    name=name,
-                    avatar_url=avatar_url,
-                    prompt=prompt,
-                    description=desc
-                )
-                new_characters.append(new_char)
-
-    if new_characters:
-        project.characters.extend(new_characters)
-        save_db()
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        check_version(project, expected)
+        if new_characters:
+            project.characters.extend(new_characters)
+            bump_version(project)
+            prompt_builder.invalidate_assets(project_id)
+            save_db()
         
     return {"added": len(new_characters), "characters": new_characters}
 
 
 @app.post("/projects/{project_id}/scenes", response_model=Scene)
-async def create_scene(project_id: str, scene: Scene):
-    project = get_project_or_404(project_id)
-    # Check if exists (by ID)
-    if any(s.id == scene.id for s in project.scenes):
-        raise HTTPException(status_code=400, detail="Scene ID already exists")
-    if getattr(scene, "image_url", None):
-        scene.image_url = _sanitize_url(scene.image_url)
-        if isinstance(scene.image_url, str) and scene.image_url and scene.image_url.startswith("http"):
-            scene.image_url = _save_image_from_url(scene.image_url, sub_dir=project_id)
-    project.scenes.append(scene)
-    save_db()
+async def create_scene(project_id: str, scene: Scene, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        check_version(project, expected)
+        # Check if exists (by ID)
+        if any(s.id == scene.id for s in project.scenes):
+            raise HTTPException(status_code=400, detail="Scene ID already exists")
+        if getattr(scene, "image_url", None):
+            scene.image_url = _sanitize_url(scene.image_url)
+            if _is_remote_image(scene.image_url):
+                _queue_localization(project_id, "scene", scene.id, scene.image_url)
+        project.scenes.append(scene)
+        bump_version(project)
+        prompt_builder.invalidate_assets(project_id)
+        save_db()
     return scene
 
-@app.post("/projects/{project_id}/scenes/import_from_md")
-async def import_scenes_from_md(project_id: str, file: UploadFile = File(...)):
-    project = get_project_or_404(project_id)
-    content = await file.read()
-    try:
-        text = content.decode("utf-8")
-    except:
-        text = content.decode("gbk", errors="ignore")
-    
-    lines = text.split("\n")
-    new_scenes = []
-    
-    header_found = False
-    name_idx = -1
-    desc_idx = -1
-    prompt_idx = -1
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        parts = [p.strip() for p in line.split("|")]
-        if len(parts) > 0 and parts[0] == "":
-            parts.pop(0)
-        if len(parts) > 0 and parts[-1] == "":
-            parts.pop()
-        if not parts:
-            continue
-        
-        if not header_found:
-            for i, p in enumerate(parts):
-                if "场景名" in p:
-                    name_idx = i
-                    header_found = True
-                elif "描述" in p:
-                    desc_idx = i
-                elif "提示词" in p or "生图提示词" in p:
-                    prompt_idx = i
-            continue
-        
-        if all(c in "- :" for c in "".join(parts)):
-            continue
-        
-        if name_idx != -1 and len(parts) > name_idx:
-            name = parts[name_idx]
-            if "场景名" in name:
-                continue
-            desc = parts[desc_idx] if desc_idx != -1 and len(parts) > desc_idx else ""
-            prompt = parts[prompt_idx] if prompt_idx != -1 and len(parts) > prompt_idx else ""
-            if name:
-                scene_id = str(uuid.uuid4())
-                new_scene = Scene(
-                    id=scene_id,
-                    name=name,
-                    image_url="",
-                    prompt=prompt,
-                    description=desc,
-                    tags=[]
-                )
-                new_scenes.append(new_scene)
-    
-    if new_scenes:
-        project.scenes.extend(new_scenes)
-        save_db()
+@app.post("/projects/{project_id}/scenes/import_from_md", response_model=SceneImportResponse)
+async def import_scenes_from_md(project_id: str, file: UploadFile = File(...), expected: int | None = Depends(expected_version)):
+    get_project_or_404(project_id)
+    new_scenes = [
+        Scene(
+            id=str(uuid.uuid4()),
+            name=row.name,
+            image_url="",
+            prompt=row.prompt,
+            description=row.description,
+            tags=[]
+        )
+        for row in await md_import.read_scenes(file)
+    ]
+
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        check_version(project, expected)
+        if new_scenes:
+            project.scenes.extend(new_scenes)
+            bump_version(project)
+            prompt_builder.invalidate_assets(project_id)
+            save_db()
     
     return {"added": len(new_scenes), "scenes": new_scenes}
 
-@app.post("/projects/{project_id}/shots/import_from_md")
-async def import_shots_from_md(project_id: str, file: UploadFile = File(...)):
-    project = get_project_or_404(project_id)
-    content = await file.read()
-    try:
-        text = content.decode("utf-8")
-    except:
-        text = content.decode("gbk", errors="ignore")
-    
-    lines = text.split("\n")
-    rows = []
-    
-    header_found = False
-    idx_no = -1
-    idx_chars = -1
-    idx_scene = -1
-    idx_prompt = -1
-    idx_video = -1
-    
-    print("DEBUG: Starting MD Import parsing")
+@app.post("/projects/{project_id}/shots/import_from_md", response_model=ShotImportResponse)
+async def import_shots_from_md(project_id: str, file: UploadFile = File(...), expected: int | None = Depends(expected_version)):
+    get_project_or_404(project_id)
+    rows = await md_import.read_shots(file)
+
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        check_version(project, expected)
+
+        # Resolve IDs
+        char_resolver = NameResolver((c.name, c.id) for c in (project.characters or []))
+        scene_resolver = NameResolver((s.name, s.id) for s in (project.scenes or []))
+        id_to_char_obj = {c.id: c for c in (project.characters or [])}
+        id_to_scene_obj = {s.id: s for s in (project.scenes or [])}
+
+        new_shots = []
+        unresolved_chars: dict[str, None] = {}
+        unresolved_scenes: dict[str, None] = {}
+        for r in rows:
+            char_ids = []
+            for n in r.char_names:
+                char_id = char_resolver.resolve(n)
+                if char_id:
+                    char_ids.append(char_id)
+                else:
+                    unresolved_chars.setdefault(n.strip(), None)
+
+            scene_id = None
+            if r.scene_name:
+                scene_id = scene_resolver.resolve(r.scene_name)
+                if not scene_id:
+                    unresolved_scenes.setdefault(r.scene_name.strip(), None)
+
+            # Auto-append asset prompts
+            final_prompt = r.prompt
+            for cid in char_ids:
+                c = id_to_char_obj.get(cid)
+                if c and c.prompt:
+                    final_prompt += f" [{c.name}: {c.prompt}]"
+
+            if scene_id:
+                s = id_to_scene_obj.get(scene_id)
+                if s and s.prompt:
+                    final_prompt += f" [{s.name}: {s.prompt}]"
+
+            shot_dict = {
+                "prompt": final_prompt,
+                "dialogue": "",
+                "audio_prompt": r.video_prompt if r.video_prompt else None,
+                "use_scene_ref": True,
+                "custom_image_url": None,
+                "panel_layout": project.default_panel_layout or "3-panel",
+                "characters": char_ids,
+                "scene_id": scene_id,
+            }
+
+            new_shot = Shot(
+                id=str(uuid.uuid4()),
+                order=len(project.shots),
+                **shot_dict
+            )
+            if not new_shot.image_url:
+                new_shot.image_url = f"https://placehold.co/300x169/25262b/FFF?text=New+Shot"
 
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        parts = [p.strip() for p in line.split("|")]
-        # Remove empty first/last elements if they are just from the boundary pipes
-        if len(parts) > 0 and parts[0] == "":
-            parts.pop(0)
-        if len(parts) > 0 and parts[-1] == "":
-            parts.pop()
-            
-        if not parts:
-            continue
+            project.shots.append(new_shot)
+            new_shots.append(new_shot)
 
-        # Check for header
-        if not header_found:
-            # Clean parts for checking (remove spaces inside words too?)
-            clean_parts = [p.replace(" ", "").replace("\t", "") for p in parts]
-            print(f"DEBUG: Checking header candidate: {clean_parts}")
-            
-            temp_idx_no = -1
-            temp_idx_chars = -1
-            temp_idx_scene = -1
-            temp_idx_prompt = -1
-            temp_idx_video = -1
-
-            for i, p in enumerate(clean_parts):
-                if "编号" in p or "序号" in p: temp_idx_no = i
-                elif "出场人物" in p or "角色" in p: temp_idx_chars = i
-                elif "场景" in p: temp_idx_scene = i
-                elif "视频提示词" in p: temp_idx_video = i
-                elif "分镜提示词" in p: temp_idx_prompt = i
-                # Fallback for "提示词" only if not matched specific ones
-                elif "提示词" in p and temp_idx_prompt == -1 and temp_idx_video == -1: temp_idx_prompt = i
-
-            # If we found at least a few key columns, assume it's the header
-            if temp_idx_chars != -1 or temp_idx_prompt != -1 or temp_idx_video != -1:
-                idx_no = temp_idx_no
-                idx_chars = temp_idx_chars
-                idx_scene = temp_idx_scene
-                idx_prompt = temp_idx_prompt
-                idx_video = temp_idx_video
-                header_found = True
-                print(f"DEBUG: Header Found! Indices: no={idx_no}, chars={idx_chars}, scene={idx_scene}, prompt={idx_prompt}, video={idx_video}")
-            continue
-            
-        # Check for separator
-        joined = "".join(parts)
-        if all(c in "- :|" for c in joined):
-            continue
-            
-        # Data row
-        number = None
-        if idx_no != -1 and len(parts) > idx_no:
-            try:
-                number = int(parts[idx_no])
-            except:
-                pass 
-        
-        char_names = []
-        if idx_chars != -1 and len(parts) > idx_chars:
-            raw = parts[idx_chars]
-            for sep in ["、", ",", "，", "/", "|"]:
-                raw = raw.replace(sep, " ")
-            char_names = [x.strip() for x in raw.split() if x.strip()]
-            
-        scene_name = parts[idx_scene].strip() if idx_scene != -1 and len(parts) > idx_scene else ""
-        prompt = parts[idx_prompt].strip() if idx_prompt != -1 and len(parts) > idx_prompt else ""
-        video_prompt = parts[idx_video].strip() if idx_video != -1 and len(parts) > idx_video else ""
-        
-        if char_names or scene_name or prompt or video_prompt:
-            rows.append({
-                "number": number,
-                "char_names": char_names,
-                "scene_name": scene_name,
-                "prompt": prompt,
-                "video_prompt": video_prompt,
-            })
-
-    print(f"DEBUG: Parsed {len(rows)} rows")
-    rows.sort(key=lambda r: (r["number"] if isinstance(r["number"], int) else 1_000_000))
-    
-    def normalize(s):
-        if not s: return ""
-        s = s.strip().lower()
-        # Remove common punctuation and whitespace
-        for char in [" ", "\t", "，", ",", "。", ".", "：", ":", "“", "”", "'", '"', "（", "）", "(", ")", "-", "_"]:
-            s = s.replace(char, "")
-        return s
-
-    # Resolve IDs
-    name_to_char = {c.name.strip(): c.id for c in (project.characters or [])}
-    norm_to_char = {normalize(c.name): c.id for c in (project.characters or [])}
-    id_to_char_obj = {c.id: c for c in (project.characters or [])}
-
-    name_to_scene = {s.name.strip(): s.id for s in (project.scenes or [])}
-    norm_to_scene = {normalize(s.name): s.id for s in (project.scenes or [])}
-    id_to_scene_obj = {s.id: s for s in (project.scenes or [])}
-    
-    new_shots = []
-    for r in rows:
-        char_ids = []
-        for n in r["char_names"]:
-            n_clean = n.strip()
-            # 1. Exact match
-            if n_clean in name_to_char:
-                char_ids.append(name_to_char[n_clean])
-            # 2. Normalized match
-            elif normalize(n_clean) in norm_to_char:
-                char_ids.append(norm_to_char[normalize(n_clean)])
-            else:
-                # 3. Try to find if one contains the other (fallback)
-                found = False
-                n_norm = normalize(n_clean)
-                for c_name, c_id in name_to_char.items():
-                    c_norm = normalize(c_name)
-                    if n_norm and (n_norm in c_norm or c_norm in n_norm):
-                        char_ids.append(c_id)
-                        found = True
-                        break
-                if not found:
-                    print(f"DEBUG: Character '{n}' not found")
-
-        scene_id = None
-        if r["scene_name"]:
-            s_name = r["scene_name"].strip()
-            # 1. Exact match
-            if s_name in name_to_scene:
-                scene_id = name_to_scene[s_name]
-            # 2. Normalized match
-            elif normalize(s_name) in norm_to_scene:
-                scene_id = norm_to_scene[normalize(s_name)]
-            else:
-                # 3. Try partial match
-                found = False
-                s_norm = normalize(s_name)
-                for sc_name, sc_id in name_to_scene.items():
-                    sc_norm = normalize(sc_name)
-                    if s_norm and (s_norm in sc_norm or sc_norm in s_norm):
-                        scene_id = sc_id
-                        found = True
-                        break
-                if not found:
-                    print(f"DEBUG: Scene '{s_name}' not found")
-
-        # Auto-append asset prompts
-        final_prompt = r["prompt"]
-        for cid in char_ids:
-            c = id_to_char_obj.get(cid)
-            if c and c.prompt:
-                final_prompt += f" [{c.name}: {c.prompt}]"
-        
-        if scene_id:
-            s = id_to_scene_obj.get(scene_id)
-            if s and s.prompt:
-                final_prompt += f" [{s.name}: {s.prompt}]"
-
-        shot_dict = {
-            "prompt": final_prompt,
-            "dialogue": "",
-            "audio_prompt": r["video_prompt"] if r["video_prompt"] else None,
-            "use_scene_ref": True,
-            "custom_image_url": None,
-            "panel_layout": project.default_panel_layout or "3-panel",
-            "characters": char_ids,
-            "scene_id": scene_id,
-        }
-        
-        new_shot = Shot(
-            id=str(uuid.uuid4()),
-            order=len(project.shots),
-            **shot_dict
-        )
-        if not new_shot.image_url:
-            new_shot.image_url = f"https://placehold.co/300x169/25262b/FFF?text=New+Shot"
-            
-        project.shots.append(new_shot)
-        new_shots.append(new_shot)
-        
-    save_db()
-    return {"added": len(new_shots), "shots": new_shots}
-@app.put("/characters/{project_id}/{char_id}", response_model=Character)
-async def update_character(project_id: str, char_id: str, updates: CharacterUpdate):
-    project = get_project_or_404(project_id)
-    for char in project.characters:
-        if char.id == char_id:
-            updated_data = updates.dict(exclude_unset=True)
-            for k, v in updated_data.items():
-                setattr(char, k, v)
-            if "avatar_url" in updated_data and getattr(char, "avatar_url", None):
-                char.avatar_url = _sanitize_url(char.avatar_url)
-                if isinstance(char.avatar_url, str) and char.avatar_url and char.avatar_url.startswith("http"):
-                    char.avatar_url = _save_image_from_url(char.avatar_url, sub_dir=project_id)
+        if new_shots:
+            bump_version(project)
             save_db()
-            return char
-    raise HTTPException(status_code=404, detail="Character not found")
+    return {
+        "added": len(new_shots),
+        "shots": new_shots,
+        "unresolved": {"characters": list(unresolved_chars), "scenes": list(unresolved_scenes)}
+    }
+
+@app.put("/characters/{project_id}/{char_id}", response_model=Character)
+async def update_character(project_id: str, char_id: str, updates: CharacterUpdate, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        char = next((c for c in project.characters if c.id == char_id), None)
+        if not char:
+            raise HTTPException(status_code=404, detail="Character not found")
+        check_version(project, expected)
+        updated_data = updates.dict(exclude_unset=True)
+        for k, v in updated_data.items():
+            setattr(char, k, v)
+        if "avatar_url" in updated_data and getattr(char, "avatar_url", None):
+            char.avatar_url = _sanitize_url(char.avatar_url)
+            if _is_remote_image(char.avatar_url):
+                _queue_localization(project_id, "character", char.id, char.avatar_url)
+        bump_version(project)
+        prompt_builder.invalidate_assets(project_id)
+        save_db()
+    return char
 
 @app.delete("/characters/{project_id}/{char_id}")
-async def delete_character(project_id: str, char_id: str):
-    project = get_project_or_404(project_id)
-    before_len = len(project.characters)
-    project.characters = [c for c in project.characters if c.id != char_id]
-    for shot in project.shots:
-        if isinstance(shot.characters, list):
-            shot.characters = [cid for cid in shot.characters if cid != char_id]
-    if len(project.characters) == before_len:
-        raise HTTPException(status_code=404, detail="Character not found")
-    save_db()
+async def delete_character(project_id: str, char_id: str, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        if not any(c.id == char_id for c in project.characters):
+            raise HTTPException(status_code=404, detail="Character not found")
+        check_version(project, expected)
+        project.characters = [c for c in project.characters if c.id != char_id]
+        for shot in project.shots:
+            if isinstance(shot.characters, list) and char_id in shot.characters:
+                shot.characters = [cid for cid in shot.characters if cid != char_id]
+                bump_version(shot)
+        bump_version(project)
+        prompt_builder.invalidate_assets(project_id)
+        save_db()
     return {"ok": True}
 
 @app.put("/scenes/{project_id}/{scene_id}", response_model=Scene)
-async def update_scene(project_id: str, scene_id: str, updates: SceneUpdate):
-    project = get_project_or_404(project_id)
-    for scene in project.scenes:
-        if scene.id == scene_id:
-            updated_data = updates.dict(exclude_unset=True)
-            for k, v in updated_data.items():
-                setattr(scene, k, v)
-            if "image_url" in updated_data and getattr(scene, "image_url", None):
-                scene.image_url = _sanitize_url(scene.image_url)
-                if isinstance(scene.image_url, str) and scene.image_url and scene.image_url.startswith("http"):
-                    scene.image_url = _save_image_from_url(scene.image_url, sub_dir=project_id)
-            save_db()
-            return scene
-    raise HTTPException(status_code=404, detail="Scene not found")
+async def update_scene(project_id: str, scene_id: str, updates: SceneUpdate, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        scene = next((s for s in project.scenes if s.id == scene_id), None)
+        if not scene:
+            raise HTTPException(status_code=404, detail="Scene not found")
+        check_version(project, expected)
+        updated_data = updates.dict(exclude_unset=True)
+        for k, v in updated_data.items():
+            setattr(scene, k, v)
+        if "image_url" in updated_data and getattr(scene, "image_url", None):
+            scene.image_url = _sanitize_url(scene.image_url)
+            if _is_remote_image(scene.image_url):
+                _queue_localization(project_id, "scene", scene.id, scene.image_url)
+        bump_version(project)
+        prompt_builder.invalidate_assets(project_id)
+        save_db()
+    return scene
 
 class ScriptRequest(BaseModel):
     content: str
@@ -1168,133 +1367,34 @@ class ScriptParseResponse(BaseModel):
 @app.post("/api/parse-script", response_model=ScriptParseResponse)
 async def parse_script(request: ScriptRequest):
     """
-    Parse script using Aliyun Bailian (Qwen) if API key is present.
+    Parse script using the configured LLM if available, in parallel scene chunks.
     Fallback to simple splitting if not.
     """
-    if client:
-        try:
-            system_prompt = """
-            你是一位专业的动画分镜导演。请将用户提供的剧本解析为一系列分镜镜头，并提取出所有出现的角色和场景及其详细视觉描述。
-            
-            输出必须是一个JSON对象，包含三个字段：
-            1. "shots": 镜头列表，每个镜头包含：
-               - prompt: 详细的画面描述，包含镜头角度、光影、人物动作、场景细节。适合用于AI生图。
-               - dialogue: 该镜头的台词（如果有）。
-               - characters: 该镜头中出现的角色名字列表（例如：["陈远", "神秘师兄"]）。如果无角色则为空列表。
-               - scene: 该镜头发生的场景名称（例如："外门练武场", "刻家入口"）。
-            
-            2. "characters": 角色列表，包含剧本中出现的所有角色。每个角色包含：
-               - name: 角色名字。
-               - prompt: 角色的详细外貌描述（发型、发色、眼睛、衣着、配饰、气质等），用于AI生图。
-            
-            3. "scenes": 场景列表，包含剧本中出现的所有场景。每个场景包含：
-               - name: 场景名字。
-               - prompt: 场景的详细环境描述（建筑风格、天气、光照、氛围、关键物体等），用于AI生图。
-            
-            请直接返回JSON对象，不要包含任何Markdown格式或额外文字。
-            """
-            
-            response = await client.chat.completions.create(
-                model=current_llm_model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": request.content}
-                ],
-                temperature=0.7
-            )
-            
-            content = response.choices[0].message.content
-            # Clean up potential markdown code blocks
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.startswith("```"):
-                content = content[3:]
-            if content.endswith("```"):
-                content = content[:-3]
-                
-            data = json.loads(content)
-            
-            shots = []
-            for item in data.get("shots", []):
-                shots.append(ShotCreate(
-                    prompt=item.get("prompt", ""),
-                    dialogue=item.get("dialogue", ""),
-                    characters=item.get("characters", []),
-                    scene=item.get("scene", None)
-                ))
-            
-            parsed_chars = []
-            for item in data.get("characters", []):
-                parsed_chars.append(ParsedCharacter(
-                    name=item.get("name", ""),
-                    prompt=item.get("prompt", "")
-                ))
-                
-            parsed_scenes = []
-            for item in data.get("scenes", []):
-                parsed_scenes.append(ParsedScene(
-                    name=item.get("name", ""),
-                    prompt=item.get("prompt", "")
-                ))
-                
-            return ScriptParseResponse(
-                shots=shots,
-                characters=parsed_chars,
-                scenes=parsed_scenes
-            )
-            
-        except Exception as e:
-            print(f"AI Parse Error: {e}")
-            # Fallback to mock if error
-            pass
-
-    # Mock/Fallback Implementation
-    lines = [line.strip() for line in request.content.split('\n') if line.strip()]
-    shots = []
-    current_scene = None
-    
-    # Simple extraction sets
-    found_chars = set()
-    found_scenes = set()
-    
-    for line in lines:
-        # Simple Scene Detection
-        if line.startswith("场景：") or line.startswith("Scene:") or line.startswith("场景:"):
-            # Extract scene name
-            parts = line.split(":", 1)
-            if len(parts) > 1:
-                current_scene = parts[1].strip()
-                found_scenes.add(current_scene)
-            continue
-            
-        # Simple Character Detection (very basic, looks for Name: Dialogue)
-        characters = []
-        dialogue = ""
-        prompt = line
-        
-        if "：" in line or ":" in line:
-            parts = line.replace("：", ":").split(":", 1)
-            potential_name = parts[0].strip()
-            # If name is short, assume it's a character
-            if len(potential_name) < 10 and " " not in potential_name:
-                characters.append(potential_name)
-                found_chars.add(potential_name)
-                dialogue = parts[1].strip()
-        
-        shots.append(ShotCreate(
-            prompt=prompt,
-            dialogue=dialogue,
-            characters=characters,
-            scene=current_scene
-        ))
-    
-    # Mock profiles for fallback
+    data = await script_parser.parse_script(client, current_llm_model, request.content)
     return ScriptParseResponse(
-        shots=shots,
-        characters=[ParsedCharacter(name=c, prompt=f"{c}, anime style character, detailed") for c in found_chars],
-        scenes=[ParsedScene(name=s, prompt=f"{s}, anime style background, detailed") for s in found_scenes]
+        shots=[ShotCreate(
+            prompt=item.get("prompt", ""),
+            dialogue=item.get("dialogue", ""),
+            characters=item.get("characters", []),
+            scene=item.get("scene", None)
+        ) for item in data["shots"]],
+        characters=[ParsedCharacter(name=item["name"], prompt=item["prompt"]) for item in data["characters"]],
+        scenes=[ParsedScene(name=item["name"], prompt=item["prompt"]) for item in data["scenes"]]
     )
 
+@app.post("/api/parse-script/stream")
+async def parse_script_stream(request: ScriptRequest):
+    """
+    Same parse as /api/parse-script, sent as Server-Sent Events: a `shot`, `character`
+    or `scene` event per object as soon as the LLM finishes it, then `done` with the
+    merged result.
+    """
+    async def events():
+        async for event, data in script_parser.stream_script(client, current_llm_model, request.content):
+            yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 # --- AI Services ---
 
 CANDIDATE_IMAGE_COUNT = 3
@@ -1502,16 +1602,20 @@ def _save_base64_image_file(b64_data: str, sub_dir: str = None) -> str:
 
 def _save_image_from_url(url: str, sub_dir: str = None) -> str:
     try:
-        req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            data = resp.read()
-            content_type = resp.headers.get("Content-Type", "")
+        with metrics.download("image") as record_size:
+            req = urllib.request.Request(url, headers={"User-Agent": "Mozilla/5.0"})
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                data = resp.read()
+                content_type = resp.headers.get("Content-Type", "")
+            record_size(len(data))
         
         ext = ".png"
         if "jpeg" in content_type or "jpg" in content_type:
             ext = ".jpg"
         elif "webp" in content_type:
             ext = ".webp"
+        elif "svg" in content_type:
+            ext = ".svg"
             
         filename = f"{uuid.uuid4()}{ext}"
         if sub_dir:
@@ -1531,6 +1635,9 @@ def _save_image_from_url(url: str, sub_dir: str = None) -> str:
         print(f"Failed to save image from url: {e}")
         return url
 
+# Bump whenever the vision prompt below changes so cached descriptions are not reused
+VISION_PROMPT_VERSION = "vision-v1"
+
 async def _describe_image_with_vision(image_url: str) -> str:
     if not client:
         return ""
@@ -1546,322 +1653,250 @@ async def _describe_image_with_vision(image_url: str) -> str:
     if not b64:
         print(f"[Vision] Failed to load image for analysis")
         return ""
-        
+
+    # Keyed on the image bytes, so the same reference uploaded under another URL still hits
+    cache_key = llm_cache.make_key(current_llm_model, VISION_PROMPT_VERSION, hash_bytes(b64))
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        print(f"[Vision] Using cached description: {cached[:50]}...")
+        return cached
+
     try:
-        response = await client.chat.completions.create(
-            model=current_llm_model,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": "Describe the visual style, composition, lighting, and key elements of this image concisely. This description will be used as a style reference for generating a new image."},
-                        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}"}}
-                    ]
-                }
-            ],
-            max_tokens=200
-        )
+        with metrics.provider_call("openai", "llm"):
+            response = await client.chat.completions.create(
+                model=current_llm_model,
+                messages=[
+                    {
+                        "role": "user",
+                        "content": [
+                            {"type": "text", "text": "Describe the visual style, composition, lighting, and key elements of this image concisely. This description will be used as a style reference for generating a new image."},
+                            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{b64}"}}
+                        ]
+                    }
+                ],
+                max_tokens=200
+            )
         description = response.choices[0].message.content
         print(f"[Vision] Generated description: {description[:50]}...")
+        if description:
+            await short_executor.run(llm_cache.put, cache_key, description, kind="vision")
         return description
     except Exception as e:
         print(f"[Vision] Failed to describe image: {e}")
         return ""
 
-async def ai_generation_task(project_id: str, shot_id: str, type: str, count: int | None = None, video_id: str | None = None):
+def _collect_reference_images(project: Project, target_shot: Shot) -> list[dict]:
+    char_by_id, scene_by_id = prompt_builder.asset_index(project)
+    reference_images = []
+    if isinstance(target_shot.characters, list) and target_shot.characters:
+        # Use ALL characters, not just top 3
+        for cid in target_shot.characters:
+            c = char_by_id.get(cid)
+            if not c:
+                continue
+            b64 = _image_url_to_base64(getattr(c, "avatar_url", "") or "")
+            if b64:
+                reference_images.append({"name": c.name, "b64": b64})
+
+    if target_shot.use_scene_ref and target_shot.scene_id:
+        scene = scene_by_id.get(target_shot.scene_id)
+        print(f"[DEBUG] Checking Scene Ref: id={target_shot.scene_id}, found={scene is not None}, url={scene.image_url if scene else 'N/A'}")
+        if scene and scene.image_url:
+            b64 = _image_url_to_base64(scene.image_url)
+            if b64:
+                print(f"[DEBUG] Added scene reference: {scene.name}")
+                reference_images.append({"name": scene.name, "b64": b64})
+            else:
+                print(f"[DEBUG] Failed to convert scene image to base64: {scene.image_url}")
+
+    # Add custom image reference
+    if target_shot.custom_image_url:
+        print(f"[DEBUG] Checking Custom Ref: url={target_shot.custom_image_url}")
+        b64 = _image_url_to_base64(target_shot.custom_image_url)
+        if b64:
+            print(f"[DEBUG] Added custom reference")
+            reference_images.append({"name": "Custom Reference", "b64": b64})
+        else:
+            print(f"[DEBUG] Failed to convert custom image to base64: {target_shot.custom_image_url}")
+
+    print(f"[DEBUG] Final Reference Images: {[r.get('name') for r in reference_images]}")
+    if not reference_images:
+        print("[DEBUG] No reference images found (characters or scene). Using text-only generation.")
+    return reference_images
+
+async def _generate_image_pooled(prompt: str, sub_dir: str | None, negative_prompt: str = "", reference_images: list[dict] | None = None, reference_image_url: str | None = None, pool: str = "image") -> str:
+    """generate_image on the next available account of a provider pool ("image" or "image_hedge")."""
+    return await provider_pool.run(pool, lambda account: generate_image(
+        account.provider,
+        prompt,
+        sub_dir=sub_dir,
+        config=account.config,
+        image_client=account.image_client,
+        visual_service=account.visual_service,
+        negative_prompt=negative_prompt,
+        reference_images=reference_images,
+        reference_image_url=reference_image_url,
+        image_url_to_base64=_image_url_to_base64,
+        save_image_from_url=_save_image_from_url,
+        save_base64_image=_save_base64_image
+    ))
+
+def _hedge_provider() -> str | None:
+    """The secondary image provider, when hedging is configured."""
+    accounts = provider_pool.accounts("image_hedge")
+    return accounts[0].provider if accounts else None
+
+async def _generate_image_hedged(provider: str, prompt: str, sub_dir: str | None, negative_prompt: str, reference_images: list[dict] | None, reference_image_url: str | None, hedge_prompt=None, hedge_references=None) -> tuple[str, str]:
+    """One image from the pooled primary provider, hedged with the secondary one if configured.
+
+    ``hedge_prompt(provider)`` builds the prompt for the secondary provider and the async
+    ``hedge_references()`` its reference images; both only run if the hedge fires.
+    """
+    hedge = _hedge_provider()
+    secondary = None
+    if hedge:
+        async def secondary():
+            references = await hedge_references() if hedge_references and hedge == "volcengine" else None
+            return await _generate_image_pooled(
+                hedge_prompt(hedge) if hedge_prompt else prompt, sub_dir, negative_prompt, references,
+                reference_image_url if hedge == "openai" else None, pool="image_hedge"
+            )
+    return await image_hedger.run(
+        provider,
+        lambda: _generate_image_pooled(prompt, sub_dir, negative_prompt, reference_images, reference_image_url),
+        hedge,
+        secondary,
+        delay=current_api_config.image_hedge_delay or None
+    )
+
+async def ai_generation_task(project_id: str, shot_id: str, type: str, count: int | None = None, video_id: str | None = None, job_id: str | None = None, reuse_cached: bool = False):
+    job = job_registry.get(job_id)
+    # The root span starts when the job was queued, so the trace covers the queue wait too
+    with tracer.start_trace(job_id, f"generate.{type}", start=job.created_at if job else None, **{"project.id": project_id, "shot.id": shot_id, "video.id": video_id}) as root:
+        if job:
+            tracer.record("queue", job.created_at, time.time())
+        await _run_generation_task(project_id, shot_id, type, count, video_id, job_id, reuse_cached)
+        if root and job and job.error:
+            root.fail(job.error)
+
+def _live_shot(project_id: str, shot_id: str) -> Shot | None:
+    """The shot as DB holds it now; a reload or merge can replace the object a task started with."""
     project = DB.get(project_id)
-    if not project: return
+    return next((s for s in project.shots if s.id == shot_id), None) if project else None
+
+def _video_item(shot: Shot, video_id: str | None) -> VideoItem | None:
+    return next((v for v in shot.video_items or [] if v.id == video_id), None) if video_id else None
+
+async def _run_generation_task(project_id: str, shot_id: str, type: str, count: int | None, video_id: str | None, job_id: str | None, reuse_cached: bool):
+    project = DB.get(project_id)
+    if not project:
+        job_registry.finish(job_id, error="Project not found")
+        return
 
     target_shot = next((s for s in project.shots if s.id == shot_id), None)
-    if not target_shot: return
+    if not target_shot:
+        job_registry.finish(job_id, error="Shot not found")
+        return
 
+    job_registry.start(job_id)
+    video_url, video_status = None, None
     try:
-        prompt = (target_shot.audio_prompt or target_shot.prompt or "") if type == "video" else (target_shot.prompt or "")
-        
-        # Clean existing layout keywords to avoid conflicts with selected panel_layout
-        remove_patterns = [
-            r"3-panel storyboard", r"3-panel", r"3 panel", r"triptych", r"three frames", r"three panel",
-            r"comic panel layout", r"clean gutters", r"no text", r"no watermark",
-            r"1-panel", r"single panel", r"1 panel", r"full shot", r"one frame",
-            r"2-panel", r"diptych", r"2 panel", r"two frames", r"two panel",
-            r"4-panel", r"2x2 grid", r"4 panel", r"four frames", r"four panel", r"yonkoma style",
-            r"vertical split", r"horizontal split"
-        ]
-        for pattern in remove_patterns:
-            prompt = re.sub(pattern, "", prompt, flags=re.IGNORECASE)
-            
-        # Clean up punctuation
-        prompt = re.sub(r",\s*,", ",", prompt)
-        prompt = re.sub(r"\s+", " ", prompt).strip().strip(",")
-        
-        style_prompts = {
-            "real": "photorealistic, raw photo, real person, 8k uhd, dslr, soft lighting, film grain, hyperrealistic",
-            "anime": "anime style, japanese anime, vibrant colors, cel shading, high quality, highly detailed, masterpiece, 2d, beautiful composition",
-            "manga": "manga style, japanese comic, black and white, line art, screentones, ink drawing, high contrast, monochrome, detailed lines, high quality",
-            "realistic": "3d animation style, cgi, unreal engine 5, octane render, detailed texture, volumetric lighting, 8k, pixar style, disney style, 3d render",
-            "chinese_anime": "chinese anime style, guofeng, donghua, ancient chinese aesthetics, elegant, vibrant, 2d"
-        }
-        style_desc = style_prompts.get(project.style, f"{project.style} style")
-        
-        # Adjust layout prompts based on style
-        is_real = project.style == "real" or project.style == "realistic"
-        
-        layout_prompts = {
-            "1-panel": "single panel, full shot, one frame, cinematic composition" if is_real else "single panel, full shot, one frame, cinematic composition, detailed background, no split screen",
-            "2-panel": "split screen, side by side, diptych" if is_real else "2-panel storyboard, diptych, two frames, comic panel layout, vertical split or horizontal split, clean gutters",
-            "3-panel": "collage of 3 images, triptych" if is_real else "3-panel storyboard, triptych, three frames, comic panel layout, clean gutters",
-            "4-panel": "2x2 grid, collage of 4 images" if is_real else "4-panel storyboard, 2x2 grid, four frames, comic panel layout, yonkoma style, clean gutters"
-        }
-        layout_prompt = layout_prompts.get(target_shot.panel_layout, layout_prompts["3-panel"])
-        
-        # Auto-inject Character and Scene prompts
-        additional_prompts = []
-        
-        # 1. Add Scene Prompt
-        if target_shot.scene_id:
-            scene_by_id = {s.id: s for s in (project.scenes or [])}
-            scene = scene_by_id.get(target_shot.scene_id)
-            if scene and scene.prompt:
-                additional_prompts.append(f"Scene location: {scene.prompt}")
-                
-        # 2. Add Character Prompts
-        if target_shot.characters:
-            char_by_id = {c.id: c for c in (project.characters or [])}
-            for char_id in target_shot.characters:
-                char = char_by_id.get(char_id)
-                if char and char.prompt:
-                    additional_prompts.append(f"Character {char.name}: {char.prompt}")
-
-        # Construct base prompt - Put style FIRST, then user prompt, then injected context, then layout
-        base_parts = [style_desc, prompt]
-        if additional_prompts:
-            base_parts.extend(additional_prompts)
-        base_parts.append(layout_prompt)
-        base_parts.append("high quality, detailed")
-        
-        base_prompt = ", ".join(base_parts)
-        
-        negative_prompt = ""
-        if project.style == "real":
-            negative_prompt = "anime, cartoon, drawing, illustration, painting, sketch, 2d, flat, deformed, ugly, 3d render, cgi"
-        elif project.style == "realistic":
-            negative_prompt = "2d, flat, sketch, drawing, painting, anime, manga, japanese anime, photograph, real photo, live action"
-        else:
-            negative_prompt = "photorealistic, real photo, 3d, bad anatomy, bad hands, text, watermark"
-        
+        with tracer.span("build_prompt"):
+            prompts = prompt_builder.build_shot_prompts(project, target_shot, type)
+        negative_prompt = prompts.negative_prompt
+
         if type == "image":
             provider = current_api_config.image_provider or "openai"
+            reference_images = None
+            reference_image_url = None
             if provider == "openai":
                 if not image_client:
                     raise Exception("OpenAI image provider not configured")
-                
                 # Gemini/OpenAI Native Image-to-Image Support
                 # If the underlying model (like Gemini) supports image input, we pass it directly.
                 # We do NOT use the Vision-to-Text fallback here anymore as requested by user.
-                
-                # OpenAI doesn't support negative_prompt natively usually, append to prompt
-                final_prompt = f"{base_prompt}. Exclude: {negative_prompt}"
-                
-                images = []
-                candidate_count = count or CANDIDATE_IMAGE_COUNT
-                candidate_count = max(1, min(8, candidate_count))
-                
-                # Generate in parallel
-                tasks = [
-                    generate_image(
-                        provider,
-                        final_prompt,
-                        sub_dir=project.id,
-                        config=current_api_config,
-                        image_client=image_client,
-                        visual_service=visual_service,
-                        negative_prompt=negative_prompt,
-                        reference_images=None,
-                        reference_image_url=target_shot.custom_image_url,
-                        image_url_to_base64=_image_url_to_base64,
-                        save_image_from_url=_save_image_from_url,
-                        save_base64_image=_save_base64_image
-                    )
-                    for _ in range(candidate_count)
-                ]
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                for res in results:
-                    if isinstance(res, str) and res:
-                        images.append(res)
-                    elif isinstance(res, Exception):
-                        print(f"OpenAI Image Gen failed: {res}")
-
-                if images:
-                    if target_shot.image_candidates is None:
-                        target_shot.image_candidates = []
-                    
-                    # Store original remote URLs before downloading
-                    remote_urls = list(images)
-                    if not target_shot.original_image_url and remote_urls:
-                         target_shot.original_image_url = remote_urls[0]
-
-                    # Download and replace with local URLs
-                    local_urls = []
-                    for url in images:
-                        if url.startswith("http"):
-                            local = await _save_image_from_url(url, sub_dir=project.id)
-                            local_urls.append(local)
-                        else:
-                            local_urls.append(url)
-                            
-                    target_shot.image_candidates.extend(local_urls)
-                    target_shot.image_url = local_urls[0]
+                reference_image_url = target_shot.custom_image_url
+                model = current_api_config.openai_image_model or "gpt-image-1"
+                reference_hashes = [hash_reference(reference_image_url)]
             elif provider == "vectorengine":
-                images = []
-                candidate_count = count or CANDIDATE_IMAGE_COUNT
-                candidate_count = max(1, min(8, candidate_count))
-                
-                # Generate in parallel
-                tasks = [
-                    generate_image(
-                        provider,
-                        base_prompt,
-                        sub_dir=project.id,
-                        config=current_api_config,
-                        image_client=image_client,
-                        visual_service=visual_service,
-                        negative_prompt=negative_prompt,
-                        reference_images=None,
-                        reference_image_url=None,
-                        image_url_to_base64=_image_url_to_base64,
-                        save_image_from_url=_save_image_from_url,
-                        save_base64_image=_save_base64_image
-                    )
-                    for _ in range(candidate_count)
-                ]
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-                
-                for res in results:
-                    if isinstance(res, str) and res:
-                        images.append(res)
-                    elif isinstance(res, Exception):
-                        print(f"VectorEngine gen failed: {res}")
-                
-                if images:
-                    if target_shot.image_candidates is None:
-                        target_shot.image_candidates = []
-                    
-                    # Store original remote URLs before downloading
-                    remote_urls = list(images)
-                    if not target_shot.original_image_url and remote_urls:
-                         target_shot.original_image_url = remote_urls[0]
-
-                    # Download and replace with local URLs
-                    local_urls = []
-                    for url in images:
-                        if url.startswith("http"):
-                            local = await _save_image_from_url(url, sub_dir=project.id)
-                            local_urls.append(local)
-                        else:
-                            local_urls.append(url)
-
-                    target_shot.image_candidates.extend(local_urls)
-                    target_shot.image_url = local_urls[0]
-
+                model = current_api_config.vectorengine_image_model
+                reference_hashes = []
             elif provider == "volcengine":
                 if not visual_service:
                     raise Exception("Volcengine image provider not configured")
-                
-                # Use base_prompt constructed above
-                prompt = base_prompt
-                
-                reference_images = []
-                if isinstance(target_shot.characters, list) and target_shot.characters:
-                    char_by_id = {c.id: c for c in (project.characters or []) if getattr(c, "id", None)}
-                    # Use ALL characters, not just top 3
-                    for cid in target_shot.characters:
-                        c = char_by_id.get(cid)
-                        if not c:
-                            continue
-                        b64 = _image_url_to_base64(getattr(c, "avatar_url", "") or "")
-                        if b64:
-                            reference_images.append({"name": c.name, "b64": b64})
-
-                if target_shot.use_scene_ref and target_shot.scene_id:
-                    scene_by_id = {s.id: s for s in (project.scenes or [])}
-                    scene = scene_by_id.get(target_shot.scene_id)
-                    print(f"[DEBUG] Checking Scene Ref: id={target_shot.scene_id}, found={scene is not None}, url={scene.image_url if scene else 'N/A'}")
-                    if scene and scene.image_url:
-                        b64 = _image_url_to_base64(scene.image_url)
-                        if b64:
-                            print(f"[DEBUG] Added scene reference: {scene.name}")
-                            reference_images.append({"name": scene.name, "b64": b64})
-                        else:
-                            print(f"[DEBUG] Failed to convert scene image to base64: {scene.image_url}")
-
-                # Add custom image reference
-                if target_shot.custom_image_url:
-                    print(f"[DEBUG] Checking Custom Ref: url={target_shot.custom_image_url}")
-                    b64 = _image_url_to_base64(target_shot.custom_image_url)
-                    if b64:
-                        print(f"[DEBUG] Added custom reference")
-                        reference_images.append({"name": "Custom Reference", "b64": b64})
-                    else:
-                        print(f"[DEBUG] Failed to convert custom image to base64: {target_shot.custom_image_url}")
-
-                print(f"[DEBUG] Final Reference Images: {[r.get('name') for r in reference_images]}")
-
-                if not reference_images:
-                    print("[DEBUG] No reference images found (characters or scene). Using text-only generation.")
-
-                images = []
-                candidate_count = count or CANDIDATE_IMAGE_COUNT
-                candidate_count = max(1, min(8, candidate_count))
+                with tracer.span("resolve_references"):
+                    reference_images = await short_executor.run(_collect_reference_images, project, target_shot)
+                model = current_api_config.volc_image_model
+                reference_hashes = [hash_bytes(r["b64"]) for r in reference_images]
+            else:
+                raise Exception(f"Unsupported image provider: {provider}")
+
+            final_prompt = prompts.image_prompt(provider)
+            candidate_count = count or CANDIDATE_IMAGE_COUNT
+            candidate_count = max(1, min(8, candidate_count))
+            tracer.set(provider=provider, model=model, candidates=candidate_count)
+            cache_key = generation_cache.make_key(provider, model, final_prompt, negative_prompt, reference_hashes, target_shot.panel_layout)
+
+            local_urls = []
+            if reuse_cached:
+                with tracer.span("cache_lookup"):
+                    local_urls = generation_cache.get(cache_key)[:candidate_count]
+                if local_urls:
+                    print(f"Reusing {len(local_urls)} cached image(s) for shot {shot_id}")
+                    job = job_registry.get(job_id)
+                    if job:
+                        job.cached = True
+
+            images = []
+            errors = []
+            from_hedge = False
+            missing = candidate_count - len(local_urls)
+            if missing > 0:
+                hedge_refs = None
+                hedge_refs_lock = asyncio.Lock()
+
+                async def hedge_references():
+                    # Only needed when a hedge to Volcengine fires; resolved once per job
+                    nonlocal hedge_refs
+                    async with hedge_refs_lock:
+                        if hedge_refs is None:
+                            hedge_refs = await short_executor.run(_collect_reference_images, project, target_shot)
+                    return hedge_refs
+
                 # Generate in parallel
                 tasks = [
-                    generate_image(
-                        provider,
-                        prompt,
-                        sub_dir=project.id,
-                        config=current_api_config,
-                        image_client=image_client,
-                        visual_service=visual_service,
-                        negative_prompt=negative_prompt,
-                        reference_images=reference_images,
-                        reference_image_url=None,
-                        image_url_to_base64=_image_url_to_base64,
-                        save_image_from_url=_save_image_from_url,
-                        save_base64_image=_save_base64_image
-                    )
-                    for _ in range(candidate_count)
+                    _generate_image_hedged(provider, final_prompt, project.id, negative_prompt, reference_images, reference_image_url,
+                                           hedge_prompt=prompts.image_prompt, hedge_references=hedge_references)
+                    for _ in range(missing)
                 ]
                 results = await asyncio.gather(*tasks, return_exceptions=True)
-                
+
                 for res in results:
-                    if isinstance(res, str) and res:
-                        images.append(res)
+                    if isinstance(res, tuple):
+                        images.append(res[0])
+                        from_hedge = from_hedge or res[1] != provider
                     elif isinstance(res, Exception):
-                        print(f"Volcengine gen failed: {res}")
-
-                if images:
-                    if target_shot.image_candidates is None:
-                        target_shot.image_candidates = []
-                    
-                    # Store original remote URLs before downloading
-                    remote_urls = list(images)
-                    if not target_shot.original_image_url and remote_urls:
-                         target_shot.original_image_url = remote_urls[0]
-
-                    # Download and replace with local URLs
-                    local_urls = []
+                        errors.append(res)
+                        print(f"{provider} image generation failed: {res}")
+
+            if images:
+                # Download and replace with local URLs
+                new_urls = []
+                with tracer.span("localize", images=len(images)):
                     for url in images:
                         if url.startswith("http"):
-                            local = await _save_image_from_url(url, sub_dir=project.id)
-                            local_urls.append(local)
+                            local = await short_executor.run(_save_image_from_url, url, sub_dir=project.id)
+                            new_urls.append(local)
                         else:
-                            local_urls.append(url)
-                            
-                    target_shot.image_candidates.extend(local_urls)
-                    target_shot.image_url = local_urls[0]
-            else:
-                raise Exception(f"Unsupported image provider: {provider}")
-                
+                            new_urls.append(url)
+                # The cache key describes the primary provider's request
+                if not from_hedge:
+                    await short_executor.run(generation_cache.put, cache_key, new_urls, provider=provider, model=model)
+                local_urls.extend(new_urls)
+
+            if not local_urls:
+                raise Exception(f"No images generated ({len(errors)} of {missing} failed): {errors[0] if errors else 'no result'}")
+
         elif type == "video":
             target_shot.video_progress = 0
             if video_id:
@@ -1874,41 +1909,35 @@ async def ai_generation_task(project_id: str, shot_id: str, type: str, count: in
                     item.progress = 0
                     item.status = "generating"
             provider = current_api_config.video_provider or "openai"
-            image_path = _resolve_video_image_path(target_shot, project)
+            tracer.set(provider=provider, model={"openai": current_api_config.openai_video_model, "volcengine": current_api_config.volc_video_model}.get(provider))
+            with tracer.span("resolve_references"):
+                image_path = await short_executor.run(_resolve_video_image_path, target_shot, project)
             if provider == "openai":
                 if not video_client or not current_api_config.openai_video_model:
                     raise Exception("OpenAI video provider not configured")
                 
-                # Use style-enhanced prompt for video too, but skip layout prompts
-                video_prompt = f"{style_desc}, {prompt}, high quality, detailed"
-                if is_real:
-                     video_prompt += f". Exclude: {negative_prompt}"
+                video_prompt = prompts.video_prompt(provider)
                 
                 # Determine source_url: prefer original_image_url (remote) over image_url (local)
                 source_url = target_shot.original_image_url if target_shot.original_image_url else target_shot.image_url
 
-                video_url = await generate_video(
-                    provider,
+                video_url = await provider_pool.run("video", lambda account: generate_video(
+                    account.provider,
                     video_prompt,
                     image_path,
                     sub_dir=project.id,
                     source_url=source_url,
-                    config=current_api_config,
-                    video_client=video_client,
-                    visual_service=visual_service,
+                    config=account.config,
+                    video_client=account.video_client,
+                    visual_service=account.visual_service,
                     save_video_bytes=_save_video_bytes,
                     save_base64_video=_save_base64_video,
-                    progress_callback=None
-                )
-                video_url = _normalize_video_url(video_url, sub_dir=project.id)
-                target_shot.video_url = video_url
-                target_shot.video_progress = 100
-                if video_id and target_shot.video_items:
-                    item = next((v for v in target_shot.video_items if v.id == video_id), None)
-                    if item:
-                        item.url = video_url
-                        item.progress = 100
-                        item.status = "completed"
+                    progress_callback=None,
+                    webhook_url=webhooks.callback_url(current_api_config, "openai", video_id),
+                    job_id=video_id
+                ))
+                with tracer.span("localize"):
+                    video_url = await short_executor.run(_normalize_video_url, video_url, sub_dir=project.id)
             elif provider == "volcengine":
                 if not visual_service:
                     raise Exception("Volcengine video provider not configured")
@@ -1916,143 +1945,219 @@ async def ai_generation_task(project_id: str, shot_id: str, type: str, count: in
                     raise Exception(f"Image is required for video generation. shot image_url={target_shot.image_url}")
 
                 def handle_progress(progress, status):
-                    target_shot.video_progress = progress
-                    if video_id and target_shot.video_items:
-                        item = next((v for v in target_shot.video_items if v.id == video_id), None)
-                        if item:
-                            item.progress = progress
-                            item.status = status if status else "generating"
+                    # Progress ticks leave the shot version alone, so an edit based on it
+                    # is not rejected every few seconds while the video renders
+                    shot = _live_shot(project_id, shot_id)
+                    if not shot:
+                        return
+                    shot.video_progress = progress
+                    item = _video_item(shot, video_id)
+                    if item:
+                        item.progress = progress
+                        item.status = status if status else "generating"
                     save_db()
 
-                # Use style-enhanced prompt for video too, but skip layout prompts which might confuse video generation
-                video_prompt = f"{style_desc}, {prompt}, high quality, detailed"
-                if is_real:
-                     video_prompt += f" --no {negative_prompt}" # Some video models support --no for negative prompts, or just append it
+                video_prompt = prompts.video_prompt(provider)
                 
-                video_url = await generate_video(
-                    provider,
+                video_url = await provider_pool.run("video", lambda account: generate_video(
+                    account.provider,
                     video_prompt,
                     image_path,
                     sub_dir=project.id,
                     source_url=None,
-                    config=current_api_config,
-                    video_client=video_client,
-                    visual_service=visual_service,
+                    config=account.config,
+                    video_client=account.video_client,
+                    visual_service=account.visual_service,
                     save_video_bytes=_save_video_bytes,
                     save_base64_video=_save_base64_video,
                     progress_callback=handle_progress
-                )
-                video_url = _normalize_video_url(video_url, sub_dir=project.id)
-                target_shot.video_url = video_url
-                target_shot.video_progress = 100
-                if video_id and target_shot.video_items:
-                    item = next((v for v in target_shot.video_items if v.id == video_id), None)
-                    if item:
-                        item.url = video_url
-                        item.progress = 100
-                        item.status = "completed"
+                ))
+                with tracer.span("localize"):
+                    video_url = await short_executor.run(_normalize_video_url, video_url, sub_dir=project.id)
             elif provider == "rongyiyun":
-                video_prompt = f"{style_desc}, {prompt}, high quality, detailed"
-                if is_real:
-                     video_prompt += f". Exclude: {negative_prompt}"
+                video_prompt = prompts.video_prompt(provider)
                 source_url = target_shot.original_image_url if target_shot.original_image_url else target_shot.image_url
-                project_id = await generate_video(
-                    provider,
-                    video_prompt,
-                    image_path,
-                    sub_dir=project.id,
-                    source_url=source_url,
-                    config=current_api_config,
-                    video_client=video_client,
-                    visual_service=visual_service,
-                    save_video_bytes=_save_video_bytes,
-                    save_base64_video=_save_base64_video,
-                    progress_callback=None
-                )
-                target_shot.video_progress = 0
-                if video_id and target_shot.video_items:
-                    item = next((v for v in target_shot.video_items if v.id == video_id), None)
-                    if item:
-                        item.task_id = project_id
+                def handle_poll_update(progress, status):
+                    shot = _live_shot(project_id, shot_id)
+                    item = _video_item(shot, video_id) if shot else None
+                    if item and status == "running":
+                        item.status = "running"
                         item.progress = 0
-                        item.status = "queued"
-                poll_started = time.time()
-                poll_timeout = 20 * 60
-                poll_interval = 5
-                while time.time() - poll_started < poll_timeout:
-                    result = await asyncio.to_thread(rongyiyun_provider.get_task_result, project_id, current_api_config)
-                    status = result.get("status")
-                    media_url = result.get("mediaUrl")
-                    if video_id and target_shot.video_items:
-                        item = next((v for v in target_shot.video_items if v.id == video_id), None)
-                        if item:
-                            item.status = "running" if status == 0 else item.status
-                            item.progress = 0 if status == 0 else item.progress
-                    if status == 1 and media_url:
-                        video_url = _normalize_video_url(media_url, sub_dir=project.id)
-                        target_shot.video_url = video_url
-                        target_shot.video_progress = 100
-                        if video_id and target_shot.video_items:
-                            item = next((v for v in target_shot.video_items if v.id == video_id), None)
-                            if item:
-                                item.url = video_url
-                                item.progress = 100
-                                item.status = "completed"
-                        break
-                    if status == 2:
-                        if video_id and target_shot.video_items:
-                            item = next((v for v in target_shot.video_items if v.id == video_id), None)
-                            if item:
-                                item.status = "failed"
-                        break
                     save_db()
-                    await asyncio.sleep(poll_interval)
-                else:
-                    if video_id and target_shot.video_items:
-                        item = next((v for v in target_shot.video_items if v.id == video_id), None)
+
+                async def submit_and_wait(account):
+                    # The task belongs to the account that submitted it, so poll with its token
+                    task_id = await generate_video(
+                        account.provider,
+                        video_prompt,
+                        image_path,
+                        sub_dir=project.id,
+                        source_url=source_url,
+                        config=account.config,
+                        video_client=account.video_client,
+                        visual_service=account.visual_service,
+                        save_video_bytes=_save_video_bytes,
+                        save_base64_video=_save_base64_video,
+                        progress_callback=None
+                    )
+                    shot = _live_shot(project_id, shot_id)
+                    if shot:
+                        shot.video_progress = 0
+                        item = _video_item(shot, video_id)
                         if item:
-                            item.status = "timeout"
+                            item.task_id = task_id
+                            item.progress = 0
+                            item.status = "queued"
+                    return await task_poller.wait("rongyiyun", task_id, {"config": account.config}, interval=5.0, timeout=20 * 60, on_update=handle_poll_update)
+
+                try:
+                    result = await provider_pool.run("video", submit_and_wait)
+                    with tracer.span("localize"):
+                        video_url = await short_executor.run(_normalize_video_url, result["media_url"], sub_dir=project.id)
+                except (TaskFailed, TaskTimeout) as e:
+                    print(f"RongYiYun task ended without video: {e}")
+                    video_status = "timeout" if isinstance(e, TaskTimeout) else "failed"
             else:
                 raise Exception(f"Unsupported video provider: {provider}")
 
-        if type == "image":
-            target_shot.status = GenerationStatus.COMPLETED
-        save_db()
-        
+        # Results land in one locked step after every upstream call and download is done,
+        # on the project as it is now: it may have been reloaded or merged in the meantime
+        async with project_locks.hold(project_id):
+            shot = get_shot_or_404(get_project_or_404(project_id), shot_id)
+            if type == "image":
+                # Keep the original remote URL for video generation
+                if images and not shot.original_image_url:
+                    shot.original_image_url = images[0]
+                if shot.image_candidates is None:
+                    shot.image_candidates = []
+                shot.image_candidates.extend(local_urls)
+                shot.image_url = local_urls[0]
+                shot.status = GenerationStatus.COMPLETED
+            else:
+                item = _video_item(shot, video_id)
+                if video_url:
+                    shot.video_url = video_url
+                    shot.video_progress = 100
+                    if item:
+                        item.url = video_url
+                        item.progress = 100
+                        item.status = "completed"
+                elif item and video_status:
+                    item.status = video_status
+            bump_version(shot)
+            with tracer.span("persist"):
+                save_db()
+        job_registry.finish(job_id)
+
     except Exception as e:
         print(f"Generation Task Failed: {e}")
-        if type == "image":
-            target_shot.status = GenerationStatus.FAILED
-        target_shot.video_progress = None
-        if video_id and target_shot.video_items:
-            item = next((v for v in target_shot.video_items if v.id == video_id), None)
+        job_registry.finish(job_id, error=str(e))
+        async with project_locks.hold(project_id):
+            try:
+                shot = get_shot_or_404(get_project_or_404(project_id), shot_id)
+            except HTTPException:
+                # Deleted while generating: nothing left to mark as failed
+                return
+            if type == "image":
+                shot.status = GenerationStatus.FAILED
+            shot.video_progress = None
+            item = _video_item(shot, video_id)
             if item:
                 item.status = "failed"
-        save_db()
+            bump_version(shot)
+            save_db()
+
+def _generation_fingerprint(project: Project, shot: Shot, request: GenerateRequest) -> str:
+    prompts = prompt_builder.build_shot_prompts(project, shot, request.type)
+    if request.type == "video":
+        provider = current_api_config.video_provider or "openai"
+        prompt = prompts.video_prompt(provider)
+    else:
+        provider = current_api_config.image_provider or "openai"
+        prompt = prompts.image_prompt(provider)
+    return hash_bytes(json.dumps([provider, prompt, shot.custom_image_url, request.count, request.reuse_cached], ensure_ascii=False))
 
 @app.post("/generate")
-async def generate_asset(request: GenerateRequest, background_tasks: BackgroundTasks):
+async def generate_asset(request: GenerateRequest, background_tasks: BackgroundTasks, idempotency_key: str | None = Header(None, alias="Idempotency-Key"), expected: int | None = Depends(expected_version)):
     project_id = request.project_id or "default_project"
-    project = get_project_or_404(project_id)
-    
-    target_shot = next((s for s in project.shots if s.id == request.shot_id), None)
-    if not target_shot:
-        raise HTTPException(status_code=404, detail="Shot not found")
-        
-    if request.type == "image":
-        target_shot.status = GenerationStatus.GENERATING
-    video_id = None
-    if request.type == "video":
-        target_shot.video_progress = 0
-        video_id = str(uuid.uuid4())
-        if target_shot.video_items is None:
-            target_shot.video_items = []
-        target_shot.video_items.append(VideoItem(id=video_id, progress=0, status="generating"))
-    save_db()
+    async with project_locks.hold(project_id):
+        project = get_project_or_404(project_id)
+        target_shot = get_shot_or_404(project, request.shot_id)
 
-    background_tasks.add_task(ai_generation_task, project_id, request.shot_id, request.type, request.count, video_id)
-    
-    return {"status": "queued", "message": f"{request.type} generation started", "video_id": video_id}
+        fingerprint = (project_id, request.shot_id, request.type, request.count, request.reuse_cached)
+        if idempotency_key:
+            try:
+                previous = idempotency_store.get(idempotency_key, fingerprint)
+            except ValueError as e:
+                raise HTTPException(status_code=409, detail=str(e))
+            if previous:
+                return previous
+
+        # Attach duplicate submissions to the job that is already producing the same output
+        inflight_key = (project_id, request.shot_id, request.type, _generation_fingerprint(project, target_shot, request))
+        running = None if request.force else job_registry.find_inflight(inflight_key)
+        if running:
+            response = {"status": "in_progress", "message": f"{request.type} generation already running", "video_id": running.video_id, "job_id": running.id, "coalesced": True}
+            if idempotency_key:
+                idempotency_store.put(idempotency_key, fingerprint, response)
+            return response
+
+        # Only a new job changes the shot, so only it has to be based on the current version
+        check_version(target_shot, expected)
+        if request.type == "image":
+            target_shot.status = GenerationStatus.GENERATING
+        video_id = None
+        if request.type == "video":
+            target_shot.video_progress = 0
+            video_id = str(uuid.uuid4())
+            if target_shot.video_items is None:
+                target_shot.video_items = []
+            target_shot.video_items.append(VideoItem(id=video_id, progress=0, status="generating"))
+        bump_version(target_shot)
+        save_db()
+
+        job = job_registry.create(project_id, request.shot_id, request.type, video_id=video_id, inflight_key=inflight_key)
+    background_tasks.add_task(ai_generation_task, project_id, request.shot_id, request.type, request.count, video_id, job.id, request.reuse_cached)
+
+    response = {"status": "queued", "message": f"{request.type} generation started", "video_id": video_id, "job_id": job.id}
+    if idempotency_key:
+        idempotency_store.put(idempotency_key, fingerprint, response)
+    return response
+
+@app.get("/jobs/{job_id}", response_model=GenerationJob)
+async def get_job(job_id: str):
+    job = job_registry.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/trace")
+async def get_job_trace(job_id: str, format: str = "summary"):
+    """Stage spans of a generation job; ``format=otlp`` returns OTLP/JSON for a collector."""
+    if format not in ("summary", "otlp"):
+        raise HTTPException(status_code=400, detail="format must be 'summary' or 'otlp'")
+    trace = tracer.export_otlp(job_id) if format == "otlp" else tracer.summary(job_id)
+    if not trace:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+@app.post("/webhooks/{provider}/{job_id}")
+async def receive_provider_webhook(provider: str, job_id: str, request: Request, token: str | None = None):
+    if not webhooks.verify(current_api_config, provider, job_id, token):
+        raise HTTPException(status_code=403, detail="Invalid webhook token")
+    try:
+        payload = json.loads(await request.body() or b"{}")
+    except Exception:
+        raise HTTPException(status_code=400, detail="Webhook body must be JSON")
+    try:
+        result = parse_webhook(provider, payload)
+    except Exception as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    matched = task_poller.complete(provider, job_id, result)
+    if not matched and state_backend.shared and result.get("state") in (DONE, FAILED):
+        # The job may be waiting on another worker, whose state sync picks this up
+        await short_executor.run(state_backend.put_callback, provider, job_id, result)
+    return {"ok": True, "matched": matched}
 
 class ShotImageSelectRequest(BaseModel):
     image_url: str
@@ -2067,62 +2172,61 @@ class ShotVideoRemoveRequest(BaseModel):
     remove_all: bool = False
 
 @app.post("/shots/{project_id}/{shot_id}/select-image", response_model=Shot)
-async def select_shot_image(project_id: str, shot_id: str, data: ShotImageSelectRequest):
-    project = get_project_or_404(project_id)
-    target_shot = next((s for s in project.shots if s.id == shot_id), None)
-    if not target_shot:
-        raise HTTPException(status_code=404, detail="Shot not found")
-    target_shot.image_url = _sanitize_url(data.image_url)
-    save_db()
+async def select_shot_image(project_id: str, shot_id: str, data: ShotImageSelectRequest, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        target_shot = get_shot_or_404(get_project_or_404(project_id), shot_id)
+        check_version(target_shot, expected)
+        target_shot.image_url = _sanitize_url(data.image_url)
+        bump_version(target_shot)
+        save_db()
     return target_shot
 
 @app.post("/shots/{project_id}/{shot_id}/remove-image", response_model=Shot)
-async def remove_shot_image(project_id: str, shot_id: str, data: ShotImageRemoveRequest):
-    project = get_project_or_404(project_id)
-    target_shot = next((s for s in project.shots if s.id == shot_id), None)
-    if not target_shot:
-        raise HTTPException(status_code=404, detail="Shot not found")
-    if data.remove_all or not data.image_url:
-        target_shot.image_url = None
-        target_shot.image_candidates = []
-    else:
-        image_url = _sanitize_url(data.image_url)
-        if isinstance(target_shot.image_candidates, list):
-            target_shot.image_candidates = [u for u in target_shot.image_candidates if _sanitize_url(u) != image_url]
-        if _sanitize_url(target_shot.image_url) == image_url:
-            target_shot.image_url = target_shot.image_candidates[0] if target_shot.image_candidates else None
-    save_db()
+async def remove_shot_image(project_id: str, shot_id: str, data: ShotImageRemoveRequest, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        target_shot = get_shot_or_404(get_project_or_404(project_id), shot_id)
+        check_version(target_shot, expected)
+        if data.remove_all or not data.image_url:
+            target_shot.image_url = None
+            target_shot.image_candidates = []
+        else:
+            image_url = _sanitize_url(data.image_url)
+            if isinstance(target_shot.image_candidates, list):
+                target_shot.image_candidates = [u for u in target_shot.image_candidates if _sanitize_url(u) != image_url]
+            if _sanitize_url(target_shot.image_url) == image_url:
+                target_shot.image_url = target_shot.image_candidates[0] if target_shot.image_candidates else None
+        bump_version(target_shot)
+        save_db()
     return target_shot
 
 @app.post("/shots/{project_id}/{shot_id}/remove-video", response_model=Shot)
-async def remove_shot_video(project_id: str, shot_id: str, data: ShotVideoRemoveRequest):
-    project = get_project_or_404(project_id)
-    target_shot = next((s for s in project.shots if s.id == shot_id), None)
-    if not target_shot:
-        raise HTTPException(status_code=404, detail="Shot not found")
-    if data.remove_all or (not data.video_id and not data.url):
-        target_shot.video_url = None
-        target_shot.video_progress = None
-        target_shot.video_items = []
-        target_shot.status = GenerationStatus.IDLE
-        save_db()
-        return target_shot
-    if data.video_id and isinstance(target_shot.video_items, list):
-        target_shot.video_items = [v for v in target_shot.video_items if v.id != data.video_id]
-    if data.url:
-        target_url = _sanitize_url(data.url)
-        if isinstance(target_shot.video_items, list):
-            target_shot.video_items = [v for v in target_shot.video_items if _sanitize_url(v.url) != target_url]
-        if _sanitize_url(target_shot.video_url) == target_url:
+async def remove_shot_video(project_id: str, shot_id: str, data: ShotVideoRemoveRequest, expected: int | None = Depends(expected_version)):
+    async with project_locks.hold(project_id):
+        target_shot = get_shot_or_404(get_project_or_404(project_id), shot_id)
+        check_version(target_shot, expected)
+        if data.remove_all or (not data.video_id and not data.url):
             target_shot.video_url = None
-    if target_shot.video_items:
-        first_url = next((v.url for v in target_shot.video_items if v.url), None)
-        if first_url:
-            target_shot.video_url = first_url
-    else:
-        target_shot.video_url = None
-        target_shot.video_progress = None
-    save_db()
+            target_shot.video_progress = None
+            target_shot.video_items = []
+            target_shot.status = GenerationStatus.IDLE
+        else:
+            if data.video_id and isinstance(target_shot.video_items, list):
+                target_shot.video_items = [v for v in target_shot.video_items if v.id != data.video_id]
+            if data.url:
+                target_url = _sanitize_url(data.url)
+                if isinstance(target_shot.video_items, list):
+                    target_shot.video_items = [v for v in target_shot.video_items if _sanitize_url(v.url) != target_url]
+                if _sanitize_url(target_shot.video_url) == target_url:
+                    target_shot.video_url = None
+            if target_shot.video_items:
+                first_url = next((v.url for v in target_shot.video_items if v.url), None)
+                if first_url:
+                    target_shot.video_url = first_url
+            else:
+                target_shot.video_url = None
+                target_shot.video_progress = None
+        bump_version(target_shot)
+        save_db()
     return target_shot
 
 @app.post("/api/generate-asset")
@@ -2134,89 +2238,18 @@ async def generate_asset_raw(request: AssetGenerateRequest):
             if project:
                 project_style = project.style
 
-        prompt = request.prompt
-        
-        # Style logic
-        style_prompts = {
-            "real": "photorealistic, raw photo, real person, 8k uhd, dslr, soft lighting, film grain, hyperrealistic",
-            "anime": "anime style, japanese anime, vibrant colors, cel shading",
-            "manga": "manga style, black and white, line art, comic book",
-            "realistic": "realistic style, detailed texture, 3d render, unreal engine 5",
-            "chinese_anime": "chinese anime style, guofeng, donghua, ancient chinese aesthetics, elegant, vibrant, 2d"
-        }
-        style_desc = style_prompts.get(project_style, f"{project_style} style")
-        is_real = project_style == "real" or project_style == "realistic"
-
-        if request.type == "character":
-            prompt += f", character design, full body, white background, detailed, {style_desc}"
-        elif request.type == "scene":
-            prompt += f", scene background, scenery, detailed, {style_desc}"
-        else:
-            prompt += f", {style_desc}"
-
-        negative_prompt = ""
-        if is_real:
-            negative_prompt = "anime, cartoon, drawing, illustration, painting, sketch, 2d, flat, deformed, ugly"
-        else:
-            negative_prompt = "photorealistic, real photo, 3d, bad anatomy, bad hands, text, watermark"
-            
         provider = current_api_config.image_provider or "openai"
-        if provider == "openai":
-            if not image_client:
-                raise HTTPException(status_code=400, detail="OpenAI image provider not configured")
-            final_prompt = f"{prompt}. Exclude: {negative_prompt}"
-            image_url = await generate_image(
-                provider,
-                final_prompt,
-                sub_dir=request.project_id,
-                config=current_api_config,
-                image_client=image_client,
-                visual_service=visual_service,
-                negative_prompt=negative_prompt,
-                reference_images=None,
-                reference_image_url=None,
-                image_url_to_base64=_image_url_to_base64,
-                save_image_from_url=_save_image_from_url,
-                save_base64_image=_save_base64_image
-            )
-            return {"url": image_url}
-        elif provider == "vectorengine":
-            image_url = await generate_image(
-                provider,
-                prompt,
-                sub_dir=request.project_id,
-                config=current_api_config,
-                image_client=image_client,
-                visual_service=visual_service,
-                negative_prompt=negative_prompt,
-                reference_images=None,
-                reference_image_url=None,
-                image_url_to_base64=_image_url_to_base64,
-                save_image_from_url=_save_image_from_url,
-                save_base64_image=_save_base64_image
-            )
-            return {"url": image_url}
-        elif provider == "volcengine":
-            if not visual_service:
-                raise HTTPException(status_code=400, detail="Volcengine image provider not configured")
-            image_url = await generate_image(
-                provider,
-                prompt,
-                sub_dir=request.project_id,
-                config=current_api_config,
-                image_client=image_client,
-                visual_service=visual_service,
-                negative_prompt=negative_prompt,
-                reference_images=None,
-                reference_image_url=None,
-                image_url_to_base64=_image_url_to_base64,
-                save_image_from_url=_save_image_from_url,
-                save_base64_image=_save_base64_image
-            )
-            return {"url": image_url}
-        else:
+        prompt, negative_prompt = prompt_builder.build_asset_prompt(project_style, request.prompt, request.type, provider)
+        hedge_prompt = lambda hedge: prompt_builder.build_asset_prompt(project_style, request.prompt, request.type, hedge)[0]
+        if provider == "openai" and not image_client:
+            raise HTTPException(status_code=400, detail="OpenAI image provider not configured")
+        if provider == "volcengine" and not visual_service:
+            raise HTTPException(status_code=400, detail="Volcengine image provider not configured")
+        if provider not in ("openai", "vectorengine", "volcengine"):
             raise HTTPException(status_code=400, detail=f"Unsupported image provider: {provider}")
-            
+        image_url, _ = await _generate_image_hedged(provider, prompt, request.project_id, negative_prompt, None, None, hedge_prompt=hedge_prompt)
+        return {"url": image_url}
+
     except Exception as e:
         print(f"Asset Generation Failed: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -2235,6 +2268,7 @@ async def create_preset(preset: ApiPreset):
     else:
         presets.append(preset)
     save_presets(presets)
+    configure_provider_pool()
     return preset
 
 @app.delete("/api/presets/{name}")
@@ -2244,6 +2278,7 @@ async def delete_preset(name: str):
     if len(new_presets) == len(presets):
         raise HTTPException(status_code=404, detail="Preset not found")
     save_presets(new_presets)
+    configure_provider_pool()
     return {"status": "success"}
 
 if __name__ == "__main__":
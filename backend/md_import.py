@@ -0,0 +1,200 @@
+import codecs
+from typing import AsyncIterator, Callable, NamedTuple, TypeVar
+
+CHUNK_SIZE = 64 * 1024
+_SEPARATOR_CHARS = set("- :|")
+_NAME_SPLIT_TABLE = str.maketrans({sep: " " for sep in "、,，/|"})
+
+T = TypeVar("T")
+
+class ColumnRule(NamedTuple):
+    field: str
+    keywords: tuple[str, ...]
+    # Only assign this column if none of these fields has been assigned yet
+    unless: tuple[str, ...] = ()
+
+class TableSpec(NamedTuple):
+    """How to recognise one kind of markdown table.
+
+    Header cells are matched against ``columns`` in order; the first rule whose keyword
+    appears in a cell names that column. A row is accepted as the header once any of
+    ``header_fields`` has been located; rows before that are skipped.
+    """
+    columns: tuple[ColumnRule, ...]
+    header_fields: tuple[str, ...]
+
+class CharacterRow(NamedTuple):
+    name: str
+    description: str
+    prompt: str
+
+class SceneRow(NamedTuple):
+    name: str
+    description: str
+    prompt: str
+
+class ShotRow(NamedTuple):
+    number: int | None
+    char_names: list[str]
+    scene_name: str
+    prompt: str
+    video_prompt: str
+
+CHARACTER_TABLE = TableSpec(
+    columns=(
+        ColumnRule("name", ("角色名",)),
+        ColumnRule("description", ("描述",)),
+        ColumnRule("prompt", ("提示词",)),
+    ),
+    header_fields=("name",)
+)
+
+SCENE_TABLE = TableSpec(
+    columns=(
+        ColumnRule("name", ("场景名",)),
+        ColumnRule("description", ("描述",)),
+        ColumnRule("prompt", ("提示词",)),
+    ),
+    header_fields=("name",)
+)
+
+SHOT_TABLE = TableSpec(
+    columns=(
+        ColumnRule("number", ("编号", "序号")),
+        ColumnRule("char_names", ("出场人物", "角色")),
+        ColumnRule("scene_name", ("场景",)),
+        ColumnRule("video_prompt", ("视频提示词",)),
+        ColumnRule("prompt", ("分镜提示词",)),
+        # A bare "提示词" column is the shot prompt unless a specific one was already seen
+        ColumnRule("prompt", ("提示词",), unless=("prompt", "video_prompt")),
+    ),
+    header_fields=("char_names", "prompt", "video_prompt")
+)
+
+class _Decoder:
+    """Incremental UTF-8 decoder that falls back to GBK, like the original importers did."""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")()
+
+    def decode(self, data: bytes, final: bool = False) -> str:
+        try:
+            return self._decoder.decode(data, final)
+        except UnicodeDecodeError:
+            pending = self._decoder.getstate()[0]
+            self._decoder = codecs.getincrementaldecoder("gbk")(errors="ignore")
+            return self._decoder.decode(pending + data, final)
+
+async def read_lines(file, chunk_size: int = CHUNK_SIZE) -> AsyncIterator[list[str]]:
+    """Yield the lines of an upload one read chunk at a time, without buffering the whole file."""
+    decoder = _Decoder()
+    tail = ""
+    while True:
+        data = await file.read(chunk_size)
+        lines = (tail + decoder.decode(data or b"", final=not data)).split("\n")
+        tail = lines.pop()
+        if lines:
+            yield lines
+        if not data:
+            break
+    if tail:
+        yield [tail]
+
+def split_cells(line: str) -> list[str]:
+    parts = [p.strip() for p in line.split("|")]
+    # Drop the empty cells produced by the boundary pipes
+    if parts and parts[0] == "":
+        parts.pop(0)
+    if parts and parts[-1] == "":
+        parts.pop()
+    return parts
+
+class TableReader:
+    """Feeds lines through header detection and returns ``{field: cell}`` for data rows."""
+
+    def __init__(self, spec: TableSpec):
+        self.spec = spec
+        self.index: dict[str, int] | None = None
+        self._header: list[str] | None = None
+
+    def _match_header(self, cells: list[str]) -> dict[str, int] | None:
+        index: dict[str, int] = {}
+        for i, cell in enumerate(cells):
+            cell = cell.replace(" ", "").replace("\t", "")
+            for rule in self.spec.columns:
+                if any(k in cell for k in rule.keywords) and not any(f in index for f in rule.unless):
+                    index[rule.field] = i
+                    break
+        if any(f in index for f in self.spec.header_fields):
+            return index
+        return None
+
+    def feed(self, line: str) -> dict[str, str] | None:
+        line = line.strip()
+        if not line:
+            return None
+        cells = split_cells(line)
+        if not cells:
+            return None
+        if self.index is None:
+            self.index = self._match_header(cells)
+            self._header = cells
+            return None
+        # Separator rows and a repeated header (two tables pasted together) are not data
+        if cells == self._header or _SEPARATOR_CHARS.issuperset("".join(cells)):
+            return None
+        return {field: cells[i] if i < len(cells) else "" for field, i in self.index.items()}
+
+async def read_table(file, spec: TableSpec, make_row: Callable[[dict[str, str]], T | None]) -> list[T]:
+    """Parse an uploaded markdown table into typed rows while the upload is being read."""
+    reader = TableReader(spec)
+    rows = []
+    async for lines in read_lines(file):
+        for line in lines:
+            cells = reader.feed(line)
+            if cells is not None:
+                row = make_row(cells)
+                if row is not None:
+                    rows.append(row)
+    return rows
+
+def character_row(cells: dict[str, str]) -> CharacterRow | None:
+    name = cells.get("name", "")
+    if not name:
+        return None
+    return CharacterRow(name=name, description=cells.get("description", ""), prompt=cells.get("prompt", ""))
+
+def scene_row(cells: dict[str, str]) -> SceneRow | None:
+    name = cells.get("name", "")
+    if not name:
+        return None
+    return SceneRow(name=name, description=cells.get("description", ""), prompt=cells.get("prompt", ""))
+
+def shot_row(cells: dict[str, str]) -> ShotRow | None:
+    try:
+        number = int(cells.get("number", ""))
+    except ValueError:
+        number = None
+    char_names = cells.get("char_names", "").translate(_NAME_SPLIT_TABLE).split()
+    row = ShotRow(
+        number=number,
+        char_names=char_names,
+        scene_name=cells.get("scene_name", ""),
+        prompt=cells.get("prompt", ""),
+        video_prompt=cells.get("video_prompt", "")
+    )
+    if row.char_names or row.scene_name or row.prompt or row.video_prompt:
+        return row
+    return None
+
+async def read_characters(file) -> list[CharacterRow]:
+    return await read_table(file, CHARACTER_TABLE, character_row)
+
+async def read_scenes(file) -> list[SceneRow]:
+    return await read_table(file, SCENE_TABLE, scene_row)
+
+async def read_shots(file) -> list[ShotRow]:
+    """Shot rows sorted by their number column; unnumbered rows keep file order at the end."""
+    rows = await read_table(file, SHOT_TABLE, shot_row)
+    rows.sort(key=lambda r: r.number if r.number is not None else 1_000_000)
+    return rows
@@ -0,0 +1,174 @@
+import hashlib
+import os
+import re
+import stat
+import uuid
+
+import anyio
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+UPLOAD_ROOT = os.path.join("static", "uploads")
+CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+THUMB_WIDTHS = (256, 512)
+THUMB_DIR = ".thumbs"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Every file the app writes is named after a uuid4 or a content hash and never rewritten
+_IMMUTABLE_NAME_RE = re.compile(r"^(?:[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}|[0-9a-f]{32,64})", re.IGNORECASE)
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+def sniff_type(head: bytes) -> tuple[str, str] | None:
+    """``(content_type, extension)`` from a file's first bytes, or None if not a supported media type."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png", ".png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg", ".jpg"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif", ".gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp", ".webp"
+    if head.startswith(b"BM"):
+        return "image/bmp", ".bmp"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"qt  ",):
+            return "video/quicktime", ".mov"
+        if brand in (b"avif", b"avis"):
+            return "image/avif", ".avif"
+        if brand in (b"heic", b"heix", b"mif1", b"msf1"):
+            return "image/heic", ".heic"
+        return "video/mp4", ".mp4"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "video/webm", ".webm"
+    return None
+
+def upload_dir(sub_dir: str | None) -> tuple[str, str]:
+    """Filesystem directory and URL prefix for uploads, optionally inside a project folder."""
+    if sub_dir:
+        if sub_dir in (".", "..") or "/" in sub_dir or "\\" in sub_dir:
+            raise UploadRejected(400, "Invalid project_id")
+        return os.path.join(UPLOAD_ROOT, sub_dir), f"/static/uploads/{sub_dir}"
+    return UPLOAD_ROOT, "/static/uploads"
+
+def store_stream(src, head: bytes, ext: str, sub_dir: str | None = None, max_bytes: int = MAX_UPLOAD_BYTES) -> dict:
+    """Copy an upload to a content-addressed file, hashing while writing. Blocking; run off-loop.
+
+    ``head`` holds bytes already read from ``src`` for type sniffing. The file is named
+    after its SHA-256, so uploading the same bytes again reuses the existing file.
+    """
+    dir_path, url_prefix = upload_dir(sub_dir)
+    os.makedirs(dir_path, exist_ok=True)
+    temp_path = os.path.join(dir_path, f".upload-{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as out:
+            chunk = head
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(413, f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+                digest.update(chunk)
+                out.write(chunk)
+                chunk = src.read(CHUNK_SIZE)
+        sha256 = digest.hexdigest()
+        filename = f"{sha256[:32]}{ext}"
+        file_path = os.path.join(dir_path, filename)
+        deduplicated = os.path.exists(file_path)
+        if deduplicated:
+            os.remove(temp_path)
+        else:
+            os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return {
+        "path": file_path,
+        "url": f"{url_prefix}/{filename}",
+        "sha256": sha256,
+        "size": size,
+        "deduplicated": deduplicated
+    }
+
+def thumbnail_path(file_path: str, width: int) -> str:
+    dir_path, filename = os.path.split(file_path)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(dir_path, THUMB_DIR, f"{stem}_w{width}.jpg")
+
+def make_thumbnails(file_path: str, widths: tuple[int, ...] = THUMB_WIDTHS) -> list[str]:
+    """Write downscaled JPEG previews next to an image; skipped silently for non-images."""
+    try:
+        from PIL import Image
+    except Exception:
+        return []
+    created = []
+    try:
+        with Image.open(file_path) as img:
+            img = img.convert("RGB")
+            for width in widths:
+                target = thumbnail_path(file_path, width)
+                if os.path.exists(target):
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                thumb = img.copy()
+                thumb.thumbnail((width, width * 4))
+                temp_path = f"{target}.tmp"
+                thumb.save(temp_path, format="JPEG", quality=85)
+                os.replace(temp_path, target)
+                created.append(target)
+    except Exception as e:
+        print(f"Failed to create thumbnail for {file_path}: {e}")
+    return created
+
+def is_immutable_name(filename: str) -> bool:
+    return bool(_IMMUTABLE_NAME_RE.match(filename))
+
+class MediaFiles(StaticFiles):
+    """StaticFiles for generated and uploaded media.
+
+    uuid / content-hash named files are served with a year-long immutable Cache-Control
+    and an ETag derived from the name, so browsers stop revalidating them; anything else
+    must revalidate. Byte ranges (video scrubbing) come from Starlette's FileResponse.
+    ``?thumb=<width>`` serves the matching precomputed thumbnail of an image, creating it
+    on first request, for widths in THUMB_WIDTHS.
+    """
+
+    async def get_response(self, path: str, scope) -> Response:
+        width = QueryParams(scope.get("query_string", b"")).get("thumb")
+        if width and width.isdigit() and int(width) in THUMB_WIDTHS and scope["method"] in ("GET", "HEAD"):
+            thumb = await self._thumbnail(path, int(width))
+            if thumb:
+                return self.file_response(thumb, os.stat(thumb), scope)
+        return await super().get_response(path, scope)
+
+    async def _thumbnail(self, path: str, width: int) -> str | None:
+        try:
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path)
+        except (OSError, ValueError):
+            return None
+        if not stat_result or not stat.S_ISREG(stat_result.st_mode):
+            return None
+        target = thumbnail_path(full_path, width)
+        if not os.path.exists(target):
+            await anyio.to_thread.run_sync(make_thumbnails, full_path, (width,))
+        return target if os.path.exists(target) else None
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        filename = os.path.basename(full_path)
+        if is_immutable_name(filename):
+            response.headers["cache-control"] = IMMUTABLE_CACHE_CONTROL
+            response.headers["etag"] = f'"{os.path.splitext(filename)[0]}"'
+        else:
+            response.headers["cache-control"] = "no-cache"
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
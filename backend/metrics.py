@@ -0,0 +1,284 @@
+import asyncio
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable
+
+# Seconds; spans a fast local write up to a multi-minute video job
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+SIZE_BUCKETS = (1024, 16 * 1024, 128 * 1024, 512 * 1024, 1024 ** 2, 4 * 1024 ** 2, 16 * 1024 ** 2, 64 * 1024 ** 2, 256 * 1024 ** 2)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LOOP_LAG_INTERVAL_S = 0.5
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(n, "") for n in self.labels)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in items]
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def total(self, **labels) -> float:
+        series = self._series.get(self._key(labels))
+        return series[1] if series else 0.0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            items = sorted((k, ([*v[0]], v[1], v[2])) for k, v in self._series.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip((*self.buckets, math.inf), counts):
+                cumulative += n
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+class Gauge(_Metric):
+    """A value that is set directly, or read from its owning component through ``collect``
+    when /metrics is scraped. Counters kept elsewhere (cache hits) are exposed the same way
+    with ``metric_type="counter"``.
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = (), collect: Callable[[], Iterable[tuple[dict, float]]] | None = None, metric_type: str = "gauge"):
+        super().__init__(name, help, labels)
+        self.collect = collect
+        self.type = metric_type
+        self._values: dict[tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> list[str]:
+        if self.collect:
+            try:
+                samples = [(self._key(labels), value) for labels, value in self.collect()]
+            except Exception as e:
+                print(f"Failed to collect metric {self.name}: {e}")
+                samples = []
+        else:
+            with self._lock:
+                samples = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labels, k)} {_format_value(v)}" for k, v in samples]
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labels: tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, labels: tuple[str, ...] = (), collect=None, metric_type: str = "gauge") -> Gauge:
+        return self.register(Gauge(name, help, labels, collect, metric_type))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.counter("mochiani_http_requests_total", "HTTP requests by route, method and status code.", ("route", "method", "status"))
+http_request_seconds = REGISTRY.histogram("mochiani_http_request_duration_seconds", "HTTP request latency by route and method.", ("route", "method"))
+provider_requests = REGISTRY.counter("mochiani_provider_requests_total", "Upstream image, video and LLM calls by provider and outcome.", ("provider", "kind", "outcome"))
+provider_request_seconds = REGISTRY.histogram("mochiani_provider_request_duration_seconds", "Upstream call latency, including polling until the result is ready.", ("provider", "kind", "outcome"))
+job_wait_seconds = REGISTRY.histogram("mochiani_generation_job_wait_seconds", "Time a generation job spent queued before it started.", ("type",))
+job_duration_seconds = REGISTRY.histogram("mochiani_generation_job_duration_seconds", "Generation job run time from start to finish.", ("type", "status"))
+save_seconds = REGISTRY.histogram("mochiani_persistence_save_duration_seconds", "Time spent writing the project database.", ("store",))
+save_bytes = REGISTRY.histogram("mochiani_persistence_save_bytes", "Size of each project database write.", ("store",), buckets=SIZE_BUCKETS)
+download_seconds = REGISTRY.histogram("mochiani_download_duration_seconds", "Remote media download time by kind and outcome.", ("kind", "outcome"))
+download_bytes = REGISTRY.histogram("mochiani_download_bytes", "Remote media download size by kind.", ("kind",), buckets=SIZE_BUCKETS)
+loop_lag_seconds = REGISTRY.histogram("mochiani_event_loop_lag_seconds", "How late the event loop woke a periodic timer; high values mean blocking work on the loop.", buckets=LAG_BUCKETS)
+
+@contextmanager
+def provider_call(provider: str, kind: str):
+    """Count and time one upstream call; an exception marks it as an error."""
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        yield
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        provider_requests.inc(provider=provider, kind=kind, outcome=outcome)
+        provider_request_seconds.observe(elapsed, provider=provider, kind=kind, outcome=outcome)
+
+@contextmanager
+def download(kind: str):
+    """Time a download; call the yielded function with the byte count once the body is read."""
+    start = time.perf_counter()
+    size = []
+    outcome = "ok"
+    try:
+        yield size.append
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        if outcome == "ok" and not size:
+            outcome = "skipped"
+        download_seconds.observe(time.perf_counter() - start, kind=kind, outcome=outcome)
+        if size:
+            download_bytes.observe(size[0], kind=kind)
+
+def observe_job(type: str, created_at: float | None, started_at: float | None, finished_at: float | None, status: str):
+    if created_at and started_at:
+        job_wait_seconds.observe(max(0.0, started_at - created_at), type=type)
+    if started_at and finished_at:
+        job_duration_seconds.observe(max(0.0, finished_at - started_at), type=type, status=status)
+
+class LoopLagMonitor:
+    """Sleeps on the event loop in a fixed interval and records how late each wakeup is."""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL_S):
+        self.interval = interval
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self._task: asyncio.Task | None = None
+
+    def ensure_started(self):
+        if self._task and not self._task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._task = loop.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            self.last_lag = max(0.0, time.perf_counter() - expected)
+            self.max_lag = max(self.max_lag, self.last_lag)
+            loop_lag_seconds.observe(self.last_lag)
+
+loop_monitor = LoopLagMonitor()
+REGISTRY.gauge("mochiani_event_loop_lag_last_seconds", "Lag of the most recent event-loop timer wakeup.", collect=lambda: [({}, loop_monitor.last_lag)])
+
+class MetricsMiddleware:
+    """ASGI middleware recording request counts and latency per route template.
+
+    Labelled with the matched route's path (``/shots/{project_id}/{shot_id}``), never the
+    raw URL, so series stay bounded. Also starts the loop lag monitor on first request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        loop_monitor.ensure_started()
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            http_requests.inc(route=path, method=method, status=str(status[0]))
+            http_request_seconds.observe(time.perf_counter() - start, route=path, method=method)
+
+def render() -> str:
+    return REGISTRY.render()
@@ -75,6 +75,8 @@ class Shot(ShotBase):
     video_progress: Optional[int] = None
     video_items: List[VideoItem] = []
     status: GenerationStatus = GenerationStatus.IDLE
+    # Bumped on every change to this shot; send it back as If-Match
+    version: int = 0
 
 class Project(BaseModel):
     id: str
@@ -88,6 +90,8 @@ class Project(BaseModel):
     default_scene_id: Optional[str] = None
     default_panel_layout: str = "1-panel"
     default_image_count: int = 1
+    # Bumped on changes to the project itself: settings, shot list and order, characters, scenes
+    version: int = 0
 
 # API Request/Response Models
 class GenerateRequest(BaseModel):
@@ -95,6 +99,21 @@ class GenerateRequest(BaseModel):
     shot_id: str
     type: str = "image" # image or video
     count: Optional[int] = None
+    reuse_cached: bool = False # reuse stored outputs of an identical earlier generation
+    force: bool = False # start a new job even if an identical one is still running
+
+class GenerationJob(BaseModel):
+    id: str
+    project_id: str
+    shot_id: str
+    type: str
+    video_id: Optional[str] = None
+    status: str = "queued" # queued, running, completed, failed
+    error: Optional[str] = None
+    cached: bool = False
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
 
 class AssetGenerateRequest(BaseModel):
     project_id: Optional[str] = None
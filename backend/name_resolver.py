@@ -0,0 +1,77 @@
+from typing import Iterable
+
+_PUNCTUATION_TABLE = str.maketrans({c: None for c in " \t，,。.：:“”'\"（）()-_"})
+
+def normalize_name(name: str | None) -> str:
+    """Lower-case and drop whitespace and common punctuation, so "陈远 (少年)" ~ "陈远(少年)"."""
+    if not name:
+        return ""
+    return name.strip().lower().translate(_PUNCTUATION_TABLE)
+
+class NameResolver:
+    """Resolve free-form names from imported tables to asset ids.
+
+    Built once per import from ``(name, id)`` pairs. A name resolves by, in order:
+    exact name, normalized name, then containment either way ("陈远（少年）" matches
+    the asset "陈远", "远" matches "陈远"). Containment is answered from a substring
+    index of the asset names instead of scanning every asset, so a lookup costs
+    O(len(name) * longest asset name) dictionary probes. Among containment matches the
+    closest length wins, ties go to the asset listed first; results are memoized.
+    """
+
+    def __init__(self, items: Iterable[tuple[str, str]]):
+        self._exact: dict[str, str] = {}
+        self._normalized: dict[str, str] = {}
+        # normalized substring -> positions of assets whose normalized name contains it
+        self._substrings: dict[str, list[int]] = {}
+        self._names: list[tuple[str, str]] = []
+        self._positions: dict[str, list[int]] = {}
+        self._max_len = 0
+        self._memo: dict[str, str | None] = {}
+        for name, asset_id in items:
+            norm = normalize_name(name)
+            self._exact.setdefault((name or "").strip(), asset_id)
+            if not norm:
+                continue
+            self._normalized.setdefault(norm, asset_id)
+            position = len(self._names)
+            self._names.append((norm, asset_id))
+            self._positions.setdefault(norm, []).append(position)
+            self._max_len = max(self._max_len, len(norm))
+            seen = set()
+            for i in range(len(norm)):
+                for j in range(i + 1, len(norm) + 1):
+                    sub = norm[i:j]
+                    if sub not in seen:
+                        seen.add(sub)
+                        self._substrings.setdefault(sub, []).append(position)
+
+    def resolve(self, name: str | None) -> str | None:
+        name = (name or "").strip()
+        if not name:
+            return None
+        if name in self._memo:
+            return self._memo[name]
+        asset_id = self._exact.get(name)
+        if asset_id is None:
+            norm = normalize_name(name)
+            asset_id = self._normalized.get(norm) or self._contains(norm)
+        self._memo[name] = asset_id
+        return asset_id
+
+    def _contains(self, norm: str) -> str | None:
+        if not norm:
+            return None
+        candidates = set(self._substrings.get(norm, ()))
+        # Asset names that occur inside the query: probe every substring up to the longest name
+        for i in range(len(norm)):
+            for j in range(i + 1, min(len(norm), i + self._max_len) + 1):
+                candidates.update(self._positions.get(norm[i:j], ()))
+        if not candidates:
+            return None
+
+        def rank(position: int):
+            asset_len = len(self._names[position][0])
+            return (-min(asset_len, len(norm)) / max(asset_len, len(norm)), position)
+
+        return self._names[min(candidates, key=rank)][1]
@@ -0,0 +1,137 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import threading
+import time
+
+import anyio
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+# When set, the trigger header must carry this value instead of just "1"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILE_HEADER = "x-profile"
+PROFILE_DIR = os.path.join("data", "profiles")
+MAX_PROFILES = int(os.getenv("PROFILING_MAX_PROFILES", "50"))
+TEXT_TOP = 60
+
+_ID_RE = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{6}-[A-Z]+-[\w.-]*$", re.ASCII)
+_SLUG_RE = re.compile(r"[^\w.-]+", re.ASCII)
+# First line of the text summary: "<METHOD> <path?query> duration_ms=<float>"
+_HEADER_RE = re.compile(r"^[A-Z]+ (\S+) duration_ms=([0-9.]+)")
+
+def _slug(path: str) -> str:
+    return _SLUG_RE.sub("_", path.strip("/"))[:80] or "root"
+
+def profile_paths(profile_id: str) -> tuple[str, str] | None:
+    """``(.prof, .txt)`` paths of a stored profile, or None for an id that is not one of ours."""
+    if not _ID_RE.match(profile_id):
+        return None
+    base = os.path.join(PROFILE_DIR, profile_id)
+    return f"{base}.prof", f"{base}.txt"
+
+def write_profile(profile: cProfile.Profile, profile_id: str, header: str) -> str:
+    """Dump raw stats (for snakeviz / pstats) and a text summary sorted by cumulative time."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    prof_path, text_path = profile_paths(profile_id)
+    profile.dump_stats(prof_path)
+    out = io.StringIO()
+    out.write(header + "\n\n")
+    stats = pstats.Stats(profile, stream=out)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TEXT_TOP)
+    with open(text_path, "w", encoding="utf-8") as f:
+        f.write(out.getvalue())
+    _prune()
+    return prof_path
+
+def _prune():
+    entries = sorted(list_profiles(), key=lambda p: p["id"])
+    for entry in entries[:max(0, len(entries) - MAX_PROFILES)]:
+        for path in profile_paths(entry["id"]):
+            if os.path.exists(path):
+                os.remove(path)
+
+def list_profiles() -> list[dict]:
+    """Stored profiles, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        profile_id, ext = os.path.splitext(name)
+        if ext != ".prof" or not _ID_RE.match(profile_id):
+            continue
+        stamp, _, method, _ = profile_id.split("-", 3)
+        target, duration_ms = None, None
+        text_path = profile_paths(profile_id)[1]
+        if os.path.exists(text_path):
+            with open(text_path, encoding="utf-8") as f:
+                match = _HEADER_RE.match(f.readline())
+            if match:
+                target, duration_ms = match.group(1), float(match.group(2))
+        profiles.append({
+            "id": profile_id,
+            "created": time.mktime(time.strptime(stamp, "%Y%m%dT%H%M%S")),
+            "method": method,
+            "path": target,
+            "duration_ms": duration_ms,
+            "size": os.path.getsize(os.path.join(PROFILE_DIR, name))
+        })
+    profiles.sort(key=lambda p: p["id"], reverse=True)
+    return profiles
+
+class ProfilingMiddleware:
+    """Profile a single request with cProfile when it carries the ``X-Profile`` header.
+
+    Off unless PROFILING_ENABLED is set, so production pays nothing until someone opts in.
+    cProfile is a deterministic profiler on the event-loop thread: other requests served
+    while the profiled one is awaiting show up in the same profile, and only one request
+    is profiled at a time (a second one is served normally with ``X-Profile: busy``).
+    The response carries ``X-Profile-Id``; results are listed under /admin/profiles.
+    """
+
+    def __init__(self, app, enabled: bool = PROFILING_ENABLED, token: str = PROFILING_TOKEN):
+        self.app = app
+        self.enabled = enabled
+        self.token = token
+        self._busy = threading.Lock()
+
+    def _triggered(self, scope) -> bool:
+        for key, value in scope.get("headers", ()):
+            if key == PROFILE_HEADER.encode():
+                value = value.decode("latin-1")
+                return value == self.token if self.token else value.lower() in ("1", "true", "yes")
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if not self.enabled or scope["type"] != "http" or not self._triggered(scope):
+            return await self.app(scope, receive, send)
+        if not self._busy.acquire(blocking=False):
+            async def send_busy(message):
+                if message["type"] == "http.response.start":
+                    message.setdefault("headers", []).append((b"x-profile", b"busy"))
+                await send(message)
+            return await self.app(scope, receive, send_busy)
+
+        method = scope.get("method", "GET")
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.urandom(3).hex()}-{method}-{_slug(scope.get('path', '/'))}"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((b"x-profile-id", profile_id.encode()))
+            await send(message)
+
+        profile = cProfile.Profile()
+        start = time.perf_counter()
+        try:
+            profile.enable()
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                profile.disable()
+            duration_ms = (time.perf_counter() - start) * 1000
+            query = scope.get("query_string", b"").decode("latin-1")
+            header = f"{method} {scope.get('path', '/')}{'?' + query if query else ''} duration_ms={duration_ms:.1f}"
+            await anyio.to_thread.run_sync(write_profile, profile, profile_id, header)
+        finally:
+            self._busy.release()
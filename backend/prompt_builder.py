@@ -0,0 +1,178 @@
+import re
+from functools import lru_cache
+from typing import NamedTuple
+
+# Layout keywords users paste into shot prompts; they conflict with the selected panel_layout.
+# Longest first so that e.g. "3-panel storyboard" wins over "3-panel" inside the alternation.
+LAYOUT_KEYWORDS = [
+    "3-panel storyboard", "3-panel", "3 panel", "triptych", "three frames", "three panel",
+    "comic panel layout", "clean gutters", "no text", "no watermark",
+    "1-panel", "single panel", "1 panel", "full shot", "one frame",
+    "2-panel", "diptych", "2 panel", "two frames", "two panel",
+    "4-panel", "2x2 grid", "4 panel", "four frames", "four panel", "yonkoma style",
+    "vertical split", "horizontal split"
+]
+# The leading lookahead lets the engine skip positions that cannot start any keyword.
+_LAYOUT_KEYWORDS_RE = re.compile(
+    "(?=[%s])(?:%s)" % (
+        re.escape("".join(sorted({k[0].lower() for k in LAYOUT_KEYWORDS}))),
+        "|".join(re.escape(k) for k in sorted(LAYOUT_KEYWORDS, key=len, reverse=True))
+    ),
+    re.IGNORECASE
+)
+_DOUBLE_COMMA_RE = re.compile(r",\s*,")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+STYLE_PROMPTS = {
+    "real": "photorealistic, raw photo, real person, 8k uhd, dslr, soft lighting, film grain, hyperrealistic",
+    "anime": "anime style, japanese anime, vibrant colors, cel shading, high quality, highly detailed, masterpiece, 2d, beautiful composition",
+    "manga": "manga style, japanese comic, black and white, line art, screentones, ink drawing, high contrast, monochrome, detailed lines, high quality",
+    "realistic": "3d animation style, cgi, unreal engine 5, octane render, detailed texture, volumetric lighting, 8k, pixar style, disney style, 3d render",
+    "chinese_anime": "chinese anime style, guofeng, donghua, ancient chinese aesthetics, elegant, vibrant, 2d"
+}
+
+# Character / scene sheets use shorter style hints than storyboard shots
+ASSET_STYLE_PROMPTS = {
+    "real": "photorealistic, raw photo, real person, 8k uhd, dslr, soft lighting, film grain, hyperrealistic",
+    "anime": "anime style, japanese anime, vibrant colors, cel shading",
+    "manga": "manga style, black and white, line art, comic book",
+    "realistic": "realistic style, detailed texture, 3d render, unreal engine 5",
+    "chinese_anime": "chinese anime style, guofeng, donghua, ancient chinese aesthetics, elegant, vibrant, 2d"
+}
+
+LAYOUT_PROMPTS = {
+    "1-panel": "single panel, full shot, one frame, cinematic composition, detailed background, no split screen",
+    "2-panel": "2-panel storyboard, diptych, two frames, comic panel layout, vertical split or horizontal split, clean gutters",
+    "3-panel": "3-panel storyboard, triptych, three frames, comic panel layout, clean gutters",
+    "4-panel": "4-panel storyboard, 2x2 grid, four frames, comic panel layout, yonkoma style, clean gutters"
+}
+
+REAL_LAYOUT_PROMPTS = {
+    "1-panel": "single panel, full shot, one frame, cinematic composition",
+    "2-panel": "split screen, side by side, diptych",
+    "3-panel": "collage of 3 images, triptych",
+    "4-panel": "2x2 grid, collage of 4 images"
+}
+
+NEGATIVE_PROMPTS = {
+    "real": "anime, cartoon, drawing, illustration, painting, sketch, 2d, flat, deformed, ugly, 3d render, cgi",
+    "realistic": "2d, flat, sketch, drawing, painting, anime, manga, japanese anime, photograph, real photo, live action"
+}
+DEFAULT_NEGATIVE_PROMPT = "photorealistic, real photo, 3d, bad anatomy, bad hands, text, watermark"
+ASSET_REAL_NEGATIVE_PROMPT = "anime, cartoon, drawing, illustration, painting, sketch, 2d, flat, deformed, ugly"
+
+class StyleFragments(NamedTuple):
+    style_desc: str
+    is_real: bool
+    layouts: dict
+    negative_prompt: str
+
+class ShotPrompts(NamedTuple):
+    style_desc: str
+    prompt: str
+    base_prompt: str
+    negative_prompt: str
+    is_real: bool
+
+    def image_prompt(self, provider: str) -> str:
+        # OpenAI doesn't support negative_prompt natively, so it is appended to the prompt
+        if provider == "openai":
+            return f"{self.base_prompt}. Exclude: {self.negative_prompt}"
+        return self.base_prompt
+
+    def video_prompt(self, provider: str) -> str:
+        # Layout prompts are skipped for video, they confuse the video models
+        video_prompt = f"{self.style_desc}, {self.prompt}, high quality, detailed"
+        if self.is_real:
+            if provider == "volcengine":
+                video_prompt += f" --no {self.negative_prompt}"
+            else:
+                video_prompt += f". Exclude: {self.negative_prompt}"
+        return video_prompt
+
+_style_cache: dict[str, tuple[str, StyleFragments]] = {}
+_asset_cache: dict[str, tuple[dict, dict, dict, dict]] = {}
+
+@lru_cache(maxsize=4096)
+def clean_prompt(prompt: str) -> str:
+    prompt = _LAYOUT_KEYWORDS_RE.sub("", prompt)
+    prompt = _DOUBLE_COMMA_RE.sub(",", prompt)
+    return _WHITESPACE_RE.sub(" ", prompt).strip().strip(",")
+
+def style_fragments(project) -> StyleFragments:
+    cached = _style_cache.get(project.id)
+    if cached and cached[0] == project.style:
+        return cached[1]
+    is_real = project.style == "real" or project.style == "realistic"
+    fragments = StyleFragments(
+        style_desc=STYLE_PROMPTS.get(project.style, f"{project.style} style"),
+        is_real=is_real,
+        layouts=REAL_LAYOUT_PROMPTS if is_real else LAYOUT_PROMPTS,
+        negative_prompt=NEGATIVE_PROMPTS.get(project.style, DEFAULT_NEGATIVE_PROMPT)
+    )
+    _style_cache[project.id] = (project.style, fragments)
+    return fragments
+
+def asset_index(project) -> tuple[dict, dict]:
+    """Return ``(characters_by_id, scenes_by_id)`` for a project, built once per edit."""
+    return _asset_entry(project)[:2]
+
+def _asset_entry(project) -> tuple[dict, dict, dict, dict]:
+    entry = _asset_cache.get(project.id)
+    if entry is None:
+        chars = {c.id: c for c in (project.characters or []) if getattr(c, "id", None)}
+        scenes = {s.id: s for s in (project.scenes or []) if getattr(s, "id", None)}
+        char_fragments = {cid: f"Character {c.name}: {c.prompt}" for cid, c in chars.items() if c.prompt}
+        scene_fragments = {sid: f"Scene location: {s.prompt}" for sid, s in scenes.items() if s.prompt}
+        entry = (chars, scenes, char_fragments, scene_fragments)
+        _asset_cache[project.id] = entry
+    return entry
+
+def invalidate_assets(project_id: str):
+    _asset_cache.pop(project_id, None)
+
+def invalidate_project(project_id: str):
+    _style_cache.pop(project_id, None)
+    _asset_cache.pop(project_id, None)
+
+def clear():
+    _style_cache.clear()
+    _asset_cache.clear()
+
+def build_shot_prompts(project, shot, type: str = "image") -> ShotPrompts:
+    raw = (shot.audio_prompt or shot.prompt or "") if type == "video" else (shot.prompt or "")
+    prompt = clean_prompt(raw)
+    fragments = style_fragments(project)
+    _, _, char_fragments, scene_fragments = _asset_entry(project)
+
+    # Style FIRST, then user prompt, then injected scene / character context, then layout
+    parts = [fragments.style_desc, prompt]
+    if shot.scene_id and shot.scene_id in scene_fragments:
+        parts.append(scene_fragments[shot.scene_id])
+    for char_id in shot.characters or []:
+        if char_id in char_fragments:
+            parts.append(char_fragments[char_id])
+    parts.append(fragments.layouts.get(shot.panel_layout) or fragments.layouts["3-panel"])
+    parts.append("high quality, detailed")
+
+    return ShotPrompts(
+        style_desc=fragments.style_desc,
+        prompt=prompt,
+        base_prompt=", ".join(parts),
+        negative_prompt=fragments.negative_prompt,
+        is_real=fragments.is_real
+    )
+
+def build_asset_prompt(style: str, prompt: str, asset_type: str, provider: str) -> tuple[str, str]:
+    """Return ``(provider_prompt, negative_prompt)`` for a character or scene sheet."""
+    style_desc = ASSET_STYLE_PROMPTS.get(style, f"{style} style")
+    if asset_type == "character":
+        prompt = f"{prompt}, character design, full body, white background, detailed, {style_desc}"
+    elif asset_type == "scene":
+        prompt = f"{prompt}, scene background, scenery, detailed, {style_desc}"
+    else:
+        prompt = f"{prompt}, {style_desc}"
+    negative_prompt = ASSET_REAL_NEGATIVE_PROMPT if style in ("real", "realistic") else DEFAULT_NEGATIVE_PROMPT
+    if provider == "openai":
+        prompt = f"{prompt}. Exclude: {negative_prompt}"
+    return prompt, negative_prompt
@@ -1,10 +1,24 @@
-import asyncio
 from . import openai_provider
 from . import volcengine_provider
 from . import vectorengine_provider
 from . import rongyiyun_provider
+from .poller import task_poller, TaskFailed, TaskTimeout, DONE, FAILED
+from .executors import long_poll_executor, short_executor, poll_executor, executor_stats
+from .circuit import breakers, circuit_for, CircuitOpen
+import metrics
+from tracing import tracer
+
+task_poller.set_runner(poll_executor.run)
+
+task_poller.register("openai", openai_provider.poll_tasks, circuit=lambda params: circuit_for("openai", "video", url=params.get("poll_url")))
+task_poller.register("volcengine", volcengine_provider.poll_tasks, circuit=lambda params: circuit_for("volcengine", "video"))
+task_poller.register("rongyiyun", rongyiyun_provider.poll_tasks, circuit=lambda params: circuit_for("rongyiyun", "video", params.get("config")))
 
 async def generate_image(provider: str, prompt: str, sub_dir: str | None, config, image_client, visual_service, negative_prompt: str = "", reference_images: list[dict] | None = None, reference_image_url: str | None = None, image_url_to_base64=None, save_image_from_url=None, save_base64_image=None) -> str:
+    with tracer.span("provider.image", client=True, provider=provider), circuit_for(provider, "image", config).call(), metrics.provider_call(provider, "image"):
+        return await _generate_image(provider, prompt, sub_dir, config, image_client, visual_service, negative_prompt, reference_images, reference_image_url, image_url_to_base64, save_image_from_url, save_base64_image)
+
+async def _generate_image(provider: str, prompt: str, sub_dir: str | None, config, image_client, visual_service, negative_prompt: str = "", reference_images: list[dict] | None = None, reference_image_url: str | None = None, image_url_to_base64=None, save_image_from_url=None, save_base64_image=None) -> str:
     if provider == "openai":
         return await openai_provider.generate_image(
             prompt=prompt,
@@ -17,7 +31,7 @@ async def generate_image(provider: str, prompt: str, sub_dir: str | None, config
             save_base64_image=save_base64_image
         )
     if provider == "vectorengine":
-        return await asyncio.to_thread(
+        return await long_poll_executor.run(
             vectorengine_provider.generate_image,
             prompt,
             negative_prompt,
@@ -26,7 +40,7 @@ async def generate_image(provider: str, prompt: str, sub_dir: str | None, config
             save_image_from_url
         )
     if provider == "volcengine":
-        return await asyncio.to_thread(
+        return await long_poll_executor.run(
             volcengine_provider.generate_image,
             prompt,
             reference_images,
@@ -38,7 +52,11 @@ async def generate_image(provider: str, prompt: str, sub_dir: str | None, config
         )
     raise Exception(f"Unsupported image provider: {provider}")
 
-async def generate_video(provider: str, prompt: str, image_path: str | None, sub_dir: str | None, source_url: str | None, config, video_client, visual_service, save_video_bytes=None, save_base64_video=None, progress_callback=None) -> str:
+async def generate_video(provider: str, prompt: str, image_path: str | None, sub_dir: str | None, source_url: str | None, config, video_client, visual_service, save_video_bytes=None, save_base64_video=None, progress_callback=None, webhook_url: str | None = None, job_id: str | None = None) -> str:
+    with tracer.span("provider.video", client=True, provider=provider), circuit_for(provider, "video", config).call(), metrics.provider_call(provider, "video"):
+        return await _generate_video(provider, prompt, image_path, sub_dir, source_url, config, video_client, visual_service, save_video_bytes, save_base64_video, progress_callback, webhook_url, job_id)
+
+async def _generate_video(provider: str, prompt: str, image_path: str | None, sub_dir: str | None, source_url: str | None, config, video_client, visual_service, save_video_bytes=None, save_base64_video=None, progress_callback=None, webhook_url: str | None = None, job_id: str | None = None) -> str:
     if provider == "openai":
         return await openai_provider.generate_video(
             prompt=prompt,
@@ -48,24 +66,42 @@ async def generate_video(provider: str, prompt: str, image_path: str | None, sub
             video_client=video_client,
             config=config,
             save_video_bytes=save_video_bytes,
-            save_base64_video=save_base64_video
+            save_base64_video=save_base64_video,
+            webhook_url=webhook_url,
+            job_id=job_id
         )
     if provider == "volcengine":
-        return await asyncio.to_thread(
-            volcengine_provider.generate_video,
+        task = await short_executor.run(
+            volcengine_provider.submit_video,
             prompt,
             image_path,
-            progress_callback,
-            sub_dir,
             visual_service,
-            config,
-            save_base64_video
+            config
         )
+        if not task:
+            return None
+        try:
+            result = await task_poller.wait("volcengine", task["task_id"], task, interval=5.0, timeout=600.0, on_update=progress_callback)
+        except (TaskFailed, TaskTimeout) as e:
+            print(f"Video Generation Failed: {e}")
+            raise
+        return volcengine_provider.finish_video(result, sub_dir, save_base64_video)
     if provider == "rongyiyun":
-        return await asyncio.to_thread(
+        return await short_executor.run(
             rongyiyun_provider.generate_video,
             prompt,
             source_url,
             config
         )
     raise Exception(f"Unsupported video provider: {provider}")
+
+WEBHOOK_PARSERS = {
+    "openai": openai_provider.parse_video_callback,
+}
+
+def parse_webhook(provider: str, payload) -> dict:
+    """A provider callback body as the poll result ``task_poller.complete`` takes."""
+    parser = WEBHOOK_PARSERS.get(provider)
+    if not parser:
+        raise Exception(f"Unsupported webhook provider: {provider}")
+    return parser(payload)
@@ -0,0 +1,202 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import metrics
+from .poller import TaskFailed
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATES = (CLOSED, HALF_OPEN, OPEN)
+# Consecutive failed calls (errors or timeouts) that open a circuit
+FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+# How long an open circuit rejects calls before letting a trial request through
+RESET_TIMEOUT_S = float(os.getenv("CIRCUIT_RESET_TIMEOUT_S", "30"))
+HALF_OPEN_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "1"))
+
+_CLIENT_ERROR_RE = re.compile(r"\((4\d\d)\)|HTTP Error (4\d\d)")
+
+transitions = metrics.REGISTRY.counter("mochiani_circuit_transitions_total", "Circuit breaker state changes, by provider endpoint and the state entered.", ("provider", "endpoint", "state"))
+rejections = metrics.REGISTRY.counter("mochiani_circuit_rejected_total", "Upstream calls failed fast because their circuit was open.", ("provider", "endpoint"))
+
+class CircuitOpen(Exception):
+    def __init__(self, provider: str, endpoint: str, retry_in: float):
+        self.provider = provider
+        self.endpoint = endpoint
+        self.retry_in = retry_in
+        detail = f"retry in {retry_in:.0f}s" if retry_in else "trial request in progress"
+        super().__init__(f"{provider} {endpoint} is unavailable (circuit open, {detail})")
+
+def _status(error: BaseException) -> int | None:
+    for obj in (error, getattr(error, "response", None)):
+        for attr in ("status_code", "code", "status"):
+            value = getattr(obj, attr, None)
+            if isinstance(value, int) and 100 <= value < 600:
+                return value
+    match = _CLIENT_ERROR_RE.search(str(error))
+    return int(match.group(1) or match.group(2)) if match else None
+
+def is_outage(error: BaseException) -> bool:
+    """Whether an error says the upstream is unhealthy rather than that it rejected this request.
+
+    Connection errors, timeouts and 5xx count; 4xx answers (bad prompt, moderation, auth,
+    429 which the provider pool handles) and failed tasks prove the upstream is up.
+    """
+    if isinstance(error, (CircuitOpen, TaskFailed)):
+        return False
+    status = _status(error)
+    return status is None or status >= 500 or status == 408
+
+class CircuitBreaker:
+    """Fail-fast guard for one provider endpoint.
+
+    ``closed``: calls go through and consecutive outage errors are counted; at
+    ``failure_threshold`` the circuit opens. ``open``: calls raise ``CircuitOpen`` at once
+    instead of waiting out upstream timeouts. After ``reset_timeout`` it turns ``half_open``
+    and lets ``half_open_calls`` trial calls through: a success closes it, a failure opens it
+    again for another ``reset_timeout``.
+    """
+
+    def __init__(self, provider: str, endpoint: str, failure_threshold: int = FAILURE_THRESHOLD,
+                 reset_timeout: float = RESET_TIMEOUT_S, half_open_calls: int = HALF_OPEN_CALLS):
+        self.provider = provider
+        self.endpoint = endpoint
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = max(1, half_open_calls)
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trials = 0
+        self.opened = 0
+        self.rejected = 0
+        self.last_error: str | None = None
+        self._lock = threading.Lock()
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            self.state = state
+            transitions.inc(provider=self.provider, endpoint=self.endpoint, state=state)
+            if state == OPEN:
+                self.opened += 1
+                print(f"Circuit open: {self.provider} {self.endpoint} after {self.failures} failures ({self.last_error})")
+            elif state == CLOSED:
+                print(f"Circuit closed: {self.provider} {self.endpoint} recovered")
+
+    def retry_in(self, now: float | None = None) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_timeout - (now if now is not None else time.monotonic()))
+
+    def is_open(self, now: float | None = None) -> bool:
+        """Open and still cooling down; a due trial counts as not open."""
+        return self.state == OPEN and self.retry_in(now) > 0
+
+    def before_call(self) -> bool:
+        """Admit a call or raise ``CircuitOpen``; True when the call is a half-open trial."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN:
+                if self.retry_in(now) > 0:
+                    self.rejected += 1
+                    rejections.inc(provider=self.provider, endpoint=self.endpoint)
+                    raise CircuitOpen(self.provider, self.endpoint, self.retry_in(now))
+                self._set_state(HALF_OPEN)
+                self.trials = 0
+            if self.state == HALF_OPEN:
+                if self.trials >= self.half_open_calls:
+                    self.rejected += 1
+                    rejections.inc(provider=self.provider, endpoint=self.endpoint)
+                    raise CircuitOpen(self.provider, self.endpoint, 0.0)
+                self.trials += 1
+                return True
+            return False
+
+    def on_success(self):
+        with self._lock:
+            self.failures = 0
+            self._set_state(CLOSED)
+
+    def on_failure(self, error: BaseException | str | None = None):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)[:200] if error is not None else None
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                self._set_state(OPEN)
+
+    def on_abandoned(self, trial: bool):
+        # Cancelled before the upstream answered: no verdict, free the trial slot
+        if trial:
+            with self._lock:
+                self.trials = max(0, self.trials - 1)
+
+    @contextmanager
+    def call(self):
+        """Guard one upstream call: fail fast while open and record how the call ended."""
+        trial = self.before_call()
+        try:
+            yield
+        except Exception as e:
+            if is_outage(e):
+                self.on_failure(e)
+            else:
+                self.on_success()
+            raise
+        except BaseException:
+            self.on_abandoned(trial)
+            raise
+        self.on_success()
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_in_s": round(self.retry_in(), 1),
+            "last_error": self.last_error
+        }
+
+class CircuitRegistry:
+    def __init__(self):
+        self._breakers: dict[tuple[str, str], CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider: str, endpoint: str) -> CircuitBreaker:
+        key = (provider, endpoint)
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.setdefault(key, CircuitBreaker(provider, endpoint))
+        return breaker
+
+    def all(self) -> list[CircuitBreaker]:
+        return list(self._breakers.values())
+
+    def stats(self) -> dict:
+        return {f"{b.provider} {b.endpoint}": b.stats() for b in self.all()}
+
+breakers = CircuitRegistry()
+metrics.REGISTRY.gauge(
+    "mochiani_circuit_state", "Circuit breaker state per provider endpoint: 0 closed, 1 half-open, 2 open.", ("provider", "endpoint"),
+    collect=lambda: [({"provider": b.provider, "endpoint": b.endpoint}, STATES.index(b.state)) for b in breakers.all()]
+)
+
+def endpoint_for(provider: str, kind: str, config=None, url: str | None = None) -> str:
+    """``kind:host`` for the upstream a call goes to, so accounts behind different base URLs
+    trip separately; just ``kind`` for providers with a fixed endpoint."""
+    if url is None and config is not None:
+        if provider == "openai":
+            url = getattr(config, f"openai_{kind}_api_base", "") or getattr(config, "openai_api_base", "") or "https://api.openai.com/v1"
+        elif provider in ("vectorengine", "rongyiyun"):
+            url = getattr(config, f"{provider}_api_base", "")
+    host = urlparse(url).netloc if url else ""
+    return f"{kind}:{host}" if host else kind
+
+def circuit_for(provider: str, kind: str, config=None, url: str | None = None) -> CircuitBreaker:
+    return breakers.get(provider, endpoint_for(provider, kind, config, url))
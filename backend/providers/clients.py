@@ -0,0 +1,52 @@
+import threading
+
+class LazyClient:
+    """Stands in for a provider SDK client and builds it on first attribute access.
+
+    The OpenAI and Volcengine SDKs take most of the backend's import time, so
+    ``init_ai_clients`` hands these out instead and an SDK is only imported once its
+    provider is actually used (or by ``warm_up`` in the background after startup).
+    """
+
+    def __init__(self, name: str, factory):
+        self._name = name
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+    def __repr__(self) -> str:
+        return f"<LazyClient {self._name} {'ready' if self._client is not None else 'pending'}>"
+
+def openai_client(name: str, **kwargs) -> LazyClient:
+    def build():
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(**kwargs)
+    return LazyClient(name, build)
+
+def volcengine_visual(access_key: str, secret_key: str) -> LazyClient:
+    def build():
+        from volcengine.visual.VisualService import VisualService
+        service = VisualService()
+        service.set_ak(access_key)
+        service.set_sk(secret_key)
+        return service
+    return LazyClient("Volcengine", build)
+
+def warm_up(*clients):
+    """Build pending clients, e.g. on a worker thread so the first request doesn't pay the SDK import."""
+    for client in clients:
+        if isinstance(client, LazyClient):
+            try:
+                client.get()
+            except Exception as e:
+                print(f"Failed to initialize {client._name} client: {e}")
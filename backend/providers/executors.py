@@ -0,0 +1,84 @@
+import asyncio
+import contextvars
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Set by a caller that needs to know about work left running in a pool after it was
+# cancelled (ProviderPool.run); BoundedExecutor.run adds the future of each such call
+orphaned_calls: contextvars.ContextVar[list | None] = contextvars.ContextVar("orphaned_calls", default=None)
+
+class BoundedExecutor:
+    """Named thread pool for blocking provider calls, with utilization counters.
+
+    Provider SDKs and urllib calls block, so they run off the event loop. Giving long
+    polling work and short request work separate pools keeps a burst of slow video
+    jobs from starving image requests and file I/O on the shared default executor.
+    """
+
+    def __init__(self, name: str, max_workers: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _call(self, ctx: contextvars.Context, func, args, kwargs):
+        with self._lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            return ctx.run(func, *args, **kwargs)
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
+
+    def _done(self, future):
+        # A call cancelled while still queued never reaches _call to leave the queue
+        if future.cancelled():
+            with self._lock:
+                self.queued -= 1
+
+    async def run(self, func, *args, **kwargs):
+        with self._lock:
+            self.queued += 1
+        future = self._pool.submit(self._call, contextvars.copy_context(), func, args, kwargs)
+        future.add_done_callback(self._done)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A call already running on a thread cannot be stopped; it carries on to the end
+            orphans = orphaned_calls.get()
+            if orphans is not None and not future.done():
+                orphans.append(future)
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "active": self.active,
+                "queued": self.queued,
+                "utilization": round(self.active / self.max_workers, 3),
+                "completed": self.completed,
+                "failed": self.failed
+            }
+
+# Polling loops and SDK calls that wait on upstream queues (minutes per call)
+long_poll_executor = BoundedExecutor("provider-long", int(os.getenv("PROVIDER_LONG_WORKERS", "8")))
+# Single upstream requests, downloads and file writes (seconds per call)
+short_executor = BoundedExecutor("provider-short", int(os.getenv("PROVIDER_SHORT_WORKERS", "16")))
+# TaskPoller status sweeps, kept apart so busy image workers never delay a poll or a timeout
+poll_executor = BoundedExecutor("provider-poll", int(os.getenv("PROVIDER_POLL_WORKERS", "4")))
+
+def executor_stats() -> list[dict]:
+    return [long_poll_executor.stats(), short_executor.stats(), poll_executor.stats()]
@@ -0,0 +1,116 @@
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable
+
+import metrics
+from tracing import tracer
+from .circuit import CircuitOpen
+
+HEDGE_PERCENTILE = 95
+# Successful calls remembered per provider, and how many are needed before their p95 is trusted
+LATENCY_WINDOW = int(os.getenv("HEDGE_LATENCY_WINDOW", "200"))
+MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+# Hedge delay until a provider has MIN_SAMPLES successful calls
+DEFAULT_DELAY_S = float(os.getenv("HEDGE_DEFAULT_DELAY_S", "30"))
+
+hedges = metrics.REGISTRY.counter("mochiani_image_hedges_total", "Secondary image calls fired by the hedging policy, by why they fired and which call won.", ("primary", "secondary", "reason", "winner"))
+
+class Hedger:
+    """Hedged image requests with failover to a secondary provider.
+
+    Every primary call is timed so the provider's recent p95 latency is known. When a
+    secondary is given and the primary has not answered within ``delay`` (default: that
+    p95), the same image is requested from the secondary as well and whichever succeeds
+    first wins; the other call is cancelled. A primary that fails outright (including one
+    refused by its open circuit) fires the secondary immediately. Only when both fail does the call raise (the primary's error).
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW, min_samples: int = MIN_SAMPLES, default_delay: float = DEFAULT_DELAY_S):
+        self.window = window
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self._latencies: dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, provider: str, seconds: float):
+        with self._lock:
+            self._latencies.setdefault(provider, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, provider: str, pct: float = HEDGE_PERCENTILE) -> float | None:
+        with self._lock:
+            samples = sorted(self._latencies.get(provider, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+    def delay(self, provider: str, fixed: float | None = None) -> float:
+        if fixed:
+            return fixed
+        p95 = self.percentile(provider)
+        return p95 if p95 is not None else self.default_delay
+
+    async def _timed(self, provider: str, call: Callable[[], Awaitable[str]]) -> str:
+        start = time.perf_counter()
+        result = await call()
+        if not result:
+            raise Exception(f"{provider} returned no image")
+        self.observe(provider, time.perf_counter() - start)
+        return result
+
+    async def run(self, primary_provider: str, primary: Callable[[], Awaitable[str]], secondary_provider: str | None = None,
+                  secondary: Callable[[], Awaitable[str]] | None = None, delay: float | None = None) -> tuple[str, str]:
+        """``(result, provider that produced it)``."""
+        if secondary is None:
+            return await self._timed(primary_provider, primary), primary_provider
+
+        first = asyncio.ensure_future(self._timed(primary_provider, primary))
+        tasks = [first]
+        try:
+            wait_s = self.delay(primary_provider, delay)
+            done, _ = await asyncio.wait({first}, timeout=wait_s)
+            if first in done and not first.exception():
+                return first.result(), primary_provider
+            reason = "slow" if first not in done else "circuit_open" if isinstance(first.exception(), CircuitOpen) else "failed"
+            if reason != "slow":
+                print(f"{primary_provider} image failed, failing over to {secondary_provider}: {first.exception()}")
+            else:
+                print(f"{primary_provider} image slower than {wait_s:.1f}s, hedging with {secondary_provider}")
+
+            async def hedge():
+                with tracer.span("hedge", provider=secondary_provider, reason=reason):
+                    return await self._timed(secondary_provider, secondary)
+            second = asyncio.ensure_future(hedge())
+            tasks.append(second)
+            pending = {first, second} - done
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = "primary" if task is first else "secondary"
+                        hedges.inc(primary=primary_provider, secondary=secondary_provider, reason=reason, winner=winner)
+                        return task.result(), primary_provider if task is first else secondary_provider
+            hedges.inc(primary=primary_provider, secondary=secondary_provider, reason=reason, winner="none")
+            raise first.exception()
+        finally:
+            # The loser (or both, if this call is cancelled); calls running on executor
+            # threads finish in the background and their result is dropped
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            providers = list(self._latencies)
+        return {
+            provider: {
+                "samples": len(self._latencies[provider]),
+                "p95_s": round(p95, 3) if (p95 := self.percentile(provider)) is not None else None,
+                "hedge_delay_s": round(self.delay(provider), 3)
+            }
+            for provider in providers
+        }
+
+image_hedger = Hedger()
@@ -7,8 +7,15 @@ import os
 import re
 import urllib.request
 import urllib.error
-import uuid
 from typing import Callable
+from .poller import task_poller, TaskFailed, TaskTimeout
+from .circuit import circuit_for, CircuitOpen
+from .executors import long_poll_executor, short_executor
+
+VIDEO_POLL_INTERVAL_S = 5
+VIDEO_POLL_ATTEMPTS = 150
+# When the provider pushes completion to our webhook, polling only runs as a slow safety net
+WEBHOOK_SAFETY_POLL_S = 60
 
 def _openai_parse_sse_json(raw: bytes) -> list[dict]:
     items = []
@@ -157,77 +164,136 @@ def _openai_normalize_poll_url(callback_url: str | None, base_url: str, default_
         return f"{base_url.rstrip('/')}/{callback_url.lstrip('/')}"
     return default_url
 
+def _openai_urlopen(req: urllib.request.Request, timeout: float) -> tuple[bytes, str]:
+    """Blocking request returning ``(body, content type)``; run it on a provider executor."""
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return resp.read(), resp.headers.get("Content-Type", "")
+
+def _openai_error_message(e: urllib.error.HTTPError, label: str = "OpenAI video poll error response") -> str:
+    """The failure reason from an error response body: its message/error/detail/msg field, else the raw text."""
+    raw = e.read()
+    content_type = e.headers.get("Content-Type", "")
+    data, _ = _openai_parse_response(raw, content_type)
+    if isinstance(data, dict):
+        _debug_openai_video_response(label, data=data)
+        error_msg = data.get("message") or data.get("error") or data.get("detail") or data.get("msg")
+        if isinstance(error_msg, dict):
+            error_msg = error_msg.get("message")
+        return error_msg if isinstance(error_msg, str) and error_msg else json.dumps(data, ensure_ascii=False)
+    _debug_openai_video_response(label, raw=raw, content_type=content_type)
+    return raw.decode("utf-8", errors="replace").strip()
+
 async def _openai_poll_video_result(poll_url: str, headers: dict, method: str = "GET", payload: dict | None = None) -> tuple[dict | None, bytes | None]:
     last_data = None
     consecutive_errors = 0
-    for _ in range(150):  # Increase polling duration to 12.5 minutes for slow queues
+    circuit = circuit_for("openai", "video", url=poll_url)
+    for _ in range(VIDEO_POLL_ATTEMPTS):  # Increase polling duration to 12.5 minutes for slow queues
         body = None
         if payload is not None:
             body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
         req = urllib.request.Request(poll_url, headers=headers, method=method, data=body)
         try:
-            with urllib.request.urlopen(req, timeout=240) as resp:
-                consecutive_errors = 0  # Reset error count on success
-                raw = resp.read()
-                content_type = resp.headers.get("Content-Type", "")
+            raw, content_type = await long_poll_executor.run(_openai_urlopen, req, 240)
+            consecutive_errors = 0  # Reset error count on success
+            circuit.on_success()
         except urllib.error.HTTPError as e:
-            raw = e.read()
-            content_type = e.headers.get("Content-Type", "")
-            data, _ = _openai_parse_response(raw, content_type)
-            if isinstance(data, dict):
-                _debug_openai_video_response("OpenAI video poll error response", data=data)
-                error_msg = data.get("message") or data.get("error") or data.get("detail") or data.get("msg")
-                if not error_msg and isinstance(data.get("error"), dict):
-                    error_msg = data["error"].get("message")
-                if not error_msg:
-                    error_msg = json.dumps(data, ensure_ascii=False)
+            if e.code >= 500:
+                circuit.on_failure(e)
             else:
-                _debug_openai_video_response("OpenAI video poll error response", raw=raw, content_type=content_type)
-                error_msg = raw.decode("utf-8", errors="replace").strip()
+                circuit.on_success()
+            error_msg = await short_executor.run(_openai_error_message, e)
             raise Exception(f"OpenAI video poll failed ({e.code}): {error_msg[:300]}")
-        except urllib.error.URLError as e:
+        except (urllib.error.URLError, TimeoutError) as e:
             consecutive_errors += 1
+            circuit.on_failure(e)
+            if circuit.is_open():
+                # Other calls to this endpoint are failing too; stop waiting out the retries
+                raise CircuitOpen("openai", circuit.endpoint, circuit.retry_in())
             if consecutive_errors > 10:
                 raise Exception(f"OpenAI video poll failed after 10 retries: {e}")
             _debug_openai_video_response(f"OpenAI video poll network error (retry {consecutive_errors}/10): {e}")
-            await asyncio.sleep(5)
+            await asyncio.sleep(VIDEO_POLL_INTERVAL_S)
             continue
         data, video_bytes = _openai_parse_response(raw, content_type)
         if video_bytes:
             return None, video_bytes
         if isinstance(data, dict):
-            # Flatten nested data list if present (e.g. apimart.ai)
-            if isinstance(data.get("data"), list) and data["data"]:
-                first_item = data["data"][0]
-                if isinstance(first_item, dict):
-                    if not data.get("status"):
-                        data["status"] = first_item.get("status")
-                    if not data.get("url"):
-                        data["url"] = first_item.get("url") or first_item.get("video_url") or first_item.get("video") or first_item.get("original_video_url")
-                    if not data.get("failure_reason"):
-                        data["failure_reason"] = first_item.get("failure_reason") or first_item.get("error")
-
+            _openai_flatten_video_data(data)
             last_data = data
-            media_url, media_b64 = _openai_extract_url_or_base64(data)
-            if media_url or media_b64:
+            if _openai_classify_video_data(data)["state"] != "pending":
                 return data, None
             status = data.get("status")
-            if status in ("succeeded", "completed", "success", "SUCCESS", "failed", "error", "canceled", "cancelled"):
-                return data, None
             if status == "QUEUED" or status == "submitted" or status == "IN_PROGRESS":
                  # Some providers (apimart) return QUEUED for a long time, treat as running
                  pass
             # Debug log for intermediate polling status
             if status not in ("running", "queued", "processing", "submitted", "IN_PROGRESS", "QUEUED"):
                 _debug_openai_video_response(f"OpenAI video polling unknown status: {status}", data=data)
-        await asyncio.sleep(5)
+        await asyncio.sleep(VIDEO_POLL_INTERVAL_S)
     return last_data, None
 
-async def _runninghub_generate_video(prompt: str, image_path: str | None, api_key: str, base_url: str, source_url: str | None = None) -> str:
+def _openai_flatten_video_data(data: dict) -> dict:
+    # Flatten nested data list if present (e.g. apimart.ai)
+    if isinstance(data.get("data"), list) and data["data"]:
+        first_item = data["data"][0]
+        if isinstance(first_item, dict):
+            if not data.get("status"):
+                data["status"] = first_item.get("status")
+            if not data.get("url"):
+                data["url"] = first_item.get("url") or first_item.get("video_url") or first_item.get("video") or first_item.get("original_video_url")
+            if not data.get("failure_reason"):
+                data["failure_reason"] = first_item.get("failure_reason") or first_item.get("error")
+    return data
+
+def _openai_classify_video_data(data: dict) -> dict:
+    media_url, media_b64 = _openai_extract_url_or_base64(data)
+    if media_url or media_b64:
+        return {"state": "done", "url": media_url, "b64": media_b64, "data": data}
+    status = data.get("status")
+    if status in ("failed", "error", "canceled", "cancelled"):
+        return {"state": "failed", "reason": data.get("failure_reason") or data.get("error") or data.get("message") or status, "data": data}
+    if status in ("succeeded", "completed", "success", "SUCCESS"):
+        return {"state": "done", "url": None, "b64": None, "data": data}
+    return {"state": "pending", "status": status, "progress": data.get("progress") if isinstance(data.get("progress"), int) else None, "data": data}
+
+def parse_video_callback(payload) -> dict:
+    """Normalize a webhook body pushed by an OpenAI-compatible video provider."""
+    if not isinstance(payload, dict):
+        return {"state": "pending"}
+    if isinstance(payload.get("data"), dict):
+        payload = payload["data"]
+    return _openai_classify_video_data(_openai_flatten_video_data(payload))
+
+def poll_tasks(entries: list[tuple[str, dict]]) -> dict:
+    results = {}
+    for job_id, params in entries:
+        body = None
+        if params.get("payload") is not None:
+            body = json.dumps(params["payload"], ensure_ascii=False).encode("utf-8")
+        req = urllib.request.Request(params["poll_url"], headers=params["headers"], method=params.get("method", "GET"), data=body)
+        try:
+            with urllib.request.urlopen(req, timeout=60) as resp:
+                raw = resp.read()
+                content_type = resp.headers.get("Content-Type", "")
+        except urllib.error.HTTPError as e:
+            results[job_id] = {"state": "failed", "reason": f"OpenAI video poll failed ({e.code}): {_openai_error_message(e)[:300]}"}
+            continue
+        except Exception as e:
+            results[job_id] = {"state": "pending", "error": str(e)}
+            continue
+        data, video_bytes = _openai_parse_response(raw, content_type)
+        if video_bytes:
+            results[job_id] = {"state": "done", "video_bytes": video_bytes}
+        elif isinstance(data, dict):
+            results[job_id] = _openai_classify_video_data(_openai_flatten_video_data(data))
+        else:
+            results[job_id] = {"state": "pending"}
+    return results
+
+def _runninghub_upload_image(image_path: str) -> str | None:
+    """Blocking: a URL (or data URI) RunningHub can fetch for a local image."""
     first_image_url = None
-    if source_url and (source_url.startswith("http://") or source_url.startswith("https://")) and "localhost" not in source_url and "127.0.0.1" not in source_url:
-        first_image_url = source_url
-    if not first_image_url and image_path and os.path.exists(image_path):
+    if os.path.exists(image_path):
         print(f"[RunningHub] Local image detected. Attempting to upload to temporary host...")
         try:
             import requests
@@ -296,7 +362,14 @@ async def _runninghub_generate_video(prompt: str, image_path: str | None, api_ke
                 first_image_url = f"data:{mime_type};base64,{img_b64}"
             except Exception as e2:
                 print(f"[RunningHub] Failed to create raw Data URI: {e2}")
+    return first_image_url
 
+async def _runninghub_generate_video(prompt: str, image_path: str | None, api_key: str, base_url: str, source_url: str | None = None) -> str:
+    first_image_url = None
+    if source_url and (source_url.startswith("http://") or source_url.startswith("https://")) and "localhost" not in source_url and "127.0.0.1" not in source_url:
+        first_image_url = source_url
+    if not first_image_url and image_path:
+        first_image_url = await short_executor.run(_runninghub_upload_image, image_path)
     if not first_image_url:
         raise Exception("RunningHub requires a remote URL or valid local image for video generation")
 
@@ -324,8 +397,8 @@ async def _runninghub_generate_video(prompt: str, image_path: str | None, api_ke
             print(f"[RunningHub] Remote URL: {first_image_url}")
     req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers=headers)
     try:
-        with urllib.request.urlopen(req, timeout=60) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
+        raw, _ = await short_executor.run(_openai_urlopen, req, 60)
+        data = json.loads(raw.decode("utf-8"))
     except Exception as e:
         raise Exception(f"RunningHub submission failed: {e}")
     if data.get("code") and data.get("code") != 0:
@@ -341,8 +414,8 @@ async def _runninghub_generate_video(prompt: str, image_path: str | None, api_ke
         await asyncio.sleep(5)
         q_req = urllib.request.Request(query_url, data=json.dumps({"taskId": task_id}).encode("utf-8"), headers=headers)
         try:
-            with urllib.request.urlopen(q_req, timeout=30) as q_resp:
-                q_data = json.loads(q_resp.read().decode("utf-8"))
+            raw, _ = await short_executor.run(_openai_urlopen, q_req, 30)
+            q_data = json.loads(raw.decode("utf-8"))
         except Exception as e:
             print(f"[RunningHub] Poll request failed: {e}")
             continue
@@ -370,7 +443,7 @@ async def generate_image(prompt: str, sub_dir: str | None, reference_image_url:
             messages_content = [{"type": "text", "text": prompt}]
             if reference_image_url:
                 print(f"[Gemini] Using reference image: {reference_image_url}")
-                b64 = image_url_to_base64(reference_image_url)
+                b64 = await short_executor.run(image_url_to_base64, reference_image_url)
                 if b64:
                     messages_content.append({
                         "type": "image_url",
@@ -391,13 +464,13 @@ async def generate_image(prompt: str, sub_dir: str | None, reference_image_url:
             if match:
                 url_or_data = match.group(1)
                 if url_or_data.startswith("data:image"):
-                    return save_base64_image(url_or_data.split(",", 1)[1], sub_dir=sub_dir)
+                    return await short_executor.run(save_base64_image, url_or_data.split(",", 1)[1], sub_dir=sub_dir)
                 return url_or_data
             clean_content = content.strip().replace("\n", "").replace("\r", "")
             if len(clean_content) > 100 and all(c in "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=" for c in clean_content[:50]):
-                return save_base64_image(clean_content, sub_dir=sub_dir)
+                return await short_executor.run(save_base64_image, clean_content, sub_dir=sub_dir)
             if content.strip().startswith("http"):
-                return save_image_from_url(content.strip(), sub_dir=sub_dir)
+                return await short_executor.run(save_image_from_url, content.strip(), sub_dir=sub_dir)
             print(f"Gemini response content prefix: {content[:200]}...")
             raise Exception("Could not identify image in Gemini response")
         resp = await image_client.images.generate(
@@ -407,16 +480,22 @@ async def generate_image(prompt: str, sub_dir: str | None, reference_image_url:
         )
         data = getattr(resp, "data", [])
         if data and getattr(data[0], "url", None):
-            return save_image_from_url(data[0].url, sub_dir=sub_dir)
+            return await short_executor.run(save_image_from_url, data[0].url, sub_dir=sub_dir)
         if data and getattr(data[0], "b64_json", None):
-            return save_base64_image(data[0].b64_json, sub_dir=sub_dir)
+            return await short_executor.run(save_base64_image, data[0].b64_json, sub_dir=sub_dir)
         raise Exception("No image content returned from OpenAI image")
     except Exception as e:
         print(f"OpenAI Image Generation Failed: {e}")
-        await asyncio.sleep(1)
-        return f"https://picsum.photos/seed/{uuid.uuid4()}/512/512"
+        raise
+
+def _image_data_uri(image_path: str) -> str:
+    with open(image_path, "rb") as f:
+        img_bytes = f.read()
+    img_b64 = base64.b64encode(img_bytes).decode("utf-8")
+    img_type = imghdr.what(None, h=img_bytes) or "png"
+    return f"data:image/{img_type};base64,{img_b64}"
 
-async def generate_video(prompt: str, image_path: str | None, sub_dir: str | None, source_url: str | None, video_client, config, save_video_bytes: Callable[[bytes, str | None], str], save_base64_video: Callable[[str, str | None], str]) -> str:
+async def generate_video(prompt: str, image_path: str | None, sub_dir: str | None, source_url: str | None, video_client, config, save_video_bytes: Callable[[bytes, str | None], str], save_base64_video: Callable[[str, str | None], str], webhook_url: str | None = None, job_id: str | None = None) -> str:
     if not video_client:
         pass
     base_url = config.openai_video_api_base or config.openai_api_base or "https://api.openai.com/v1"
@@ -436,11 +515,7 @@ async def generate_video(prompt: str, image_path: str | None, sub_dir: str | Non
     if source_url and (source_url.startswith("http://") or source_url.startswith("https://")) and "localhost" not in source_url and "127.0.0.1" not in source_url:
         image_url = source_url
     if not image_url and image_path and os.path.exists(image_path):
-        with open(image_path, "rb") as f:
-            img_bytes = f.read()
-        img_b64 = base64.b64encode(img_bytes).decode("utf-8")
-        img_type = imghdr.what(None, h=img_bytes) or "png"
-        image_url = f"data:image/{img_type};base64,{img_b64}"
+        image_url = await short_executor.run(_image_data_uri, image_path)
     if image_url:
         if is_apimarket:
             payload["image_url"] = image_url
@@ -459,7 +534,7 @@ async def generate_video(prompt: str, image_path: str | None, sub_dir: str | Non
     else:
         payload.setdefault("duration", 10)
         payload.setdefault("size", "small")
-    payload.setdefault("webHook", "-1")
+    payload.setdefault("webHook", webhook_url if webhook_url and job_id else "-1")
     payload.setdefault("shutProgress", False)
     default_endpoint = "/videos/generations"
     if model.lower().startswith("sora"):
@@ -490,29 +565,15 @@ async def generate_video(prompt: str, image_path: str | None, sub_dir: str | Non
         headers=headers
     )
     try:
-        with urllib.request.urlopen(req, timeout=240) as resp:
-            raw = resp.read()
-            content_type = resp.headers.get("Content-Type", "")
+        raw, content_type = await long_poll_executor.run(_openai_urlopen, req, 240)
     except urllib.error.HTTPError as e:
-        raw = e.read()
-        content_type = e.headers.get("Content-Type", "")
-        data, _ = _openai_parse_response(raw, content_type)
-        if isinstance(data, dict):
-            _debug_openai_video_response("OpenAI video error response", data=data)
-            error_msg = data.get("message") or data.get("error") or data.get("detail") or data.get("msg")
-            if not error_msg and isinstance(data.get("error"), dict):
-                error_msg = data["error"].get("message")
-            if not error_msg:
-                error_msg = json.dumps(data, ensure_ascii=False)
-        else:
-            _debug_openai_video_response("OpenAI video error response", raw=raw, content_type=content_type)
-            error_msg = raw.decode("utf-8", errors="replace").strip()
+        error_msg = await short_executor.run(_openai_error_message, e, "OpenAI video error response")
         raise Exception(f"OpenAI video request failed ({e.code}): {error_msg[:300]}")
     except urllib.error.URLError as e:
         raise Exception(f"OpenAI video request failed: {e}")
     data, video_bytes = _openai_parse_response(raw, content_type)
     if video_bytes:
-        return save_video_bytes(video_bytes, sub_dir=sub_dir)
+        return await short_executor.run(save_video_bytes, video_bytes, sub_dir=sub_dir)
     if not data:
         _debug_openai_video_response("OpenAI video raw response", raw=raw, content_type=content_type)
         text = raw.decode("utf-8", errors="replace").strip()
@@ -521,7 +582,7 @@ async def generate_video(prompt: str, image_path: str | None, sub_dir: str | Non
     if media_url:
         return media_url
     if media_b64:
-        return save_base64_video(media_b64, sub_dir=sub_dir)
+        return await short_executor.run(save_base64_video, media_b64, sub_dir=sub_dir)
 
     # Handle nested data list (e.g. apimart.ai returns {data: [{task_id: ...}]})
     if isinstance(data.get("data"), list) and data["data"]:
@@ -537,22 +598,51 @@ async def generate_video(prompt: str, image_path: str | None, sub_dir: str | Non
     callback_url = data.get("callback_url")
     if callback_url is None and "webHook" in data:
         callback_url = data.get("webHook")
+    if webhook_url and callback_url == webhook_url:
+        # Some providers echo our own webhook back; it is not a poll URL
+        callback_url = None
     if task_id:
         # Debug base_url for troubleshooting
         _debug_openai_video_response(f"OpenAI video polling init. Model: {model}, Base URL: {base_url}")
-        
+
+        if webhook_url and job_id:
+            if "sora-2-all" in model.lower():
+                poll_url = f"{base_url.rstrip('/')}/v1/video/query?id={task_id}"
+            else:
+                poll_url = _openai_normalize_poll_url(callback_url, base_url, f"{url.rstrip('/')}/{task_id}")
+            try:
+                result = await task_poller.wait(
+                    "openai",
+                    job_id,
+                    {"poll_url": poll_url, "headers": headers},
+                    interval=WEBHOOK_SAFETY_POLL_S,
+                    timeout=VIDEO_POLL_INTERVAL_S * VIDEO_POLL_ATTEMPTS
+                )
+            except TaskFailed as e:
+                raise Exception(f"OpenAI video failed: {e.result.get('reason')}")
+            except TaskTimeout:
+                raise Exception("OpenAI video polling timed out without result")
+            if result.get("video_bytes"):
+                return await short_executor.run(save_video_bytes, result["video_bytes"], sub_dir=sub_dir)
+            if result.get("url"):
+                return result["url"]
+            if result.get("b64"):
+                return await short_executor.run(save_base64_video, result["b64"], sub_dir=sub_dir)
+            _debug_openai_video_response("OpenAI video completed without media", data=result.get("data"))
+            raise Exception("No video content returned from OpenAI video")
+
         if "sora-2-all" not in model.lower():
             try:
                 result_endpoint = f"{base_url.rstrip('/')}/v1/draw/result"
                 result_data, result_video = await _openai_poll_video_result(result_endpoint, headers, method="POST", payload={"id": task_id})
                 if result_video:
-                    return save_video_bytes(result_video, sub_dir=sub_dir)
+                    return await short_executor.run(save_video_bytes, result_video, sub_dir=sub_dir)
                 if isinstance(result_data, dict):
                     media_url, media_b64 = _openai_extract_url_or_base64(result_data)
                     if media_url:
                         return media_url
                     if media_b64:
-                        return save_base64_video(media_b64, sub_dir=sub_dir)
+                        return await short_executor.run(save_base64_video, media_b64, sub_dir=sub_dir)
             except Exception:
                 pass
         if status in ("running", "queued", "processing", "submitted", "QUEUED", "IN_PROGRESS"):
@@ -563,13 +653,13 @@ async def generate_video(prompt: str, image_path: str | None, sub_dir: str | Non
                 poll_url = _openai_normalize_poll_url(callback_url, base_url, default_poll_url)
             polled_data, polled_video = await _openai_poll_video_result(poll_url, headers)
             if polled_video:
-                return save_video_bytes(polled_video, sub_dir=sub_dir)
+                return await short_executor.run(save_video_bytes, polled_video, sub_dir=sub_dir)
             if isinstance(polled_data, dict):
                 media_url, media_b64 = _openai_extract_url_or_base64(polled_data)
                 if media_url:
                     return media_url
                 if media_b64:
-                    return save_base64_video(media_b64, sub_dir=sub_dir)
+                    return await short_executor.run(save_base64_video, media_b64, sub_dir=sub_dir)
                 failure_reason = polled_data.get("failure_reason") or polled_data.get("error") or polled_data.get("message")
                 if failure_reason:
                     _debug_openai_video_response("OpenAI video poll response", data=polled_data)
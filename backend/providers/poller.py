@@ -0,0 +1,268 @@
+import asyncio
+import time
+from typing import Any, Callable
+
+from tracing import tracer
+
+# Result states returned by a provider's poll function for each task
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+class TaskFailed(Exception):
+    def __init__(self, provider: str, task_id: str, result: dict | None = None):
+        self.provider = provider
+        self.task_id = task_id
+        self.result = result or {}
+        super().__init__(f"{provider} task {task_id} failed: {self.result.get('reason') or self.result}")
+
+class TaskTimeout(Exception):
+    def __init__(self, provider: str, task_id: str, last_result: dict | None = None):
+        self.provider = provider
+        self.task_id = task_id
+        self.last_result = last_result or {}
+        super().__init__(f"{provider} task {task_id} timed out")
+
+class _Entry:
+    __slots__ = ("provider", "task_id", "params", "future", "interval", "deadline", "next_poll", "on_update", "errors", "last_result", "last_progress", "last_status", "waiters")
+
+    def __init__(self, provider: str, task_id: str, params: dict, future: asyncio.Future, interval: float, timeout: float, on_update):
+        now = time.monotonic()
+        self.provider = provider
+        self.task_id = task_id
+        self.params = params
+        self.future = future
+        self.interval = interval
+        self.deadline = now + timeout
+        self.next_poll = now + interval
+        self.on_update = on_update
+        self.errors = 0
+        self.last_result = None
+        self.last_progress = None
+        self.last_status = None
+        self.waiters = 1
+
+class TaskPoller:
+    """Single scheduler that polls every outstanding (provider, task_id) pair.
+
+    Providers register a blocking ``fetch(entries)`` callable that receives a list of
+    ``(task_id, params)`` tuples and returns ``{task_id: {"state": ..., ...}}``. All due
+    tasks of one provider are handed over in a single call, so N in-flight jobs cost one
+    worker thread per tick instead of one thread (or coroutine) each. Each provider's sweep
+    runs as its own task, at most one at a time per provider, so a slow upstream delays
+    neither the other providers' polls nor any task's timeout.
+
+    A provider can also register ``circuit(params)`` returning the circuit breaker of the
+    endpoint a task is polled at. Poll outcomes feed the breaker, and tasks behind an open
+    circuit are not polled (nor charged errors) until it is due for a trial; their own
+    timeout still applies.
+    """
+
+    def __init__(self, max_batch: int = 50, max_errors: int = 10):
+        self.max_batch = max_batch
+        self.max_errors = max_errors
+        self._fetchers: dict[str, Callable[[list[tuple[str, dict]]], dict]] = {}
+        self._circuits: dict[str, Callable[[dict], Any]] = {}
+        self._entries: dict[tuple[str, str], _Entry] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._runner: asyncio.Task | None = None
+        self._runner_loop = None
+        self._sweeping: set[str] = set()
+        self._sweeps: set[asyncio.Task] = set()
+        self._run_in_thread = asyncio.to_thread
+        self._early: dict[tuple[str, str], tuple[float, dict]] = {}
+        self.polls = 0
+        self.pushed = 0
+        self.batches = 0
+
+    def register(self, provider: str, fetch: Callable[[list[tuple[str, dict]]], dict], circuit: Callable[[dict], Any] | None = None):
+        self._fetchers[provider] = fetch
+        if circuit:
+            self._circuits[provider] = circuit
+
+    def set_runner(self, run_in_thread):
+        # Lets the dispatch layer decide which executor runs the blocking fetch calls
+        self._run_in_thread = run_in_thread
+
+    def pending(self) -> dict[str, int]:
+        counts: dict[str, int] = {}
+        for provider, _ in self._entries:
+            counts[provider] = counts.get(provider, 0) + 1
+        return counts
+
+    def waiting(self) -> list[tuple[str, str]]:
+        """``(provider, task_id)`` of every task still waiting for its result."""
+        return [key for key, entry in self._entries.items() if not entry.future.done()]
+
+    def stats(self) -> dict[str, Any]:
+        return {"pending": self.pending(), "polls": self.polls, "batches": self.batches, "pushed": self.pushed}
+
+    def complete(self, provider: str, task_id: str, result: dict) -> bool:
+        """Resolve a task from a pushed result (e.g. a provider webhook) instead of a poll."""
+        self.pushed += 1
+        state = result.get("state")
+        entry = self._entries.get((provider, task_id))
+        if not entry or entry.future.done():
+            # The callback can beat the submit response; keep it for the waiter that follows
+            if state in (DONE, FAILED):
+                now = time.monotonic()
+                self._early = {k: v for k, v in self._early.items() if now - v[0] < 600}
+                self._early[(provider, task_id)] = (now, result)
+            return False
+        if state == DONE:
+            entry.future.set_result(result)
+        elif state == FAILED:
+            entry.future.set_exception(TaskFailed(provider, task_id, result))
+        elif entry.on_update:
+            entry.on_update(result.get("progress"), result.get("status"))
+        return True
+
+    async def wait(self, provider: str, task_id: str, params: dict | None = None, interval: float = 5.0, timeout: float = 600.0, on_update: Callable[[int | None, str | None], None] | None = None) -> dict:
+        if provider not in self._fetchers:
+            raise Exception(f"No poller registered for provider: {provider}")
+        key = (provider, task_id)
+        early = self._early.pop(key, None)
+        if early:
+            if early[1].get("state") == FAILED:
+                raise TaskFailed(provider, task_id, early[1])
+            return early[1]
+        # Time spent here is upstream queueing and rendering, not our own work
+        with tracer.span("upstream.wait", client=True, provider=provider, task_id=task_id):
+            entry = self._entries.get(key)
+            if entry and not entry.future.done():
+                entry.waiters += 1
+            else:
+                loop = asyncio.get_running_loop()
+                entry = _Entry(provider, task_id, params or {}, loop.create_future(), interval, timeout, on_update)
+                self._entries[key] = entry
+                self._ensure_runner(loop)
+                self._wakeup.set()
+            try:
+                # Shielded, so one waiter giving up leaves the task polled for the others
+                return await asyncio.shield(entry.future)
+            finally:
+                entry.waiters -= 1
+                if not entry.waiters and self._entries.get(key) is entry:
+                    del self._entries[key]
+                    if not entry.future.done():
+                        entry.future.cancel()
+
+    def _ensure_runner(self, loop):
+        if self._runner is None or self._runner.done() or self._runner_loop is not loop:
+            if self._runner_loop is not loop:
+                # Sweeps of a previous loop will never finish
+                self._sweeping.clear()
+            self._wakeup = asyncio.Event()
+            self._runner_loop = loop
+            self._runner = loop.create_task(self._run())
+
+    async def _run(self):
+        while self._entries:
+            now = time.monotonic()
+            due: dict[str, list[_Entry]] = {}
+            for entry in list(self._entries.values()):
+                if entry.future.done():
+                    continue
+                if now >= entry.deadline:
+                    entry.future.set_exception(TaskTimeout(entry.provider, entry.task_id, entry.last_result))
+                    continue
+                if entry.next_poll <= now and entry.provider not in self._sweeping:
+                    due.setdefault(entry.provider, []).append(entry)
+
+            for provider, entries in due.items():
+                self._sweeping.add(provider)
+                sweep = asyncio.create_task(self._sweep(provider, entries))
+                self._sweeps.add(sweep)
+                sweep.add_done_callback(self._sweeps.discard)
+
+            pending = [e for e in self._entries.values() if not e.future.done()]
+            if not pending:
+                # Let finished waiters drop their entries before deciding to exit
+                await asyncio.sleep(0)
+                continue
+            now = time.monotonic()
+            # Tasks of a provider that is mid-sweep wait for it to finish (it sets the wakeup);
+            # their deadlines still count
+            delay = max(0.0, min(e.deadline if e.provider in self._sweeping else min(e.next_poll, e.deadline) for e in pending) - now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _sweep(self, provider: str, entries: list[_Entry]):
+        try:
+            await asyncio.gather(*(self._poll_batch(provider, entries[i:i + self.max_batch]) for i in range(0, len(entries), self.max_batch)))
+        except Exception as e:
+            print(f"[Poller] {provider} sweep failed: {e}")
+            retry_at = time.monotonic()
+            for entry in entries:
+                entry.next_poll = retry_at + entry.interval
+        finally:
+            self._sweeping.discard(provider)
+            if self._wakeup:
+                self._wakeup.set()
+
+    async def _poll_batch(self, provider: str, entries: list[_Entry]):
+        fetch = self._fetchers[provider]
+        circuit = self._circuits.get(provider)
+        breakers = {}
+        if circuit:
+            now = time.monotonic()
+            for entry in entries:
+                breakers[entry.task_id] = breaker = circuit(entry.params)
+                if breaker.is_open(now):
+                    # Upstream is down: skip the request, check again once the circuit is due a trial
+                    entry.next_poll = now + max(entry.interval, breaker.retry_in(now))
+            entries = [e for e in entries if not breakers[e.task_id].is_open(now)]
+            if not entries:
+                return
+        self.batches += 1
+        self.polls += len(entries)
+        try:
+            results = await self._run_in_thread(fetch, [(e.task_id, e.params) for e in entries])
+        except Exception as e:
+            results = {e_.task_id: {"state": PENDING, "error": str(e)} for e_ in entries}
+        now = time.monotonic()
+        if breakers:
+            outcomes = {}
+            for entry in entries:
+                breaker = breakers[entry.task_id]
+                error = (results.get(entry.task_id) or {"error": "missing result"}).get("error")
+                # One verdict per endpoint and tick: up if any of its tasks answered
+                if error is None or id(breaker) not in outcomes:
+                    outcomes[id(breaker)] = (breaker, error)
+            for breaker, error in outcomes.values():
+                if error is None:
+                    breaker.on_success()
+                else:
+                    breaker.on_failure(error)
+        for entry in entries:
+            entry.next_poll = now + entry.interval
+            if entry.future.done():
+                continue
+            result = results.get(entry.task_id) or {"state": PENDING, "error": "missing result"}
+            if result.get("error"):
+                entry.errors += 1
+                if entry.errors > self.max_errors:
+                    entry.future.set_exception(Exception(f"{provider} poll failed after {self.max_errors} retries: {result['error']}"))
+                continue
+            entry.errors = 0
+            entry.last_result = result
+            state = result.get("state")
+            if state == DONE:
+                entry.future.set_result(result)
+            elif state == FAILED:
+                entry.future.set_exception(TaskFailed(provider, entry.task_id, result))
+            elif entry.on_update:
+                progress = result.get("progress")
+                status = result.get("status")
+                if progress != entry.last_progress or status != entry.last_status:
+                    entry.last_progress = progress
+                    entry.last_status = status
+                    try:
+                        entry.on_update(progress, status)
+                    except Exception as e:
+                        print(f"[Poller] on_update failed for {provider}/{entry.task_id}: {e}")
+
+task_poller = TaskPoller()
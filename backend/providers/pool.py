@@ -0,0 +1,300 @@
+import asyncio
+import re
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+import metrics
+from tracing import tracer
+from .circuit import CircuitOpen, circuit_for
+from .executors import orphaned_calls
+
+LEAST_LOADED = "least_loaded"
+WEIGHTED_ROUND_ROBIN = "weighted_round_robin"
+STRATEGIES = (LEAST_LOADED, WEIGHTED_ROUND_ROBIN)
+# Cooldown after a 429 without Retry-After, doubled per consecutive strike
+COOLDOWN_BASE_S = 5.0
+COOLDOWN_MAX_S = 120.0
+RPM_WINDOW_S = 60.0
+
+_RATE_LIMIT_RE = re.compile(r"\b429\b|rate.?limit|too many requests|throttl", re.IGNORECASE)
+
+pool_requests = metrics.REGISTRY.counter("mochiani_provider_pool_requests_total", "Calls routed through the provider pool, by account and outcome.", ("modality", "account", "outcome"))
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Upstream said "slow down": HTTP 429 on the exception or its response, or in the message."""
+    for obj in (error, getattr(error, "response", None)):
+        for attr in ("status_code", "code", "status"):
+            if getattr(obj, attr, None) == 429:
+                return True
+    return bool(_RATE_LIMIT_RE.search(str(error)))
+
+def _retry_after(error: BaseException) -> float | None:
+    headers = getattr(getattr(error, "response", None), "headers", None) or getattr(error, "headers", None)
+    value = headers.get("retry-after") if headers else None
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+class RateState:
+    """Rate limit tracking for one account: an optional requests-per-minute budget and a
+    cooldown after the upstream answers 429. Kept across pool reconfiguration by name."""
+
+    def __init__(self, rpm: int | None = None):
+        self.rpm = rpm
+        self.sent: deque[float] = deque()
+        self.cooldown_until = 0.0
+        self.strikes = 0
+        self.rate_limited = 0
+
+    def available_at(self, now: float) -> float:
+        at = self.cooldown_until
+        if self.rpm:
+            while self.sent and now - self.sent[0] >= RPM_WINDOW_S:
+                self.sent.popleft()
+            if len(self.sent) >= self.rpm:
+                at = max(at, self.sent[0] + RPM_WINDOW_S)
+        return at
+
+    def on_request(self, now: float):
+        if self.rpm:
+            self.sent.append(now)
+
+    def on_rate_limited(self, now: float, retry_after: float | None):
+        self.rate_limited += 1
+        self.strikes += 1
+        delay = retry_after if retry_after is not None else min(COOLDOWN_MAX_S, COOLDOWN_BASE_S * 2 ** (self.strikes - 1))
+        self.cooldown_until = max(self.cooldown_until, now + delay)
+
+    def on_success(self):
+        self.strikes = 0
+
+class ProviderAccount:
+    """One configured account (API key or preset) for a modality, with its own clients."""
+
+    def __init__(self, name: str, modality: str, config, image_client=None, video_client=None, visual_service=None,
+                 weight: int = 1, max_concurrency: int | None = None, rate: RateState | None = None):
+        self.name = name
+        self.modality = modality
+        self.config = config
+        self.provider = getattr(config, f"{modality}_provider", "") or "openai"
+        self.image_client = image_client
+        self.video_client = video_client
+        self.visual_service = visual_service
+        self.weight = max(1, int(weight or 1))
+        self.max_concurrency = max_concurrency if max_concurrency and max_concurrency > 0 else None
+        self.rate = rate or RateState()
+        self.circuit = circuit_for(self.provider, modality, config)
+        self.in_flight = 0
+        self.requests = 0
+        self.errors = 0
+        # Smooth weighted round-robin state
+        self._current = 0
+
+    def available_at(self, now: float) -> float | None:
+        """When this account can take a request; None while it is at its concurrency cap."""
+        if self.max_concurrency and self.in_flight >= self.max_concurrency:
+            return None
+        return self.rate.available_at(now)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            "name": self.name,
+            "provider": self.provider,
+            "weight": self.weight,
+            "max_concurrency": self.max_concurrency,
+            "rpm": self.rate.rpm,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "errors": self.errors,
+            "rate_limited": self.rate.rate_limited,
+            "cooldown_s": round(max(0.0, self.rate.cooldown_until - now), 1),
+            "circuit": self.circuit.state
+        }
+
+class ProviderPool:
+    """Routes image and video calls across every account configured for a modality.
+
+    Accounts come from the active ApiConfig plus the presets listed in ``image_pool`` /
+    ``video_pool``, so capacity grows by adding keys. ``least_loaded`` sends each call to
+    the account with the fewest in-flight calls per unit of weight; ``weighted_round_robin``
+    interleaves accounts in proportion to their weights. Accounts at their concurrency cap,
+    out of their per-minute budget or cooling down after a 429 are skipped, and a
+    rate-limited call is retried on another account. Accounts whose endpoint circuit is open
+    are skipped too while any other account is left, so an outage behind one base URL moves
+    traffic to the rest. When every account is busy the call waits for the first one to free up.
+    """
+
+    def __init__(self, strategy: str = LEAST_LOADED):
+        self.strategy = strategy
+        self._accounts: dict[str, list[ProviderAccount]] = {}
+        self._rates: dict[tuple[str, str], RateState] = {}
+        self._waiters: list[asyncio.Future] = []
+
+    def configure(self, modality: str, accounts: list[ProviderAccount], strategy: str | None = None):
+        if strategy:
+            self.strategy = strategy if strategy in STRATEGIES else LEAST_LOADED
+        if not accounts:
+            self._accounts.pop(modality, None)
+            return
+        provider = accounts[0].provider
+        kept = []
+        for account in accounts:
+            if account.provider != provider:
+                # Prompts, references and cache keys are built for one provider per job
+                print(f"Provider pool: skipping {modality} account {account.name} ({account.provider}), pool provider is {provider}")
+                continue
+            rate = self._rates.setdefault((modality, account.name), account.rate)
+            rate.rpm = account.rate.rpm
+            account.rate = rate
+            kept.append(account)
+        self._accounts[modality] = kept
+        self._wake()
+
+    def accounts(self, modality: str) -> list[ProviderAccount]:
+        return self._accounts.get(modality, [])
+
+    def clients(self) -> list:
+        return [c for accounts in self._accounts.values() for a in accounts for c in (a.image_client, a.video_client, a.visual_service) if c]
+
+    def _pick(self, candidates: list[ProviderAccount]) -> ProviderAccount:
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.strategy == WEIGHTED_ROUND_ROBIN:
+            total = sum(a.weight for a in candidates)
+            for a in candidates:
+                a._current += a.weight
+            best = max(candidates, key=lambda a: a._current)
+            best._current -= total
+            return best
+        return min(candidates, key=lambda a: (a.in_flight / a.weight, a.requests / a.weight))
+
+    async def acquire(self, modality: str, exclude: set[str] = frozenset()) -> ProviderAccount:
+        waited_from = None
+        while True:
+            accounts = self._accounts.get(modality)
+            if not accounts:
+                raise Exception(f"No {modality} provider account configured")
+            pool = [a for a in accounts if a.name not in exclude] or accounts
+            now = time.monotonic()
+            # With every circuit open the call goes ahead and fails fast instead of queueing
+            pool = [a for a in pool if not a.circuit.is_open(now)] or pool
+            ready, next_at = [], None
+            for account in pool:
+                at = account.available_at(now)
+                if at is None:
+                    continue
+                if at <= now:
+                    ready.append(account)
+                elif next_at is None or at < next_at:
+                    next_at = at
+            if ready:
+                account = self._pick(ready)
+                account.in_flight += 1
+                account.requests += 1
+                account.rate.on_request(now)
+                if waited_from is not None:
+                    tracer.record("pool.wait", waited_from, time.time(), modality=modality, account=account.name)
+                return account
+            if waited_from is None:
+                waited_from = time.time()
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                # Woken by a release, or when the earliest cooldown / budget window ends
+                await asyncio.wait_for(waiter, timeout=max(0.01, next_at - now) if next_at else None)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def release(self, account: ProviderAccount, error: BaseException | None = None, cancelled: bool = False):
+        account.in_flight -= 1
+        if cancelled:
+            # No answer from upstream: neither a success nor a failure for the account
+            outcome = "cancelled"
+        elif error is None:
+            account.rate.on_success()
+            outcome = "ok"
+        elif isinstance(error, CircuitOpen):
+            outcome = "circuit_open"
+        elif is_rate_limited(error):
+            account.rate.on_rate_limited(time.monotonic(), _retry_after(error))
+            account.errors += 1
+            outcome = "rate_limited"
+        else:
+            account.errors += 1
+            outcome = "error"
+        pool_requests.inc(modality=account.modality, account=account.name, outcome=outcome)
+        self._wake()
+
+    def _release_when_done(self, account: ProviderAccount, futures: list):
+        """Release a cancelled call's account once the executor calls it left running end,
+        so the account's concurrency limit keeps counting them."""
+        loop = asyncio.get_running_loop()
+        pending = set(futures)
+
+        def finished(future):
+            pending.discard(future)
+            if not pending:
+                self.release(account, cancelled=True)
+
+        def on_done(future):
+            # Runs on the executor thread
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(finished, future)
+
+        for future in futures:
+            future.add_done_callback(on_done)
+
+    def _wake(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def run(self, modality: str, call: Callable[[ProviderAccount], Awaitable[Any]]):
+        """Run ``call(account)`` on a pooled account; rate-limited calls and calls refused by
+        an open circuit move to another account. The account is released however the call
+        ends, including when it is cancelled (a hedge that lost, a client that went away).
+        A cancelled call whose provider work keeps running in an executor thread holds on
+        to the account until that work ends."""
+        tried: set[str] = set()
+        while True:
+            account = await self.acquire(modality, exclude=tried)
+            error, finished = None, False
+            orphans = []
+            token = orphaned_calls.set(orphans)
+            try:
+                result = await call(account)
+                finished = True
+            except Exception as e:
+                error, finished = e, True
+                tried.add(account.name)
+                if (is_rate_limited(e) or isinstance(e, CircuitOpen)) and len(tried) < len(self.accounts(modality)):
+                    print(f"{modality} account {account.name} unavailable, retrying on another account: {e}")
+                    continue
+                raise
+            finally:
+                orphaned_calls.reset(token)
+                running = [future for future in orphans if not future.done()]
+                if not finished and running:
+                    self._release_when_done(account, running)
+                else:
+                    self.release(account, error, cancelled=not finished)
+            return result
+
+    def stats(self) -> dict:
+        return {
+            "strategy": self.strategy,
+            "accounts": {modality: [a.stats() for a in accounts] for modality, accounts in self._accounts.items()}
+        }
+
+provider_pool = ProviderPool()
+metrics.REGISTRY.gauge(
+    "mochiani_provider_pool_in_flight", "Calls currently running on each pooled provider account.", ("modality", "account"),
+    collect=lambda: [({"modality": a.modality, "account": a.name}, a.in_flight) for accounts in provider_pool._accounts.values() for a in accounts]
+)
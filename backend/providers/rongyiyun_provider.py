@@ -64,3 +64,21 @@ def get_task_result(project_id: str, config) -> dict:
         "pid": payload.get("pid"),
         "reason": payload.get("reason")
     }
+
+def poll_tasks(entries: list[tuple[str, dict]]) -> dict:
+    # The upstream only exposes a per-project query, so a batch is a sequential sweep in one worker
+    results = {}
+    for project_id, params in entries:
+        try:
+            result = get_task_result(project_id, params["config"])
+        except Exception as e:
+            results[project_id] = {"state": "pending", "error": str(e)}
+            continue
+        status = result.get("status")
+        if status == 1 and result.get("mediaUrl"):
+            results[project_id] = {"state": "done", "media_url": result["mediaUrl"], "raw": result}
+        elif status == 2:
+            results[project_id] = {"state": "failed", "reason": result.get("reason"), "raw": result}
+        else:
+            results[project_id] = {"state": "pending", "status": "running" if status == 0 else None, "raw": result}
+    return results
@@ -2,7 +2,6 @@ import base64
 import json
 import os
 import time
-import uuid
 from typing import Callable
 
 def _volcengine_extract_url_or_base64(response: dict) -> tuple[str | None, str | None]:
@@ -65,7 +64,7 @@ def _volcengine_extract_progress(response: dict) -> int | None:
             return progress
     return None
 
-def _volcengine_sync2async_generate(visual_service, req_key: str, submit_form: dict, req_json: dict | None = None, timeout_s: float = 120.0, poll_s: float = 1.0, on_progress: Callable[[int | None, str | None], None] | None = None) -> tuple[str | None, str | None]:
+def _volcengine_submit_task(visual_service, req_key: str, submit_form: dict) -> str:
     if not visual_service:
         raise Exception("Volcengine service not initialized")
     submit_form = dict(submit_form or {})
@@ -77,33 +76,60 @@ def _volcengine_sync2async_generate(visual_service, req_key: str, submit_form: d
     task_id = data.get("task_id")
     if not task_id:
         raise Exception(submit_resp)
+    return task_id
+
+def _volcengine_check_task(visual_service, req_key: str, task_id: str, req_json: dict | None = None) -> dict:
+    get_form = {"req_key": req_key, "task_id": task_id}
+    if req_json is not None:
+        get_form["req_json"] = json.dumps(req_json, ensure_ascii=False)
+    resp = visual_service.cv_sync2async_get_result(get_form)
+    if not isinstance(resp, dict) or resp.get("code") != 10000:
+        return {"state": "failed", "reason": resp, "raw": resp}
+    url, b64 = _volcengine_extract_url_or_base64(resp)
+    if url or b64:
+        return {"state": "done", "url": url, "b64": b64, "raw": resp}
+    resp_data = resp.get("data") if isinstance(resp.get("data"), dict) else {}
+    status = resp_data.get("status") or resp_data.get("task_status") or resp_data.get("state")
+    if isinstance(status, str) and status.lower() in ("failed", "error", "canceled", "cancelled"):
+        return {"state": "failed", "reason": resp, "raw": resp}
+    return {
+        "state": "pending",
+        "progress": _volcengine_extract_progress(resp),
+        "status": status if isinstance(status, str) else None,
+        "raw": resp
+    }
+
+def _volcengine_sync2async_generate(visual_service, req_key: str, submit_form: dict, req_json: dict | None = None, timeout_s: float = 120.0, poll_s: float = 1.0, on_progress: Callable[[int | None, str | None], None] | None = None) -> tuple[str | None, str | None]:
+    task_id = _volcengine_submit_task(visual_service, req_key, submit_form)
     deadline = time.time() + timeout_s
     last_resp = None
     last_progress = None
     last_status = None
     while time.time() < deadline:
-        get_form = {"req_key": req_key, "task_id": task_id}
-        if req_json is not None:
-            get_form["req_json"] = json.dumps(req_json, ensure_ascii=False)
-        resp = visual_service.cv_sync2async_get_result(get_form)
-        last_resp = resp
-        if not isinstance(resp, dict) or resp.get("code") != 10000:
-            raise Exception(resp)
-        url, b64 = _volcengine_extract_url_or_base64(resp)
-        if url or b64:
-            return url, b64
-        resp_data = resp.get("data") if isinstance(resp.get("data"), dict) else {}
-        status = resp_data.get("status") or resp_data.get("task_status") or resp_data.get("state")
-        progress = _volcengine_extract_progress(resp)
+        result = _volcengine_check_task(visual_service, req_key, task_id, req_json)
+        last_resp = result["raw"]
+        if result["state"] == "done":
+            return result["url"], result["b64"]
+        if result["state"] == "failed":
+            raise Exception(result["reason"])
+        progress = result["progress"]
+        status = result["status"]
         if on_progress and (progress != last_progress or status != last_status):
-            on_progress(progress, status if isinstance(status, str) else None)
+            on_progress(progress, status)
             last_progress = progress
             last_status = status
-        if isinstance(status, str) and status.lower() in ("failed", "error", "canceled", "cancelled"):
-            raise Exception(resp)
         time.sleep(poll_s)
     raise Exception(last_resp or "Volcengine task timeout")
 
+def poll_tasks(entries: list[tuple[str, dict]]) -> dict:
+    results = {}
+    for task_id, params in entries:
+        try:
+            results[task_id] = _volcengine_check_task(params["visual_service"], params["req_key"], task_id, params.get("req_json"))
+        except Exception as e:
+            results[task_id] = {"state": "pending", "error": str(e)}
+    return results
+
 def generate_image(prompt: str, reference_images: list[dict] | None, sub_dir: str | None, visual_service, config, save_image_from_url: Callable[[str, str | None], str], save_base64_image: Callable[[str, str | None], str]) -> str:
     if not visual_service:
         raise Exception("Volcengine service not initialized")
@@ -156,30 +182,32 @@ def generate_image(prompt: str, reference_images: list[dict] | None, sub_dir: st
         raise Exception("No image content returned from Volcengine")
     except Exception as e:
         print(f"Image Generation Failed: {e}")
-        print("Falling back to Mock Image due to API error...")
-        time.sleep(1)
-        return f"https://picsum.photos/seed/{uuid.uuid4()}/512/512"
+        raise
 
-def generate_video(prompt: str, image_path: str | None, progress_callback: Callable[[int | None, str | None], None] | None, sub_dir: str | None, visual_service, config, save_base64_video: Callable[[str, str | None], str]) -> str:
+def submit_video(prompt: str, image_path: str | None, visual_service, config) -> dict | None:
     if not visual_service:
         raise Exception("Volcengine service not initialized")
     print(f"Generating video for prompt: {prompt[:50]}...")
+    if not (image_path and os.path.exists(image_path)):
+        return None
+    with open(image_path, "rb") as f:
+        img_b64 = base64.b64encode(f.read()).decode("utf-8")
+    body = {
+        "prompt": prompt,
+        "binary_data_base64": [img_b64],
+        "seed": -1,
+        "frames": 121
+    }
     try:
-        if image_path and os.path.exists(image_path):
-            with open(image_path, "rb") as f:
-                img_b64 = base64.b64encode(f.read()).decode("utf-8")
-            body = {
-                "prompt": prompt,
-                "binary_data_base64": [img_b64],
-                "seed": -1,
-                "frames": 121
-            }
-            url, video_data_b64 = _volcengine_sync2async_generate(visual_service, config.volc_video_model, body, req_json=None, timeout_s=600.0, poll_s=5.0, on_progress=progress_callback)
-            if url:
-                return url
-            if video_data_b64:
-                return save_base64_video(video_data_b64, sub_dir=sub_dir)
-            raise Exception("No video content returned from Volcengine")
+        task_id = _volcengine_submit_task(visual_service, config.volc_video_model, body)
     except Exception as e:
         print(f"Video Generation Failed: {e}")
         raise
+    return {"task_id": task_id, "req_key": config.volc_video_model, "visual_service": visual_service, "req_json": None}
+
+def finish_video(result: dict, sub_dir: str | None, save_base64_video: Callable[[str, str | None], str]) -> str:
+    if result.get("url"):
+        return result["url"]
+    if result.get("b64"):
+        return save_base64_video(result["b64"], sub_dir=sub_dir)
+    raise Exception("No video content returned from Volcengine")
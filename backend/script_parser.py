@@ -0,0 +1,399 @@
+import asyncio
+import json
+import os
+import re
+
+from generation_cache import hash_bytes
+from llm_cache import llm_cache
+from providers.executors import short_executor
+import metrics
+
+# Scripts longer than this are split at scene boundaries and parsed chunk by chunk
+PARSE_CHUNK_CHARS = int(os.getenv("PARSE_CHUNK_CHARS", "3000"))
+PARSE_CONCURRENCY = int(os.getenv("PARSE_CONCURRENCY", "4"))
+
+# Bump whenever SYSTEM_PROMPT changes so cached parses of the old template are not reused
+PROMPT_VERSION = "parse-v1"
+SYSTEM_PROMPT = """
+你是一位专业的动画分镜导演。请将用户提供的剧本解析为一系列分镜镜头，并提取出所有出现的角色和场景及其详细视觉描述。
+
+输出必须是一个JSON对象，包含三个字段：
+1. "shots": 镜头列表，每个镜头包含：
+   - prompt: 详细的画面描述，包含镜头角度、光影、人物动作、场景细节。适合用于AI生图。
+   - dialogue: 该镜头的台词（如果有）。
+   - characters: 该镜头中出现的角色名字列表（例如：["陈远", "神秘师兄"]）。如果无角色则为空列表。
+   - scene: 该镜头发生的场景名称（例如："外门练武场", "刻家入口"）。
+
+2. "characters": 角色列表，包含剧本中出现的所有角色。每个角色包含：
+   - name: 角色名字。
+   - prompt: 角色的详细外貌描述（发型、发色、眼睛、衣着、配饰、气质等），用于AI生图。
+
+3. "scenes": 场景列表，包含剧本中出现的所有场景。每个场景包含：
+   - name: 场景名字。
+   - prompt: 场景的详细环境描述（建筑风格、天气、光照、氛围、关键物体等），用于AI生图。
+
+请直接返回JSON对象，不要包含任何Markdown格式或额外文字。
+"""
+
+# Lines that open a new scene: "场景：…", "Scene: …", "第3场", "INT. …", "EXT. …" and markdown headings
+_SCENE_HEADING_RE = re.compile(
+    r"^\s*(?:场景\s*[:：]|scene\s*[:：]|第[0-9一二三四五六七八九十百千]+[场幕]|int\.|ext\.|#{1,3}\s)",
+    re.IGNORECASE
+)
+_NAME_NOISE_RE = re.compile(r"[\s·・•\.\-_'\"“”‘’（）()]+")
+
+def is_scene_heading(line: str) -> bool:
+    return bool(_SCENE_HEADING_RE.match(line))
+
+def normalize_name(name: str) -> str:
+    return _NAME_NOISE_RE.sub("", name or "").casefold()
+
+def strip_code_fences(content: str) -> str:
+    content = content.strip()
+    if content.startswith("```json"):
+        content = content[7:]
+    if content.startswith("```"):
+        content = content[3:]
+    if content.endswith("```"):
+        content = content[:-3]
+    return content.strip()
+
+def split_script(content: str, max_chars: int = PARSE_CHUNK_CHARS) -> list[str]:
+    """Split a script into chunks of whole scenes, each at most ``max_chars`` where possible.
+
+    Consecutive short scenes are packed together. A scene that alone exceeds the limit
+    is cut at line boundaries, and every piece after the first repeats the scene heading
+    so the model still knows where the shots take place.
+    """
+    scenes: list[list[str]] = []
+    for line in content.splitlines():
+        if not scenes or (is_scene_heading(line) and any(l.strip() for l in scenes[-1])):
+            scenes.append([])
+        scenes[-1].append(line)
+
+    pieces: list[str] = []
+    for lines in scenes:
+        heading = lines[0] if is_scene_heading(lines[0]) else None
+        current: list[str] = []
+        size = 0
+        for line in lines:
+            if current and size + len(line) + 1 > max_chars:
+                pieces.append("\n".join(current))
+                current = [heading] if heading else []
+                size = len(heading) + 1 if heading else 0
+            current.append(line)
+            size += len(line) + 1
+        if any(l.strip() for l in current):
+            pieces.append("\n".join(current))
+
+    chunks: list[str] = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + len(piece) + 1 <= max_chars:
+            chunks[-1] += "\n" + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+def mock_parse(content: str) -> dict:
+    """Line-based fallback used when no LLM is configured or a chunk fails to parse."""
+    lines = [line.strip() for line in content.split('\n') if line.strip()]
+    shots = []
+    current_scene = None
+
+    # Simple extraction sets (dicts keep first-seen order)
+    found_chars: dict[str, None] = {}
+    found_scenes: dict[str, None] = {}
+
+    for line in lines:
+        # Simple Scene Detection
+        if line.startswith("场景：") or line.startswith("Scene:") or line.startswith("场景:"):
+            # Extract scene name
+            parts = line.replace("：", ":").split(":", 1)
+            if len(parts) > 1:
+                current_scene = parts[1].strip()
+                found_scenes[current_scene] = None
+            continue
+
+        # Simple Character Detection (very basic, looks for Name: Dialogue)
+        characters = []
+        dialogue = ""
+        prompt = line
+
+        if "：" in line or ":" in line:
+            parts = line.replace("：", ":").split(":", 1)
+            potential_name = parts[0].strip()
+            # If name is short, assume it's a character
+            if len(potential_name) < 10 and " " not in potential_name:
+                characters.append(potential_name)
+                found_chars[potential_name] = None
+                dialogue = parts[1].strip()
+
+        shots.append({"prompt": prompt, "dialogue": dialogue, "characters": characters, "scene": current_scene})
+
+    return {
+        "shots": shots,
+        "characters": [{"name": c, "prompt": f"{c}, anime style character, detailed"} for c in found_chars],
+        "scenes": [{"name": s, "prompt": f"{s}, anime style background, detailed"} for s in found_scenes]
+    }
+
+def chunk_cache_key(model: str, chunk: str) -> str:
+    return llm_cache.make_key(model, PROMPT_VERSION, hash_bytes(chunk))
+
+async def parse_chunk(client, model: str, chunk: str) -> dict:
+    with metrics.provider_call("openai", "llm"):
+        response = await client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": chunk}
+            ],
+            temperature=0.7
+        )
+    data = json.loads(strip_code_fences(response.choices[0].message.content or ""))
+    if not isinstance(data, dict):
+        raise ValueError("LLM response is not a JSON object")
+    return data
+
+def merge_results(results: list[dict]) -> dict:
+    """Merge per-chunk results in chunk order, deduplicating characters and scenes by name.
+
+    Names are compared after normalization (case, whitespace and punctuation), the first
+    spelling seen wins and the most detailed description is kept. Shot references are
+    rewritten to the canonical spelling so they resolve against the merged lists.
+    """
+    def merge_named(key: str) -> tuple[list[dict], dict[str, str]]:
+        merged: dict[str, dict] = {}
+        for result in results:
+            for item in result.get(key) or []:
+                if not isinstance(item, dict):
+                    continue
+                name = str(item.get("name") or "").strip()
+                norm = normalize_name(name)
+                if not norm:
+                    continue
+                prompt = str(item.get("prompt") or "")
+                existing = merged.get(norm)
+                if existing is None:
+                    merged[norm] = {"name": name, "prompt": prompt}
+                elif len(prompt) > len(existing["prompt"]):
+                    existing["prompt"] = prompt
+        return list(merged.values()), {norm: item["name"] for norm, item in merged.items()}
+
+    characters, char_names = merge_named("characters")
+    scenes, scene_names = merge_named("scenes")
+
+    shots = [
+        _shape_shot(item, char_names, scene_names)
+        for result in results for item in result.get("shots") or [] if isinstance(item, dict)
+    ]
+    return {"shots": shots, "characters": characters, "scenes": scenes}
+
+def _shape_shot(item: dict, char_names: dict[str, str], scene_names: dict[str, str]) -> dict:
+    names = []
+    for name in item.get("characters") or []:
+        name = char_names.get(normalize_name(str(name)), str(name).strip())
+        if name and name not in names:
+            names.append(name)
+    scene = item.get("scene")
+    if scene:
+        scene = scene_names.get(normalize_name(str(scene)), str(scene).strip())
+    return {
+        "prompt": str(item.get("prompt") or ""),
+        "dialogue": str(item.get("dialogue") or ""),
+        "characters": names,
+        "scene": scene or None
+    }
+
+async def parse_script(client, model: str, content: str, max_chars: int = PARSE_CHUNK_CHARS, concurrency: int = PARSE_CONCURRENCY) -> dict:
+    """Parse a script into shots, characters and scenes.
+
+    Long scripts are parsed as independent scene chunks, at most ``concurrency`` at a
+    time, so latency grows with the longest chunk instead of the whole script. A chunk
+    whose call fails falls back to ``mock_parse`` on its own without discarding the rest.
+    """
+    if not client:
+        return mock_parse(content)
+
+    chunks = split_script(content, max_chars)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(index: int, chunk: str) -> dict:
+        async with semaphore:
+            key = chunk_cache_key(model, chunk)
+            cached = llm_cache.get(key)
+            if cached is not None:
+                return cached
+            try:
+                data = await parse_chunk(client, model, chunk)
+                await short_executor.run(llm_cache.put, key, data, kind="parse-script")
+                return data
+            except Exception as e:
+                print(f"AI Parse Error (chunk {index + 1}/{len(chunks)}): {e}")
+                return mock_parse(chunk)
+
+    results = await asyncio.gather(*(run(i, chunk) for i, chunk in enumerate(chunks)))
+    return merge_results(list(results))
+
+class JsonItemStream:
+    """Incremental reader for ``{"shots": [{...}], "characters": [{...}], ...}`` text.
+
+    ``feed`` takes raw completion deltas and returns ``(array_key, item)`` for every
+    object inside a top-level array as soon as its closing brace arrives. Text before
+    the first ``{`` (such as a code fence) is ignored.
+    """
+
+    def __init__(self):
+        self._buf: list[str] = []
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = ""
+        self._array_key: str | None = None
+        self._item_start: int | None = None
+
+    def feed(self, text: str) -> list[tuple[str, dict]]:
+        items = []
+        for ch in text:
+            if not self._stack and ch != "{":
+                continue
+            pos = len(self._buf)
+            self._buf.append(ch)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_string = "".join(self._buf[self._string_start + 1:pos])
+                continue
+            if ch == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif ch in "{[":
+                if ch == "[" and len(self._stack) == 1:
+                    self._array_key = self._last_string
+                elif ch == "{" and len(self._stack) == 2 and self._stack[1] == "[":
+                    self._item_start = pos
+                self._stack.append(ch)
+            elif ch in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if ch == "}" and len(self._stack) == 2 and self._item_start is not None:
+                    try:
+                        item = json.loads("".join(self._buf[self._item_start:]))
+                    except ValueError:
+                        item = None
+                    if isinstance(item, dict) and self._array_key:
+                        items.append((self._array_key, item))
+                    self._item_start = None
+        return items
+
+async def stream_chunk(client, model: str, chunk: str):
+    """Yield ``(array_key, item)`` pairs from a streamed completion for one chunk."""
+    # Timed until the stream is drained, i.e. the full completion time
+    with metrics.provider_call("openai", "llm"):
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": chunk}
+            ],
+            temperature=0.7,
+            stream=True
+        )
+        reader = JsonItemStream()
+        async for part in stream:
+            if not part.choices:
+                continue
+            delta = part.choices[0].delta.content
+            if delta:
+                for key, item in reader.feed(delta):
+                    yield key, item
+
+async def stream_script(client, model: str, content: str, max_chars: int = PARSE_CHUNK_CHARS, concurrency: int = PARSE_CONCURRENCY):
+    """Async generator of ``(event, data)`` pairs for a streamed parse.
+
+    Chunks stream concurrently like ``parse_script``. Characters and scenes are emitted
+    the first time a normalized name appears; shots are emitted in script order, so a
+    later chunk's shots are held back until every earlier chunk has finished. The final
+    ``("done", result)`` carries the fully merged result, identical in shape to
+    ``parse_script``. A chunk that fails before producing anything falls back to
+    ``mock_parse``; one that fails midway keeps what it already produced.
+    """
+    chunks = split_script(content, max_chars) if client else [content]
+    results = [{"shots": [], "characters": [], "scenes": []} for _ in chunks]
+    queue: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run(index: int, chunk: str):
+        produced = 0
+        try:
+            cache_key = chunk_cache_key(model, chunk) if client else None
+            cached = llm_cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                for key in ("characters", "scenes", "shots"):
+                    for item in cached.get(key) or []:
+                        if isinstance(item, dict):
+                            produced += 1
+                            await queue.put((index, key, item))
+            elif client:
+                collected = {"shots": [], "characters": [], "scenes": []}
+                try:
+                    async with semaphore:
+                        async for key, item in stream_chunk(client, model, chunk):
+                            if key in collected:
+                                collected[key].append(item)
+                                produced += 1
+                                await queue.put((index, key, item))
+                    if produced:
+                        await short_executor.run(llm_cache.put, cache_key, collected, kind="parse-script")
+                except Exception as e:
+                    print(f"AI Parse Stream Error (chunk {index + 1}/{len(chunks)}): {e}")
+            if not produced:
+                fallback = mock_parse(chunk)
+                for key in ("characters", "scenes", "shots"):
+                    for item in fallback[key]:
+                        await queue.put((index, key, item))
+        finally:
+            await queue.put((index, None, None))
+
+    tasks = [asyncio.create_task(run(i, chunk)) for i, chunk in enumerate(chunks)]
+    char_names: dict[str, str] = {}
+    scene_names: dict[str, str] = {}
+    pending_shots: list[list[dict]] = [[] for _ in chunks]
+    finished = [False] * len(chunks)
+    next_chunk = 0
+    shot_index = 0
+    try:
+        while next_chunk < len(chunks):
+            index, key, item = await queue.get()
+            if key is None:
+                finished[index] = True
+            else:
+                results[index][key].append(item)
+                if key == "shots":
+                    pending_shots[index].append(item)
+                else:
+                    names = char_names if key == "characters" else scene_names
+                    name = str(item.get("name") or "").strip()
+                    norm = normalize_name(name)
+                    if norm and norm not in names:
+                        names[norm] = name
+                        yield key[:-1], {"name": name, "prompt": str(item.get("prompt") or "")}
+            # Flush shots of the earliest unfinished chunk, then move past finished ones
+            while next_chunk < len(chunks):
+                for shot in pending_shots[next_chunk]:
+                    yield "shot", {"index": shot_index, **_shape_shot(shot, char_names, scene_names)}
+                    shot_index += 1
+                pending_shots[next_chunk].clear()
+                if not finished[next_chunk]:
+                    break
+                next_chunk += 1
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    yield "done", merge_results(results)
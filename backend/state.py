@@ -0,0 +1,453 @@
+import json
+import os
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from pydantic import BaseModel
+
+from models import Project, GenerationJob
+import metrics
+
+# "json" keeps everything in data/projects.json (one process); "sqlite" shares state
+# between uvicorn workers and processes on the host
+STATE_BACKEND = os.getenv("STATE_BACKEND", "json")
+STATE_DB = os.getenv("STATE_DB", os.path.join("data", "state.db"))
+# How often a worker looks for changes made by other workers, and renews its job leases
+SYNC_INTERVAL_S = float(os.getenv("STATE_SYNC_INTERVAL_S", "0.5"))
+LEASE_TTL_S = float(os.getenv("JOB_LEASE_TTL_S", "60"))
+JOB_RETENTION_S = 24 * 60 * 60
+# Provider callbacks for a task no worker waits on yet (it can beat the submit response)
+CALLBACK_RETENTION_S = 600
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+remote_changes = metrics.REGISTRY.counter("mochiani_state_remote_changes_total", "Projects updated or deleted in this worker because another worker changed them.", ("change",))
+reaped_leases = metrics.REGISTRY.counter("mochiani_job_leases_reaped_total", "Generation jobs failed because the worker owning them stopped renewing its lease.")
+
+class Conflict(Exception):
+    """Another worker changed a project or shot whose version the save was checked against."""
+
+    def __init__(self, project_id: str, current: Project):
+        self.project_id = project_id
+        self.current = current
+        super().__init__(f"Project {project_id} was modified by another worker")
+
+def merge_model(existing: BaseModel, fresh: BaseModel):
+    """Copy ``fresh`` into ``existing`` in place, keeping the identity of nested models.
+
+    Lists of models with an ``id`` are matched by id, so a generation task holding a Shot
+    or VideoItem keeps writing to the object that stays in the project.
+    """
+    for name in type(existing).model_fields:
+        old = getattr(existing, name)
+        new = getattr(fresh, name)
+        if isinstance(old, BaseModel) and type(old) is type(new):
+            merge_model(old, new)
+        elif isinstance(old, list) and isinstance(new, list) and new and all(isinstance(v, BaseModel) and hasattr(v, "id") for v in new):
+            by_id = {getattr(v, "id", None): v for v in old if isinstance(v, BaseModel)}
+            merged = []
+            for item in new:
+                current = by_id.get(item.id)
+                if current is not None and type(current) is type(item):
+                    merge_model(current, item)
+                    merged.append(current)
+                else:
+                    merged.append(item)
+            setattr(existing, name, merged)
+        elif old != new:
+            setattr(existing, name, new)
+
+def _ids(items: list) -> list | None:
+    """Ids of a list of JSON objects that all have one, else None."""
+    if not all(isinstance(item, dict) and "id" in item for item in items):
+        return None
+    return [item["id"] for item in items]
+
+def _merge_version(base, ours, theirs):
+    if not all(isinstance(v, int) for v in (ours, theirs)):
+        return merge3(base, ours, theirs)
+    base = base if isinstance(base, int) else 0
+    return base + max(0, ours - base) + max(0, theirs - base)
+
+def _version_of(project: dict, shot_id: str | None):
+    if shot_id is None:
+        return project.get("version")
+    return next((shot.get("version") for shot in project.get("shots") or [] if shot.get("id") == shot_id), None)
+
+def merge3(base, ours, theirs):
+    """Three-way merge of JSON values: keep every change either side made relative to
+    ``base``. Lists of objects with ids (shots, characters, video items) are merged by id,
+    so items added or edited on both sides all survive; where both changed the same
+    value, ours wins. Version counters add up both sides' bumps, so the merged object is
+    newer than either side and a client holding either version sees a conflict.
+    """
+    if ours == base:
+        return theirs
+    if theirs == base or ours == theirs:
+        return ours
+    if isinstance(ours, dict) and isinstance(theirs, dict):
+        base = base if isinstance(base, dict) else {}
+        return {key: _merge_version(base.get(key), ours.get(key), theirs.get(key)) if key == "version"
+                else merge3(base.get(key), ours.get(key), theirs.get(key))
+                for key in list(ours) + [k for k in theirs if k not in ours]
+                if key in ours or key not in base}
+    if isinstance(ours, list) and isinstance(theirs, list):
+        base = base if isinstance(base, list) else []
+        base_ids, our_ids, their_ids = _ids(base), _ids(ours), _ids(theirs)
+        if our_ids is not None and their_ids is not None and base_ids is not None:
+            if our_ids == base_ids:
+                order = their_ids
+            elif their_ids == base_ids:
+                order = our_ids
+            else:
+                order = their_ids + [i for i in our_ids if i not in their_ids]
+            # Removed on either side stays removed
+            removed = {i for i in base_ids if i not in our_ids or i not in their_ids}
+            base_by, our_by, their_by = ({item["id"]: item for item in items} for items in (base, ours, theirs))
+            result = []
+            for i in order:
+                if i in removed:
+                    continue
+                if i in our_by and i in their_by:
+                    result.append(merge3(base_by.get(i), our_by[i], their_by[i]))
+                else:
+                    result.append(our_by.get(i) or their_by[i])
+            return result
+    return ours
+
+class JsonStateBackend:
+    """All projects in one JSON file, rewritten on every save. Only safe for one process:
+    other processes neither see the writes nor keep theirs."""
+
+    name = "json"
+    shared = False
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def has_data(self) -> bool:
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def load_projects(self) -> dict[str, Project] | None:
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "r", encoding="utf-8") as f:
+            content = f.read()
+        if not content:
+            print("Warning: DB file is empty")
+            return None
+        try:
+            data = json.loads(content)
+        except json.JSONDecodeError:
+            print("Warning: DB file contains invalid JSON")
+            return None
+        return {pid: Project(**project_data) for pid, project_data in data.items()}
+
+    def save_projects(self, projects: dict[str, Project], checked: dict[str, list[str | None]] | None = None) -> int:
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        # Serialize each project with pydantic's native encoder; json.dump with indent
+        # runs the pure-Python encoder, which dominated saves of large projects
+        body = ",\n".join(
+            f"{json.dumps(pid, ensure_ascii=False)}: {project.model_dump_json(indent=2)}"
+            for pid, project in projects.items()
+        )
+
+        # Atomic write: write to temp file then rename
+        temp_file = f"{self.path}.tmp"
+        with open(temp_file, "w", encoding="utf-8") as f:
+            f.write("{\n" + body + "\n}" if body else "{}")
+            written = f.tell()
+
+        # Replace original file atomically (or near-atomically on Windows)
+        if os.path.exists(self.path):
+            os.replace(temp_file, self.path)
+        else:
+            os.rename(temp_file, self.path)
+        return written
+
+    def changes(self) -> tuple[dict[str, Project], set[str]]:
+        return {}, set()
+
+    # Jobs, leases and callbacks only matter across processes; the in-process JobRegistry
+    # and TaskPoller cover one
+    def put_job(self, job: GenerationJob):
+        pass
+
+    def get_job(self, job_id: str) -> GenerationJob | None:
+        return None
+
+    def acquire_lease(self, key: str, owner: str, job_id: str, ttl: float = LEASE_TTL_S):
+        pass
+
+    def lease_holder(self, key: str) -> tuple[str, str] | None:
+        return None
+
+    def release_lease(self, key: str, job_id: str):
+        pass
+
+    def renew_leases(self, owner: str, ttl: float = LEASE_TTL_S):
+        pass
+
+    def reap_leases(self) -> list[tuple[str, str, str]]:
+        return []
+
+    def shared_secret(self, name: str) -> str | None:
+        return None
+
+    def put_callback(self, provider: str, task_id: str, result: dict):
+        pass
+
+    def take_callbacks(self, keys: list[tuple[str, str]]) -> list[tuple[str, str, dict]]:
+        return []
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "path": self.path, "worker": WORKER_ID}
+
+class SqliteStateBackend:
+    """Projects, job records and job leases in a SQLite database in WAL mode, shared by
+    every worker process on the host.
+
+    Each save writes only the projects whose JSON changed, stamped with a new revision.
+    Other workers notice the commit through ``PRAGMA data_version`` and pull the rows with
+    a newer revision (``changes``). A save of a project another worker saved in the
+    meantime is three-way merged with that version (``merge3``) rather than overwriting
+    it, and the result is copied back into the caller's objects, unless the other worker
+    changed a project or shot the caller checked the version of (``Conflict``). On first
+    use an existing projects.json is imported.
+    """
+
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path: str, import_from: str | None = None):
+        self.path = path
+        self.import_from = import_from
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.RLock()
+        # What this worker last wrote or pulled, per project: JSON text and revision
+        self._saved: dict[str, str] = {}
+        self._revs: dict[str, int] = {}
+        self._seen_rev = 0
+        self._data_version = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+                INSERT OR IGNORE INTO meta (key, value) VALUES ('rev', 0);
+                CREATE TABLE IF NOT EXISTS projects (id TEXT PRIMARY KEY, rev INTEGER NOT NULL, data TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS deleted (id TEXT PRIMARY KEY, rev INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, job_id TEXT NOT NULL, expires REAL NOT NULL);
+                CREATE TABLE IF NOT EXISTS secrets (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+                CREATE TABLE IF NOT EXISTS callbacks (provider TEXT NOT NULL, task_id TEXT NOT NULL, data TEXT NOT NULL, received REAL NOT NULL, PRIMARY KEY (provider, task_id));
+            """)
+            self._conn = conn
+        return self._conn
+
+    @contextmanager
+    def _write(self):
+        """One write transaction; BEGIN IMMEDIATE serializes writers across processes."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def has_data(self) -> bool:
+        with self._lock:
+            return self._connection().execute("SELECT 1 FROM projects LIMIT 1").fetchone() is not None
+
+    def load_projects(self) -> dict[str, Project] | None:
+        if not self.has_data() and self.import_from:
+            legacy = JsonStateBackend(self.import_from)
+            projects = legacy.load_projects() if legacy.has_data() else None
+            if projects:
+                print(f"Importing {len(projects)} projects from {self.import_from} into {self.path}")
+                self.save_projects(projects)
+        with self._lock:
+            conn = self._connection()
+            self._data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+            rows = conn.execute("SELECT id, rev, data FROM projects").fetchall()
+            self._seen_rev = conn.execute("SELECT value FROM meta WHERE key = 'rev'").fetchone()[0]
+            self._saved = {pid: data for pid, _, data in rows}
+            self._revs = {pid: rev for pid, rev, _ in rows}
+        if not rows:
+            return None
+        return {pid: Project.model_validate_json(data) for pid, _, data in rows}
+
+    def save_projects(self, projects: dict[str, Project], checked: dict[str, list[str | None]] | None = None) -> int:
+        """Write the changed projects. ``checked`` maps a project id to the shot ids (None for
+        the project itself) whose version the caller checked: if another worker changed one
+        of those since we last saw it, nothing is written and ``Conflict`` is raised instead
+        of merging."""
+        with self._lock:
+            return self._save_projects(projects, checked or {})
+
+    def _save_projects(self, projects: dict[str, Project], checked: dict[str, list[str | None]]) -> int:
+        serialized = {pid: project.model_dump_json() for pid, project in projects.items()}
+        changed = {pid: data for pid, data in serialized.items() if self._saved.get(pid) != data}
+        removed = [pid for pid in self._saved if pid not in serialized]
+        if not changed and not removed:
+            return 0
+        merged: dict[str, Project] = {}
+        with self._write() as conn:
+            rev = conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'rev' RETURNING value").fetchone()[0]
+            for pid in list(changed):
+                row = conn.execute("SELECT rev, data FROM projects WHERE id = ?", (pid,)).fetchone()
+                if row is None:
+                    gone = conn.execute("SELECT rev FROM deleted WHERE id = ?", (pid,)).fetchone()
+                    if gone and gone[0] > self._revs.get(pid, 0):
+                        # Deleted by another worker after we last saw it: the delete wins
+                        del changed[pid]
+                        projects.pop(pid, None)
+                        self._saved.pop(pid, None)
+                        self._revs[pid] = gone[0]
+                    continue
+                if row[0] > self._revs.get(pid, 0):
+                    # Another worker saved this project since we last saw it: combine both edits
+                    base, theirs = json.loads(self._saved.get(pid) or "{}"), json.loads(row[1])
+                    if any(_version_of(base, key) != _version_of(theirs, key) for key in checked.get(pid, ())):
+                        # The caller's version check is stale; hand back their copy instead
+                        self._saved[pid] = row[1]
+                        self._revs[pid] = row[0]
+                        raise Conflict(pid, Project.model_validate(theirs))
+                    combined = Project.model_validate(merge3(base, json.loads(changed[pid]), theirs))
+                    merged[pid] = combined
+                    changed[pid] = combined.model_dump_json()
+            conn.executemany(
+                "INSERT INTO projects (id, rev, data) VALUES (?, ?, ?) ON CONFLICT(id) DO UPDATE SET rev = excluded.rev, data = excluded.data",
+                [(pid, rev, data) for pid, data in changed.items()]
+            )
+            conn.executemany("DELETE FROM deleted WHERE id = ?", [(pid,) for pid in changed])
+            conn.executemany("DELETE FROM projects WHERE id = ?", [(pid,) for pid in removed])
+            conn.executemany("INSERT OR REPLACE INTO deleted (id, rev) VALUES (?, ?)", [(pid, rev) for pid in removed])
+        for pid, data in changed.items():
+            self._saved[pid] = data
+            self._revs[pid] = rev
+        for pid in removed:
+            self._saved.pop(pid, None)
+            self._revs[pid] = rev
+        for pid, combined in merged.items():
+            merge_model(projects[pid], combined)
+        return sum(len(data) for data in changed.values())
+
+    def changes(self) -> tuple[dict[str, Project], set[str]]:
+        """Projects other workers saved or deleted since the last call (cheap when none)."""
+        with self._lock:
+            conn = self._connection()
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return {}, set()
+            self._data_version = version
+            rows = conn.execute("SELECT id, rev, data FROM projects WHERE rev > ?", (self._seen_rev,)).fetchall()
+            deleted_rows = conn.execute("SELECT id, rev FROM deleted WHERE rev > ?", (self._seen_rev,)).fetchall()
+            updated, deleted = {}, set()
+            for pid, rev, data in rows:
+                self._seen_rev = max(self._seen_rev, rev)
+                # Our own writes come back too; skip them and anything older than what we hold
+                if self._revs.get(pid, 0) >= rev:
+                    continue
+                self._revs[pid] = rev
+                self._saved[pid] = data
+                updated[pid] = data
+            for pid, rev in deleted_rows:
+                self._seen_rev = max(self._seen_rev, rev)
+                if self._revs.get(pid, 0) >= rev:
+                    continue
+                self._revs[pid] = rev
+                self._saved.pop(pid, None)
+                deleted.add(pid)
+        return {pid: Project.model_validate_json(data) for pid, data in updated.items()}, deleted
+
+    def put_job(self, job: GenerationJob):
+        with self._write() as conn:
+            conn.execute("INSERT OR REPLACE INTO jobs (id, data, updated) VALUES (?, ?, ?)", (job.id, job.model_dump_json(), time.time()))
+
+    def get_job(self, job_id: str) -> GenerationJob | None:
+        with self._lock:
+            row = self._connection().execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return GenerationJob.model_validate_json(row[0]) if row else None
+
+    def acquire_lease(self, key: str, owner: str, job_id: str, ttl: float = LEASE_TTL_S):
+        with self._write() as conn:
+            conn.execute("INSERT OR REPLACE INTO leases (key, owner, job_id, expires) VALUES (?, ?, ?, ?)", (key, owner, job_id, time.time() + ttl))
+
+    def lease_holder(self, key: str) -> tuple[str, str] | None:
+        """``(owner, job_id)`` of a live lease on ``key``."""
+        with self._lock:
+            row = self._connection().execute("SELECT owner, job_id FROM leases WHERE key = ? AND expires > ?", (key, time.time())).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def release_lease(self, key: str, job_id: str):
+        with self._write() as conn:
+            conn.execute("DELETE FROM leases WHERE key = ? AND job_id = ?", (key, job_id))
+
+    def renew_leases(self, owner: str, ttl: float = LEASE_TTL_S):
+        with self._write() as conn:
+            conn.execute("UPDATE leases SET expires = ? WHERE owner = ?", (time.time() + ttl, owner))
+
+    def reap_leases(self) -> list[tuple[str, str, str]]:
+        """Take over expired leases (their owner died): ``[(key, owner, job_id)]``. Each
+        expired lease is returned to exactly one caller."""
+        now = time.time()
+        with self._write() as conn:
+            expired = conn.execute("SELECT key, owner, job_id FROM leases WHERE expires <= ?", (now,)).fetchall()
+            conn.execute("DELETE FROM leases WHERE expires <= ?", (now,))
+            conn.execute("DELETE FROM jobs WHERE updated < ?", (now - JOB_RETENTION_S,))
+        return [tuple(row) for row in expired]
+
+    def shared_secret(self, name: str) -> str:
+        """A random secret that every worker on this database gets, created by the first to ask."""
+        with self._write() as conn:
+            conn.execute("INSERT OR IGNORE INTO secrets (key, value) VALUES (?, ?)", (name, secrets.token_hex(32)))
+            return conn.execute("SELECT value FROM secrets WHERE key = ?", (name,)).fetchone()[0]
+
+    def put_callback(self, provider: str, task_id: str, result: dict):
+        """Hand a provider callback that reached this worker to the worker waiting on the task."""
+        now = time.time()
+        with self._write() as conn:
+            conn.execute("INSERT OR REPLACE INTO callbacks (provider, task_id, data, received) VALUES (?, ?, ?, ?)", (provider, task_id, json.dumps(result), now))
+            conn.execute("DELETE FROM callbacks WHERE received < ?", (now - CALLBACK_RETENTION_S,))
+
+    def take_callbacks(self, keys: list[tuple[str, str]]) -> list[tuple[str, str, dict]]:
+        """Remove and return the stored callbacks for any of ``keys`` (``(provider, task_id)``)."""
+        keys = set(keys)
+        with self._lock:
+            stored = self._connection().execute("SELECT provider, task_id FROM callbacks").fetchall()
+        mine = [key for key in map(tuple, stored) if key in keys]
+        if not mine:
+            return []
+        taken = []
+        with self._write() as conn:
+            for provider, task_id in mine:
+                row = conn.execute("DELETE FROM callbacks WHERE provider = ? AND task_id = ? RETURNING data", (provider, task_id)).fetchone()
+                if row:
+                    taken.append((provider, task_id, json.loads(row[0])))
+        return taken
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connection()
+            leases = conn.execute("SELECT owner, COUNT(*) FROM leases WHERE expires > ? GROUP BY owner", (time.time(),)).fetchall()
+        return {"backend": self.name, "path": self.path, "worker": WORKER_ID, "revision": self._seen_rev, "leases": dict(leases)}
+
+def open_backend(json_path: str):
+    if STATE_BACKEND == "sqlite":
+        return SqliteStateBackend(STATE_DB, import_from=json_path)
+    if STATE_BACKEND != "json":
+        print(f"Unknown STATE_BACKEND {STATE_BACKEND!r}, using json")
+    return JsonStateBackend(json_path)
@@ -93,18 +93,29 @@ def test_api():
             print_pass("Trigger Generation Task")
             
             # Wait for async task
-            print("   Waiting 4 seconds for generation...")
-            time.sleep(4)
+            job_id = response.json().get("job_id")
+            print("   Waiting for generation job...")
+            job = {}
+            for _ in range(60):
+                job = requests.get(f"{BASE_URL}/jobs/{job_id}").json()
+                if job.get("status") in ("completed", "failed"):
+                    break
+                time.sleep(1)
                 
-            # Verify result
+            # Verify result: real images, or a failure reported as such (no placeholder images)
             response = requests.get(f"{BASE_URL}/projects/{PROJECT_ID}")
             project = response.json()
             target_shot = next((s for s in project['shots'] if s['id'] == new_shot_id), None)
+            candidates = (target_shot.get('image_candidates') or []) if target_shot else []
             
-            if target_shot and "picsum.photos" in target_shot['image_url']:
+            if any("picsum.photos" in url for url in candidates):
+                 print_fail("Generation Result Verification Failed (placeholder image stored)")
+            elif job.get("status") == "completed" and target_shot['image_url'] in candidates:
                  print_pass("Generation Result Verified")
+            elif job.get("status") == "failed" and job.get("error") and target_shot['status'] == "failed":
+                 print_pass(f"Generation Failure Reported ({job['error'][:80]})")
             else:
-                 print_fail("Generation Result Verification Failed (Image URL not updated)")
+                 print_fail(f"Generation Result Verification Failed (job {job.get('status')})")
 
         else:
             print_fail(f"Trigger Generation (Status: {response.status_code})")
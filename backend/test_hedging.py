@@ -0,0 +1,94 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from providers.executors import BoundedExecutor
+from providers.hedging import Hedger
+from providers.pool import ProviderPool, ProviderAccount
+
+def print_pass(message):
+    print(f"✅ PASS: {message}")
+
+def print_fail(message):
+    print(f"❌ FAIL: {message}")
+
+def _account(name: str, modality: str, provider: str) -> ProviderAccount:
+    config = SimpleNamespace(**{f"{modality}_provider": provider})
+    return ProviderAccount(name, modality, config, max_concurrency=1)
+
+async def test_hedging():
+    print("--- Starting Hedging Tests ---")
+    pool = ProviderPool()
+    primary = _account("primary", "image", "vectorengine")
+    secondary = _account("secondary", "image_hedge", "volcengine")
+    pool.configure("image", [primary])
+    pool.configure("image_hedge", [secondary])
+
+    async def slow(account):
+        await asyncio.sleep(5)
+        return "primary.png"
+
+    async def fast(account):
+        return "secondary.png"
+
+    # 1. The secondary answers first once the primary is slower than the hedge delay
+    result, provider = await Hedger().run(
+        "vectorengine", lambda: pool.run("image", slow),
+        "volcengine", lambda: pool.run("image_hedge", fast),
+        delay=0.05
+    )
+    if (result, provider) == ("secondary.png", "volcengine"):
+        print_pass("Hedge wins over a slow primary")
+    else:
+        print_fail(f"Hedge returned {result} from {provider}")
+
+    # 2. The cancelled primary call gives its concurrency slot back
+    await asyncio.sleep(0.01)
+    if primary.in_flight == 0 and secondary.in_flight == 0:
+        print_pass("Losing call released its account")
+    else:
+        print_fail(f"Accounts still in flight after the hedge: primary={primary.in_flight} secondary={secondary.in_flight}")
+    try:
+        account = await asyncio.wait_for(pool.acquire("image"), timeout=1.0)
+        pool.release(account)
+        print_pass("max_concurrency=1 account can be acquired again")
+    except asyncio.TimeoutError:
+        print_fail("Primary account stayed busy after losing the hedge")
+
+    # 3. A cancellation is not a 429 and does not start a cooldown
+    if primary.rate.cooldown_until == 0.0 and primary.errors == 0:
+        print_pass("Cancelled call counted as neither success nor failure")
+    else:
+        print_fail(f"Cancelled call changed the account: errors={primary.errors} cooldown_until={primary.rate.cooldown_until}")
+
+    # 4. A losing call that is blocking in an executor thread keeps its slot until the thread ends
+    executor = BoundedExecutor("test-hedge", 2)
+
+    async def blocking(account):
+        return await executor.run(time.sleep, 0.5) or "primary.png"
+
+    start = time.perf_counter()
+    result, provider = await Hedger().run(
+        "vectorengine", lambda: pool.run("image", blocking),
+        "volcengine", lambda: pool.run("image_hedge", fast),
+        delay=0.05
+    )
+    elapsed = time.perf_counter() - start
+    if provider == "volcengine" and elapsed < 0.3:
+        print_pass(f"Hedge result returned at once ({elapsed:.2f}s) while the primary thread runs on")
+    else:
+        print_fail(f"Hedge returned {result} from {provider} after {elapsed:.2f}s")
+    await asyncio.sleep(0.05)
+    if primary.in_flight == 1:
+        print_pass("Primary slot stays held while its executor thread is still running")
+    else:
+        print_fail(f"Primary in_flight={primary.in_flight} while its thread is still running")
+    await asyncio.sleep(0.6)
+    if primary.in_flight == 0 and executor.active == 0:
+        print_pass("Primary slot released once the orphaned thread finished")
+    else:
+        print_fail(f"After the thread finished: primary in_flight={primary.in_flight} executor active={executor.active}")
+    print("--- Tests Completed ---")
+
+if __name__ == "__main__":
+    asyncio.run(test_hedging())
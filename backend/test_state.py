@@ -0,0 +1,144 @@
+import os
+import tempfile
+
+import state
+from models import Project, Shot
+
+def print_pass(message):
+    print(f"✅ PASS: {message}")
+
+def print_fail(message):
+    print(f"❌ FAIL: {message}")
+
+def _workers():
+    """Two backends on one fresh database, as two uvicorn workers would have them, both
+    holding the same three-shot project."""
+    path = os.path.join(tempfile.mkdtemp(prefix="test_state_"), "state.db")
+    a, b = state.SqliteStateBackend(path), state.SqliteStateBackend(path)
+    shots = [Shot(id=f"s{i}", order=i, prompt=f"shot {i}") for i in range(1, 4)]
+    a.save_projects({"p": Project(id="p", name="merge", shots=shots)})
+    return a, a.load_projects(), b, b.load_projects()
+
+def _shot(project: Project, shot_id: str) -> Shot | None:
+    return next((s for s in project.shots if s.id == shot_id), None)
+
+def _stored(backend) -> Project:
+    return state.SqliteStateBackend(backend.path).load_projects()["p"]
+
+def test_state():
+    print("--- Starting State Backend Tests ---")
+
+    # 1. Both workers add a shot and edit a different existing one
+    a, db_a, b, db_b = _workers()
+    db_a["p"].shots.append(Shot(id="a-new", order=3, prompt="from a"))
+    _shot(db_a["p"], "s1").dialogue = "edited by a"
+    db_b["p"].shots.append(Shot(id="b-new", order=3, prompt="from b"))
+    _shot(db_b["p"], "s2").dialogue = "edited by b"
+    a.save_projects(db_a)
+    b.save_projects(db_b)
+    stored = _stored(b)
+    ids = [s.id for s in stored.shots]
+    if set(ids) == {"s1", "s2", "s3", "a-new", "b-new"} and _shot(stored, "s1").dialogue == "edited by a" and _shot(stored, "s2").dialogue == "edited by b":
+        print_pass("Concurrent adds and edits from both workers all survive")
+    else:
+        print_fail(f"Concurrent adds and edits merged to {[(s.id, s.dialogue) for s in stored.shots]}")
+    if [s.id for s in db_b["p"].shots] == ids:
+        print_pass("Merged project copied back into the saving worker's objects")
+    else:
+        print_fail(f"Saving worker holds {[s.id for s in db_b['p'].shots]}, stored {ids}")
+    updated, _ = a.changes()
+    if "p" in updated and [s.id for s in updated["p"].shots] == ids:
+        print_pass("Other worker pulls the merged project")
+    else:
+        print_fail(f"Other worker pulled {updated}")
+
+    # 2. A shot deleted on one worker while the other edits it stays deleted, in either order
+    for first in ("delete", "edit"):
+        a, db_a, b, db_b = _workers()
+        db_a["p"].shots = [s for s in db_a["p"].shots if s.id != "s2"]
+        _shot(db_b["p"], "s2").dialogue = "edited"
+        _shot(db_b["p"], "s3").dialogue = "kept"
+        saves = [(a, db_a), (b, db_b)] if first == "delete" else [(b, db_b), (a, db_a)]
+        for backend, projects in saves:
+            backend.save_projects(projects)
+        stored = _stored(a)
+        if [s.id for s in stored.shots] == ["s1", "s3"] and _shot(stored, "s3").dialogue == "kept":
+            print_pass(f"Delete beats a concurrent edit ({first} saved first)")
+        else:
+            print_fail(f"Delete vs edit ({first} first) stored {[(s.id, s.dialogue) for s in stored.shots]}")
+
+    # 3. A reorder on one worker and an edit on the other both apply
+    a, db_a, b, db_b = _workers()
+    db_a["p"].shots = list(reversed(db_a["p"].shots))
+    for i, shot in enumerate(db_a["p"].shots):
+        shot.order = i
+    _shot(db_b["p"], "s1").dialogue = "edited"
+    a.save_projects(db_a)
+    b.save_projects(db_b)
+    stored = _stored(b)
+    if [s.id for s in stored.shots] == ["s3", "s2", "s1"] and _shot(stored, "s1").dialogue == "edited" and _shot(stored, "s1").order == 2:
+        print_pass("Reorder and a concurrent edit both kept")
+    else:
+        print_fail(f"Reorder vs edit stored {[(s.id, s.order, s.dialogue) for s in stored.shots]}")
+
+    # 4. Versions add up both workers' bumps, so neither side's version still matches
+    a, db_a, b, db_b = _workers()
+    base_project, base_shot = db_a["p"].version, _shot(db_a["p"], "s1").version
+    db_a["p"].name = "renamed by a"
+    db_a["p"].version += 2
+    _shot(db_a["p"], "s1").prompt = "prompt by a"
+    _shot(db_a["p"], "s1").version += 1
+    db_b["p"].style = "watercolor"
+    db_b["p"].version += 1
+    _shot(db_b["p"], "s1").dialogue = "dialogue by b"
+    _shot(db_b["p"], "s1").version += 1
+    a.save_projects(db_a)
+    b.save_projects(db_b)
+    stored = _stored(a)
+    if stored.version == base_project + 3 and _shot(stored, "s1").version == base_shot + 2:
+        print_pass(f"Versions sum both sides' bumps (project {stored.version}, shot {_shot(stored, 's1').version})")
+    else:
+        print_fail(f"Merged versions project={stored.version} shot={_shot(stored, 's1').version}, expected {base_project + 3} and {base_shot + 2}")
+    if (stored.name, stored.style, _shot(stored, "s1").prompt, _shot(stored, "s1").dialogue) == ("renamed by a", "watercolor", "prompt by a", "dialogue by b"):
+        print_pass("Edits to different fields of the same objects all kept")
+    else:
+        print_fail(f"Field edits merged to {stored.name!r} {stored.style!r} {_shot(stored, 's1')}")
+
+    # 5. A save checked against a shot the other worker changed is refused, not merged
+    a, db_a, b, db_b = _workers()
+    _shot(db_a["p"], "s1").dialogue = "by a"
+    _shot(db_a["p"], "s1").version += 1
+    a.save_projects(db_a)
+    _shot(db_b["p"], "s1").dialogue = "by b"
+    _shot(db_b["p"], "s1").version += 1
+    try:
+        b.save_projects(db_b, {"p": ["s1"]})
+        print_fail("Stale version check merged instead of raising Conflict")
+    except state.Conflict as e:
+        if _shot(e.current, "s1").dialogue == "by a" and _shot(_stored(a), "s1").dialogue == "by a":
+            print_pass("Stale version check raises Conflict and writes nothing")
+        else:
+            print_fail(f"Conflict carried {_shot(e.current, 's1')}, stored {_shot(_stored(a), 's1')}")
+    _shot(db_b["p"], "s2").dialogue = "by b"
+    try:
+        b.save_projects(db_b, {"p": ["s2"]})
+        print_pass("Check on an untouched shot still merges")
+    except state.Conflict:
+        print_fail("Check on an untouched shot raised Conflict")
+
+    # 6. Webhook secret and callbacks are shared between workers
+    a, _, b, _ = _workers()
+    if a.shared_secret("webhook") == b.shared_secret("webhook"):
+        print_pass("Workers share one webhook secret")
+    else:
+        print_fail("Workers got different webhook secrets")
+    a.put_callback("openai", "job-1", {"state": "done", "url": "video.mp4"})
+    taken = b.take_callbacks([("openai", "job-1"), ("openai", "job-2")])
+    if taken == [("openai", "job-1", {"state": "done", "url": "video.mp4"})] and not b.take_callbacks([("openai", "job-1")]):
+        print_pass("Callback received by one worker is taken once by the waiting worker")
+    else:
+        print_fail(f"Callback handoff returned {taken}")
+    print("--- Tests Completed ---")
+
+if __name__ == "__main__":
+    test_state()
@@ -0,0 +1,111 @@
+import asyncio
+import socket
+import uuid
+
+import uvicorn
+
+import main
+import webhooks
+from fake_providers import FakeOpenAIVideo
+from providers import openai_provider
+
+JOB_SECONDS = 3.0
+# Compress the 5 s production poll interval so the polling baseline finishes in JOB_SECONDS
+POLL_INTERVAL_S = JOB_SECONDS / 150
+
+def print_pass(message):
+    print(f"✅ PASS: {message}")
+
+def print_fail(message):
+    print(f"❌ FAIL: {message}")
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _video_config(base_url: str):
+    config = main.ApiConfig(**main.current_api_config.model_dump())
+    config.video_provider = "openai"
+    config.openai_video_api_base = base_url
+    config.openai_video_api_key = "test-key"
+    config.openai_video_model = "veo3"
+    config.openai_video_endpoint = "/v1/videos"
+    return config
+
+async def _generate(config, webhook_url: str | None, job_id: str | None) -> str:
+    return await openai_provider.generate_video(
+        prompt="webhook test",
+        image_path=None,
+        sub_dir=None,
+        source_url=None,
+        video_client=object(),
+        config=config,
+        save_video_bytes=lambda data, sub_dir=None: "saved-bytes",
+        save_base64_video=lambda data, sub_dir=None: "saved-b64",
+        webhook_url=webhook_url,
+        job_id=job_id
+    )
+
+async def test_webhook():
+    print("--- Starting Webhook Tests ---")
+    port = _free_port()
+    app_base = f"http://127.0.0.1:{port}"
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+    # After startup, which loads the API config
+    main.current_api_config.webhook_secret = "test-secret"
+
+    fake = FakeOpenAIVideo(job_seconds=JOB_SECONDS).start()
+    config = _video_config(fake.base_url)
+    try:
+        # 1. Polling baseline
+        default_interval = openai_provider.VIDEO_POLL_INTERVAL_S
+        openai_provider.VIDEO_POLL_INTERVAL_S = POLL_INTERVAL_S
+        try:
+            url = await _generate(config, None, None)
+        finally:
+            openai_provider.VIDEO_POLL_INTERVAL_S = default_interval
+        polled = fake.total_requests()
+        if url.endswith(".mp4"):
+            print_pass(f"Polling completes ({polled} upstream requests for one video)")
+        else:
+            print_fail(f"Polling returned unexpected url: {url}")
+
+        # 2. Webhook: the stand-in calls back, the 60 s safety-net poll never fires
+        fake.requests.clear()
+        job_id = str(uuid.uuid4())
+        webhook_url = f"{app_base}/webhooks/openai/{job_id}?token={webhooks.sign(main.current_api_config, 'openai', job_id)}"
+        url = await _generate(config, webhook_url, job_id)
+        pushed = fake.total_requests() - fake.requests["CALLBACK"]
+        if url.endswith(".mp4") and fake.requests["CALLBACK"] == 1:
+            print_pass(f"Webhook completes ({pushed} upstream request(s) + 1 callback, was {polled})")
+        else:
+            print_fail(f"Webhook flow: url={url} requests={dict(fake.requests)}")
+
+        # 3. Bad signatures are rejected
+        bad = await asyncio.to_thread(_post_status, f"{app_base}/webhooks/openai/{job_id}?token=forged")
+        if bad == 403:
+            print_pass("Forged webhook token rejected")
+        else:
+            print_fail(f"Forged webhook token returned {bad}")
+    finally:
+        fake.stop()
+        server.should_exit = True
+        await serve_task
+    print("--- Tests Completed ---")
+
+def _post_status(url: str) -> int:
+    import urllib.error
+    import urllib.request
+    req = urllib.request.Request(url, data=b"{}", headers={"Content-Type": "application/json"}, method="POST")
+    try:
+        with urllib.request.urlopen(req, timeout=10) as resp:
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+if __name__ == "__main__":
+    asyncio.run(test_webhook())
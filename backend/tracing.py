@@ -0,0 +1,213 @@
+import contextvars
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+MAX_TRACES = int(os.getenv("MAX_TRACES", "1000"))
+SERVICE_NAME = "mochiani-backend"
+SCOPE_NAME = "mochiani.generation"
+
+# OTLP span kinds and status codes
+KIND_INTERNAL = 1
+KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "status", "message")
+
+    def __init__(self, trace: "Trace", name: str, parent_id: str | None, kind: int, attributes: dict, start_ns: int | None = None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns: int | None = None
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.status = STATUS_UNSET
+        self.message = ""
+
+    def set(self, **attributes):
+        self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def end(self, error: BaseException | None = None, end_ns: int | None = None):
+        if self.end_ns is not None:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        if error is not None:
+            self.fail(str(error) or type(error).__name__)
+        elif self.status == STATUS_UNSET:
+            self.status = STATUS_OK
+
+    def fail(self, message: str):
+        self.status = STATUS_ERROR
+        self.message = message
+
+    def summary(self) -> dict:
+        end_ns = self.end_ns or time.time_ns()
+        return {
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start": self.start_ns / 1e9,
+            "duration_ms": round((end_ns - self.start_ns) / 1e6, 3),
+            "ended": self.end_ns is not None,
+            "status": {STATUS_OK: "ok", STATUS_ERROR: "error"}.get(self.status, "unset"),
+            "message": self.message or None,
+            "attributes": self.attributes
+        }
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or time.time_ns()),
+            "attributes": _otlp_attributes(self.attributes),
+            "status": {"code": self.status}
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.message:
+            span["status"]["message"] = self.message
+        return span
+
+class Trace:
+    """Spans recorded for one generation job. Spans may end on worker threads."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.trace_id = os.urandom(16).hex()
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> Span:
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def snapshot(self) -> list[Span]:
+        with self._lock:
+            return sorted(self.spans, key=lambda s: s.start_ns)
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(attributes: dict) -> list[dict]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()]
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar("current_span", default=None)
+
+class Tracer:
+    """Per-job stage timing for the generation pipeline.
+
+    ``start_trace`` opens the root span of a job; ``span`` opens a child of whatever span
+    is current in the calling context, so stages nest across awaits, ``asyncio.gather``
+    and the provider executors (which copy the caller's context). Outside a traced job
+    ``span`` does nothing, so shared helpers can be instrumented unconditionally.
+    Traces are kept in memory for the most recent ``max_traces`` jobs.
+    """
+
+    def __init__(self, max_traces: int = MAX_TRACES):
+        self.max_traces = max_traces
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, job_id: str | None) -> Trace | None:
+        if not job_id:
+            return None
+        return self._traces.get(job_id)
+
+    @contextmanager
+    def start_trace(self, job_id: str | None, name: str, start: float | None = None, **attributes):
+        """Open a job's root span; ``start`` (epoch seconds) backdates it, e.g. to job creation."""
+        if not job_id:
+            yield None
+            return
+        trace = Trace(job_id)
+        with self._lock:
+            self._traces[job_id] = trace
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+        root = trace.add(Span(trace, name, None, KIND_INTERNAL, {"job.id": job_id, **attributes}, start_ns=int(start * 1e9) if start else None))
+        token = _current_span.set(root)
+        try:
+            yield root
+        except BaseException as e:
+            root.end(error=e)
+            raise
+        finally:
+            _current_span.reset(token)
+            root.end()
+
+    @contextmanager
+    def span(self, name: str, client: bool = False, **attributes):
+        parent = _current_span.get()
+        if parent is None:
+            yield None
+            return
+        span = parent.trace.add(Span(parent.trace, name, parent.span_id, KIND_CLIENT if client else KIND_INTERNAL, attributes))
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.end(error=e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def record(self, name: str, start: float, end: float, **attributes):
+        """Add an already finished child span from wall-clock timestamps (seconds)."""
+        parent = _current_span.get()
+        if parent is None or not start or not end:
+            return
+        span = parent.trace.add(Span(parent.trace, name, parent.span_id, KIND_INTERNAL, attributes, start_ns=int(start * 1e9)))
+        span.end(end_ns=int(end * 1e9))
+
+    def set(self, **attributes):
+        """Tag the current span and the job's root span (e.g. provider and model once known)."""
+        span = _current_span.get()
+        if span is None:
+            return
+        span.set(**attributes)
+        root = span.trace.spans[0]
+        if root is not span:
+            root.set(**attributes)
+
+    def summary(self, job_id: str) -> dict | None:
+        trace = self.get(job_id)
+        if not trace:
+            return None
+        return {"job_id": job_id, "trace_id": trace.trace_id, "spans": [s.summary() for s in trace.snapshot()]}
+
+    def export_otlp(self, job_id: str) -> dict | None:
+        """The job's trace as an OTLP/JSON ``ExportTraceServiceRequest``."""
+        trace = self.get(job_id)
+        if not trace:
+            return None
+        return {
+            "resourceSpans": [{
+                "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+                "scopeSpans": [{
+                    "scope": {"name": SCOPE_NAME},
+                    "spans": [s.to_otlp() for s in trace.snapshot()]
+                }]
+            }]
+        }
+
+tracer = Tracer()
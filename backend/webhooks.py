@@ -0,0 +1,47 @@
+import hashlib
+import hmac
+import ipaddress
+import secrets
+from urllib.parse import urlparse, quote
+
+# Used when no webhook_secret is configured. A single process makes up its own, so
+# callbacks for jobs started before a restart fail verification and those jobs finish
+# through the polling safety net; workers sharing a state backend use the one stored there.
+_fallback_secret = secrets.token_hex(32)
+
+def use_fallback_secret(secret: str):
+    global _fallback_secret
+    _fallback_secret = secret
+
+def _secret(config) -> bytes:
+    return (getattr(config, "webhook_secret", "") or _fallback_secret).encode("utf-8")
+
+def sign(config, provider: str, job_id: str) -> str:
+    return hmac.new(_secret(config), f"{provider}:{job_id}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+def verify(config, provider: str, job_id: str, token: str | None) -> bool:
+    if not token:
+        return False
+    return hmac.compare_digest(sign(config, provider, job_id), token)
+
+def is_public_url(url: str | None) -> bool:
+    if not url:
+        return False
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        return False
+    host = parsed.hostname
+    if host == "localhost" or host.endswith(".local") or host.endswith(".localhost"):
+        return False
+    try:
+        ip = ipaddress.ip_address(host)
+    except ValueError:
+        return True
+    return ip.is_global
+
+def callback_url(config, provider: str, job_id: str | None) -> str | None:
+    base = getattr(config, "public_base_url", "") or ""
+    if not job_id or not is_public_url(base):
+        return None
+    token = sign(config, provider, job_id)
+    return f"{base.rstrip('/')}/webhooks/{quote(provider)}/{quote(job_id)}?token={token}"
@@ -4,14 +4,23 @@ import { Film, Plus } from 'lucide-react';
 const AddScriptModal = ({ isOpen, onClose, onSubmit }) => {
     const [content, setContent] = useState("");
     const [isParsing, setIsParsing] = useState(false);
+    const [parsedShots, setParsedShots] = useState([]);
+    const [parsedCounts, setParsedCounts] = useState({ character: 0, scene: 0 });
 
     if (!isOpen) return null;
 
     const handleSubmit = async () => {
         if (!content.trim()) return;
         setIsParsing(true);
-        await onSubmit(content);
+        setParsedShots([]);
+        setParsedCounts({ character: 0, scene: 0 });
+        // Shots, characters and scenes arrive one by one while the script is parsed
+        await onSubmit(content, (type, data) => {
+            if (type === 'shot') setParsedShots(prev => [...prev, data]);
+            else if (type === 'character' || type === 'scene') setParsedCounts(prev => ({ ...prev, [type]: prev[type] + 1 }));
+        });
         setIsParsing(false);
+        setParsedShots([]);
         setContent("");
         onClose();
     };
@@ -39,7 +48,20 @@ const AddScriptModal = ({ isOpen, onClose, onSubmit }) => {
 ..."
                         value={content}
                         onChange={e => setContent(e.target.value)}
+                        disabled={isParsing}
                     />
+                    {isParsing && (
+                        <div className="bg-dark-900 border border-dark-700 rounded p-3 text-xs text-gray-400 max-h-40 overflow-y-auto">
+                            <div className="mb-2 text-gray-300">
+                                已解析 {parsedShots.length} 个镜头 · {parsedCounts.character} 个角色 · {parsedCounts.scene} 个场景
+                            </div>
+                            {parsedShots.map(shot => (
+                                <div key={shot.index} className="truncate">
+                                    {shot.index + 1}. {shot.prompt}
+                                </div>
+                            ))}
+                        </div>
+                    )}
                 </div>
                 <div className="p-4 border-t border-dark-700 bg-dark-900 flex justify-end gap-3">
                     <button onClick={onClose} className="px-4 py-2 rounded text-sm text-gray-400 hover:text-white hover:bg-dark-700">取消</button>
@@ -1,7 +1,7 @@
 import React, { useEffect, useState, useRef } from 'react';
 import { Plus, Trash2, Image, Video, MoveUp, MoveDown, Maximize, Upload, ChevronLeft, ChevronRight } from 'lucide-react';
 import ImagePreviewModal from './ImagePreviewModal';
-import { ApiService } from '../services/api';
+import { ApiService, thumbUrl } from '../services/api';
 
 const updatePromptWithAsset = (currentPrompt, action, assetType, asset, oldAsset) => {
     let newPrompt = currentPrompt || "";
@@ -185,7 +185,7 @@ const ShotItem = ({ shot, index, onDelete, onUpdate, onGenerate, onDeleteShotIma
                                 onClick={() => setPreviewUrl(avatarUrl)}
                                 title={char?.name || "未知角色"}
                             >
-                                <img src={avatarUrl} className="w-full h-full object-cover" alt="character"/>
+                                <img src={thumbUrl(avatarUrl)} className="w-full h-full object-cover" alt="character"/>
                                 <div className="absolute inset-0 bg-black/60 hidden group-hover/char:flex items-center justify-center pointer-events-none">
                                     <Maximize size={16} className="text-white"/>
                                 </div>
@@ -1,6 +1,7 @@
 import React, { useState } from 'react';
 import { Trash2, Search, Plus, Wand2, RefreshCw, Maximize, Save, ChevronLeft, ChevronRight, User, Image as ImageIcon } from 'lucide-react';
 import ImagePreviewModal from './ImagePreviewModal';
+import { thumbUrl } from '../services/api';
 
 const Sidebar = ({ characters, scenes, onSceneClick, onCharacterClick, onAddCharacter, onAddScene, onGenerateCharacter, onGenerateScene, onDeleteCharacter, onRegenerateCharacter, onRegenerateScene, onGenerateAllCharacters, onGenerateAllScenes, isGeneratingCharacters, isGeneratingScenes, defaultSceneId, onSetDefaultScene, onImportCharacters, isCollapsed, onToggleCollapse }) => {
     const [activeTab, setActiveTab] = useState('chars');
@@ -103,7 +104,7 @@ const Sidebar = ({ characters, scenes, onSceneClick, onCharacterClick, onAddChar
                                         onClick={() => onCharacterClick && onCharacterClick(char.id)}
                                     >
                                         <div className="w-16 h-16 rounded overflow-hidden bg-dark-600 border border-transparent group-hover:border-accent relative">
-                                            <img src={char.avatar_url || char.avatar} alt={char.name} className="w-full h-full object-cover"/>
+                                            <img src={thumbUrl(char.avatar_url || char.avatar)} alt={char.name} className="w-full h-full object-cover"/>
                                             <div className="absolute top-0 right-0 hidden group-hover:flex">
                                                 <button 
                                                     className="p-0.5 bg-black/50 hover:bg-black/70 text-white"
@@ -187,7 +188,7 @@ const Sidebar = ({ characters, scenes, onSceneClick, onCharacterClick, onAddChar
                                     >
                                         <div className="aspect-video rounded overflow-hidden bg-dark-600 border border-transparent group-hover:border-accent relative">
                                             {scene.image_url ? (
-                                                <img src={scene.image_url} alt={scene.name} className="w-full h-full object-cover"/>
+                                                <img src={thumbUrl(scene.image_url)} alt={scene.name} className="w-full h-full object-cover"/>
                                             ) : (
                                                 <div className="w-full h-full flex items-center justify-center text-dark-500 text-xs">暂无图片</div>
                                             )}
@@ -1,7 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { ArrowLeft, Plus, Trash2, Wand2, RefreshCw, Maximize, Save, Image as ImageIcon, Film } from 'lucide-react';
-import { ApiService } from '../services/api';
+import { ApiService, thumbUrl } from '../services/api';
 import ImagePreviewModal from '../components/ImagePreviewModal';
 
 const AssetManager = () => {
@@ -281,7 +281,7 @@ const AssetManager = () => {
                             {/* Image Area */}
                             <div className="relative bg-dark-900 group h-56">
                                 <img 
-                                    src={asset.avatar_url || asset.avatar || asset.image_url} 
+                                    src={thumbUrl(asset.avatar_url || asset.avatar || asset.image_url, 512)} 
                                     alt={asset.name} 
                                     className="w-full h-full object-contain"
                                     onError={(e) => { e.target.src = 'https://placehold.co/600x400/1a1b1e/FFF?text=No+Image'; }}
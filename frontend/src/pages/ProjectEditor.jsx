@@ -483,9 +483,9 @@ const ProjectEditor = () => {
         }
     };
 
-    const handleParseScript = async (content) => {
+    const handleParseScript = async (content, onProgress) => {
         try {
-            const response = await ApiService.parseScript(content);
+            const response = await ApiService.parseScriptStream(content, onProgress);
             
             // Handle both new object format and old array format (fallback)
             let newShots = [];
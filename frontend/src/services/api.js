@@ -35,6 +35,12 @@ const MockData = {
     ]
 };
 
+// Locally stored images can be served as precomputed thumbnails (backend THUMB_WIDTHS)
+export const thumbUrl = (url, width = 256) => {
+    if (!url || !url.includes('/static/uploads/') || /\.(mp4|mov|webm|svg)(\?|$)/i.test(url)) return url;
+    return `${url}${url.includes('?') ? '&' : '?'}thumb=${width}`;
+};
+
 export const ApiService = {
     getProjects: async () => {
         if (USE_MOCK) {
@@ -328,6 +334,45 @@ export const ApiService = {
         return res.json();
     },
 
+    // Streams the parse as Server-Sent Events; onEvent(type, data) fires for every
+    // shot / character / scene as it arrives. Resolves with the final merged result.
+    parseScriptStream: async (content, onEvent) => {
+        if (USE_MOCK) return ApiService.parseScript(content);
+        const res = await fetch(`${API_BASE_URL}/api/parse-script/stream`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({ content })
+        });
+        if (!res.ok || !res.body) throw new Error(`Parse failed: ${res.status}`);
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let result = null;
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let type = 'message';
+                let data = '';
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) type = line.slice(6).trim();
+                    else if (line.startsWith('data:')) data += line.slice(5).trim();
+                });
+                if (!data) continue;
+                const payload = JSON.parse(data);
+                if (type === 'done') result = payload;
+                else if (onEvent) onEvent(type, payload);
+            }
+        }
+        if (!result) throw new Error('Parse stream ended without a result');
+        return result;
+    },
+
     getApiConfig: async () => {
         if (USE_MOCK) {
             return {